@@ -0,0 +1,61 @@
+"""Messages rendered per second with the shared template registry.
+
+Compares rendering through ``template_registry`` with building a new Jinja
+environment per message, as ``FastMail(conf)`` did before.
+
+Run from project root::
+
+    python -m benchmarks.bench_mail_templates --messages 5000
+"""
+import argparse
+import time
+from email.message import EmailMessage
+
+from jinja2 import Environment, FileSystemLoader
+
+from src.services.mail_templates import template_registry
+
+
+def build(html: str, text: str) -> EmailMessage:
+    message = EmailMessage()
+    message["Subject"] = "Confirm your email "
+    message["To"] = "user@example.com"
+    message.set_content(text)
+    message.add_alternative(html, subtype="html")
+    return message
+
+
+def bench_registry(messages: int) -> float:
+    template_registry.load()
+    started = time.perf_counter()
+    for n in range(messages):
+        rendered = template_registry.render("email_template", {"host": "http://localhost:8000/",
+                                                               "username": f"user{n}", "token": "x" * 120})
+        build(rendered.html, rendered.text)
+    return messages / (time.perf_counter() - started)
+
+
+def bench_env_per_message(messages: int) -> float:
+    started = time.perf_counter()
+    for n in range(messages):
+        env = Environment(loader=FileSystemLoader(template_registry.folder))
+        context = {"host": "http://localhost:8000/", "username": f"user{n}", "token": "x" * 120}
+        html = env.get_template("email_template.html").render(context)
+        text = env.get_template("email_template.txt").render(context)
+        build(html, text)
+    return messages / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    args = parser.parse_args()
+    registry = bench_registry(args.messages)
+    per_message = bench_env_per_message(args.messages)
+    print(f"registry:            {registry:10.0f} messages/s")
+    print(f"environment per msg: {per_message:10.0f} messages/s")
+    print(f"speedup:             {registry / per_message:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+def run(coroutine):
+    """Runs repository coroutine without an event loop.
+
+    Repository functions use sync sessions and never suspend, so one send
+    runs them to the end and the loop does not show in timings.
+
+    :param coroutine: Coroutine of repository function.
+    :return: Return value of the function.
+    """
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coroutine.close()
+    raise RuntimeError("Repository function suspended, it needs an event loop")
@@ -0,0 +1,64 @@
+"""Benchmarks of every function in src/repository/contacts.py."""
+from datetime import date
+from itertools import cycle
+
+import pytest
+
+from benchmarks.repository.runner import run
+from src.repository import contacts as repository_contacts
+from src.schemas import ContactModel
+
+
+BODIES = [ContactModel(firstname="Jane", lastname="Dou", email="jane@mail.com", phone="+380501234567",
+                       birthday=date(1990, 5, 17)),
+          ContactModel(firstname="John", lastname="Dou", email="john@mail.com", phone="+380507654321",
+                       birthday=date(1991, 6, 18))]
+
+
+def test_get_contacts(bench, db, user):
+    bench(repository_contacts.get_contacts, db, user)
+
+
+def test_get_contact(bench, dataset, db, user):
+    bench(repository_contacts.get_contact, dataset.contact_ids[0], db, user)
+
+
+def test_get_contacts_with_name(bench, db, user, name):
+    bench(repository_contacts.get_contacts_with_name, name, db, user)
+
+
+def test_get_contacts_with_lastname(bench, dataset, db, user):
+    lastname = run(repository_contacts.get_contact(dataset.contact_ids[0], db, user)).lastname
+    bench(repository_contacts.get_contacts_with_lastname, lastname, db, user)
+
+
+def test_get_contacts_with_email(bench, dataset, db, user):
+    bench(repository_contacts.get_contacts_with_email, dataset.contact_email, db, user)
+
+
+def test_get_contacts_with_recent_birthdays(bench, dataset, db, user):
+    if dataset.dialect != "postgresql":
+        pytest.skip("birthday query uses PostgreSQL date functions")
+    bench(repository_contacts.get_contacts_with_recent_birthdays, db, user)
+
+
+def test_create_contact(bench, db, user):
+    bench(repository_contacts.create_contact, BODIES[0], db, user)
+
+
+def test_update_contact(bench, dataset, db, user):
+    # Bodies alternate, an update to the same values would write nothing
+    bodies = cycle(BODIES)
+    contact_id = dataset.contact_ids[-1]
+    original = run(repository_contacts.get_contact(contact_id, db, user))
+    original = ContactModel(firstname=original.firstname, lastname=original.lastname, email=original.email,
+                            phone=original.phone, birthday=original.birthday)
+    bench(repository_contacts.update_contact, setup=lambda: (contact_id, next(bodies), db, user))
+    run(repository_contacts.update_contact(contact_id, original, db, user))
+
+
+def test_remove_contact(bench, db, user):
+    def setup():
+        return run(repository_contacts.create_contact(BODIES[0], db, user)).id, db, user
+
+    bench(repository_contacts.remove_contact, setup=setup)
@@ -0,0 +1,39 @@
+"""Benchmarks of every function in src/repository/users.py."""
+from itertools import count, cycle
+
+from src.repository import users as repository_users
+from src.schemas import UserModel
+
+
+def test_get_user_by_email(bench, dataset, db):
+    bench(repository_users.get_user_by_email, dataset.user_email, db)
+
+
+def new_users():
+    for number in count():
+        yield UserModel(username=f"new_user{number}", email=f"new{number}@example.com", password="secret")
+
+
+def test_create_user(bench, db):
+    users = new_users()
+    bench(repository_users.create_user, setup=lambda: (next(users), db))
+
+
+def test_create_user_with_confirmation_email(bench, db):
+    users = new_users()
+    bench(repository_users.create_user, setup=lambda: (next(users), db, "localhost"))
+
+
+def test_update_token(bench, db, user):
+    # Values alternate, setting the same value again would write nothing
+    tokens = cycle(["token-a", "token-b"])
+    bench(repository_users.update_token, setup=lambda: (user, next(tokens), db))
+
+
+def test_confirmed_email(bench, dataset, db):
+    bench(repository_users.confirmed_email, dataset.user_email, db)
+
+
+def test_update_avatar(bench, dataset, db):
+    urls = cycle(["https://example.com/a.png", "https://example.com/b.png"])
+    bench(repository_users.update_avatar, setup=lambda: (dataset.user_email, next(urls), db))
@@ -2,17 +2,36 @@ from fastapi import FastAPI
 from fastapi_limiter import FastAPILimiter
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
+import os
 
 import redis.asyncio as redis
 
 from src.routes import contacts
 from src.routes import users
+from src.routes import internal
 from src.conf.config import settings
+from src.services.rate_limit import UserRateLimiter
+from src.services.avatars import ImmutableStaticFiles
+from src.services.mail_dispatcher import mail_dispatcher
+from src.services.mail_templates import template_registry
+from src.services.gravatar import gravatar_resolver
+from src.services.profiling import ProfilerMiddleware
+from src.services.tracing import TracingMiddleware, trace_redis, tracing
+from src.services.metrics import MAIL_QUEUE_DEPTH, MetricsMiddleware, instrument_engine, instrument_redis, metrics
+from src.database.auth import auth_service
+from src.database.db import engine, replicas, write_pins
+from src.database.query_budget import QueryTraceMiddleware
+from src.database.shards import shard_map
 
 app = FastAPI()
 
 app.include_router(users.router, prefix='/api')
 app.include_router(contacts.router, prefix='/api')
+app.include_router(internal.router, prefix='/api')
+
+if settings.avatar_storage == "local":
+    os.makedirs(settings.avatar_local_dir, exist_ok=True)
+    app.mount(settings.avatar_base_url, ImmutableStaticFiles(directory=settings.avatar_local_dir), name="avatars")
 
 
 origins = [ 
@@ -26,16 +45,54 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(QueryTraceMiddleware, server_timing=settings.server_timing,
+                   repeat_threshold=settings.query_repeat_threshold)
+app.add_middleware(ProfilerMiddleware, directory=settings.profile_dir, interval=settings.profile_interval)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_api_route("/metrics", metrics, include_in_schema=False)
+
+instrument_engine(engine, "primary")
+for replica in replicas.engines:
+    instrument_engine(replica, "replica")
+for shard in shard_map.engines:
+    instrument_engine(shard, "shard")
+instrument_redis(auth_service.r, "auth")
+trace_redis(auth_service.r, "auth")
+if write_pins.redis is not None:
+    instrument_redis(write_pins.redis, "pins")
+    trace_redis(write_pins.redis, "pins")
+tracing.configure_from_settings()
+MAIL_QUEUE_DEPTH.set_function(mail_dispatcher.depth)
 
 @app.on_event("startup")
 async def startup() -> None: 
-    """Initialize connection with redis db.
+    """Initialize connection with redis db, mail templates, mail dispatcher, gravatar client and replica checks.
     :return: None.
     :rtype: None
     """       
     r = await redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, encoding="utf-8",
                           decode_responses=True)
+    instrument_redis(r, "limiter")
     await FastAPILimiter.init(r)
+    await UserRateLimiter.init(r)
+    template_registry.load()
+    await mail_dispatcher.start()
+    await gravatar_resolver.start()
+    await replicas.start(settings.replica_check_interval)
+
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    """Sends queued emails, closes SMTP connections and gravatar client, stops replica checks, flushes spans.
+
+    :return: None.
+    :rtype: None
+    """
+    await mail_dispatcher.stop()
+    await gravatar_resolver.stop()
+    await replicas.stop()
+    tracing.shutdown()
 
 
 @app.get("/")
@@ -0,0 +1,34 @@
+"""partitioned contacts shadow table
+
+Revision ID: 5d2a8c4e9f13
+Revises: b7e1c9d24f60
+Create Date: 2026-10-18 21:45:12.503311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.database import partitioning
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2a8c4e9f13'
+down_revision: Union[str, None] = 'b7e1c9d24f60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Partitioning is PostgreSQL only, other databases keep the plain table.
+    # After this revision run `python -m src.database.partitioning backfill`.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    partitioning.create_shadow(op.get_bind())
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    partitioning.drop_shadow(op.get_bind())
@@ -0,0 +1,36 @@
+"""swap in partitioned contacts
+
+Revision ID: e6b3f7a1c2d4
+Revises: 5d2a8c4e9f13
+Create Date: 2026-10-18 21:46:40.118925
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.database import partitioning
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6b3f7a1c2d4'
+down_revision: Union[str, None] = '5d2a8c4e9f13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Fails unless `python -m src.database.partitioning backfill` finished after 5d2a8c4e9f13,
+    # or contacts is empty. Upgrade to 5d2a8c4e9f13 first, backfill, then upgrade to head.
+    # Rows are not copied here, the tables are compared before the lock is taken.
+    # The old table is kept as contacts_unpartitioned.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    partitioning.swap(op.get_bind())
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    partitioning.unswap(op.get_bind())
@@ -8,10 +8,61 @@ class Settings(BaseSettings):
     mail_username: str
     mail_password: str
     mail_from: str
+    mail_from_name: str = "Example email"
     mail_port: str
     mail_server: str
+    mail_pool_size: int = 2
+    mail_batch_size: int = 20
+    mail_max_retries: int = 3
+    mail_templates_auto_reload: bool = False
+    outbox_batch_size: int = 50
+    outbox_concurrency: int = 10
+    outbox_max_attempts: int = 5
+    outbox_visibility_timeout: int = 300
+    outbox_backoff: int = 30
+    outbox_poll_interval: float = 1.0
+    outbox_retention_days: int = 7
+    outbox_purge_interval: int = 3600
+    birthday_reminder_days: int = 7
+    birthday_reminder_hour: int = 6
+    birthday_reminder_checkpoint: str = "birthday_reminders.checkpoint.json"
     sqlalchemy_database_url: str
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_statement_timeout: int = 0
+    db_query_cache_size: int = 1000
+    db_prepare_threshold: int | None = 5
+    sqlalchemy_replica_urls: list[str] = []
+    replica_cooldown: float = 5.0
+    replica_check_interval: float = 5.0
+    replica_pin_seconds: float = 5.0
+    replica_pin_redis_timeout: float = 0.5
+    contact_shard_urls: list[str] = []
+    contact_shard_placement: int = 0
+    shard_cache_ttl: float = 5.0
+    shard_id_block: int = 1000
+    slow_query_ms: float = 0
+    # explained statements run twice, the EXPLAIN ANALYZE rerun adds their latency to the request
+    slow_query_explain_rate: float = 0.0
+    slow_query_keep: int = 100
+    slow_query_log_file: str = "logs/slow_queries.log"
+    slow_query_log_max_bytes: int = 10_000_000
+    slow_query_log_backups: int = 5
+    query_budget_strict: bool = False
+    query_repeat_threshold: int = 5
+    server_timing: bool = True
+    tracing_exporter: str = "none"
+    tracing_sample_rate: float = 0.0
+    tracing_service_name: str = "contacts-api"
+    tracing_file: str = "logs/traces.jsonl"
+    tracing_otlp_endpoint: str = "http://localhost:4318/v1/traces"
+    profile_dir: str = "profiles"
+    profile_interval: float = 0.001
     secret_key: str
+    admin_emails: list[str] = []
     algorithm: str
     redis_host: str
     redis_port: int
@@ -23,6 +74,25 @@ class Settings(BaseSettings):
     cloudinary_name: str
     cloudinary_api_key: str
     cloudinary_api_secret: str
+    avatar_storage: str = "cloudinary"
+    avatar_local_dir: str = "static/avatars"
+    avatar_base_url: str = "/static/avatars"
+    avatar_size: int = 250
+    avatar_format: str = "webp"
+    avatar_quality: int = 80
+    avatar_max_bytes: int = 5 * 1024 * 1024
+    avatar_max_pixels: int = 40_000_000
+    gravatar_url: str = "https://www.gravatar.com/avatar"
+    gravatar_concurrency: int = 10
+    gravatar_timeout: float = 2.0
+    gravatar_positive_ttl: int = 86400
+    gravatar_negative_ttl: int = 3600
+    rate_limit_times: int = 10
+    rate_limit_seconds: int = 60
+    rate_limit_routes: dict[str, int] = {}
+    rate_limit_plans: dict[str, float] = {"free": 1.0}
+    rate_limit_lease_fraction: float = 0.0
+    rate_limit_lease_seconds: float = 1.0
     # model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
     model_config = SettingsConfigDict(env_file=f"{os.path.dirname(os.path.abspath(__file__))}/../../.env", env_file_encoding="utf-8")
 
@@ -145,6 +145,7 @@ class Auth:
             self.r.expire(f"user:{email}", 900)
         else:
             user = pickle.loads(user)
+        db.info["user_id"] = user.id
         return user
     
 
@@ -182,4 +183,35 @@ class Auth:
                                 detail="Invalid token for email verification")
 
 
+    async def get_current_admin(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+        """Gets current user if email is listed in settings.admin_emails.
+
+        :param token: Token to get user from, defaults to Depends(oauth2_scheme)
+        :type token: str, optional
+        :param db: The database session, defaults to Depends(get_db)
+        :type db: Session, optional
+        :raises HTTPException: If user is not an admin.
+        :return: Current user.
+        :rtype: User
+        """
+        user = await self.get_current_user(token, db)
+        if user.email not in settings.admin_emails:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+        return user
+
+    def is_admin_token(self, token: str) -> bool:
+        """Checks if access token belongs to an admin, without database or redis lookups.
+
+        :param token: Access token.
+        :type token: str
+        :return: True if token is valid and its email is listed in settings.admin_emails.
+        :rtype: bool
+        """
+        try:
+            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+        except JWTError:
+            return False
+        return payload.get("scope") == "access_token" and payload.get("sub") in settings.admin_emails
+
+
 auth_service = Auth()
@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, Boolean, func, Table
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, func, Table, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.schema import ForeignKey
 from sqlalchemy.sql.sqltypes import DateTime, Date
@@ -18,10 +20,12 @@ class User(Base):
     refresh_token = Column(String(255), nullable=True)
     confirmed = Column(Boolean, default=False)
     avatar = Column(String(255), nullable=True)
+    plan = Column(String(20), default='free')
 
 
 class Contact(Base):
     __tablename__ = "contacts"
+    __table_args__ = (Index('ix_contacts_user_id_id', 'user_id', 'id'),)
     id = Column(Integer, primary_key=True)
     firstname = Column(String(50), nullable=False)
     lastname = Column(String(50), nullable=False)
@@ -32,5 +36,32 @@ class Contact(Base):
     updated_at = Column(DateTime, default=func.now())
     user_id = Column('user_id', ForeignKey('users.id', ondelete='CASCADE'), default=None)
     user = relationship('User', backref="notes")
+    # user_id is part of the identity, so ORM updates and deletes filter by the partition key
+    __mapper_args__ = {"primary_key": [id, user_id]}
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    __table_args__ = (Index('ix_email_outbox_status_available_at', 'status', 'available_at'),)
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(50), nullable=False)
+    recipient = Column(String(250), nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String(20), nullable=False, default='pending')
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(String(255), nullable=True)
+    created_at = Column(DateTime, default=func.now())
+
+
+class ContactShard(Base):
+    __tablename__ = "contact_shards"
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    shard = Column(Integer, nullable=False)
+    frozen = Column(Boolean, nullable=False, default=False)
 
 
+class IdBlock(Base):
+    __tablename__ = "id_blocks"
+    name = Column(String(50), primary_key=True)
+    next_id = Column(BigInteger, nullable=False)
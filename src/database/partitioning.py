@@ -0,0 +1,378 @@
+"""Moves contacts to a table hash-partitioned by user_id on PostgreSQL.
+
+The move is done online in three steps:
+
+1. migration 5d2a8c4e9f13 creates ``contacts_partitioned`` and a trigger that
+   mirrors every insert, update and delete on ``contacts`` into it;
+2. ``python -m src.database.partitioning backfill`` copies existing rows in
+   small batches while the application keeps running and records that it
+   finished in ``contacts_partitioned_backfilled``;
+3. migration e6b3f7a1c2d4 checks that both tables hold the same rows and
+   swaps them, the old heap is kept as ``contacts_unpartitioned`` until it is
+   dropped by hand. Only the renames run under an exclusive lock.
+
+The swap never copies existing rows itself, it refuses to run until backfill
+has finished, unless contacts is empty. Upgrade in three steps::
+
+    alembic upgrade 5d2a8c4e9f13
+    python -m src.database.partitioning backfill
+    alembic upgrade head
+
+Contacts without user_id can not be placed in a partition, backfill and swap
+refuse to run until they are assigned to a user or deleted.
+
+``python -m src.database.partitioning verify`` prints how many partitions
+every repository query touches.
+"""
+import argparse
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection
+
+
+class PartitioningError(Exception):
+    """Raised when contacts can not be moved without losing rows."""
+
+
+SOURCE = "contacts"
+SHADOW = "contacts_partitioned"
+BACKFILLED = "contacts_partitioned_backfilled"
+OLD = "contacts_unpartitioned"
+PARTITIONS = 16
+COLUMNS = "id, firstname, lastname, email, phone, birthday, created_at, updated_at, user_id"
+
+
+def create_shadow(conn: Connection, partitions: int = PARTITIONS) -> None:
+    """Creates partitioned copy of contacts and trigger that keeps it in sync.
+
+    Rows without user_id can not be placed in a partition, writing one while
+    the trigger is installed fails on the NOT NULL constraint of the copy.
+
+    :param conn: Connection to PostgreSQL.
+    :type conn: Connection
+    :param partitions: Number of hash partitions, defaults to 16
+    :type partitions: int, optional
+    """
+    conn.execute(text(f"""
+        CREATE TABLE {SHADOW} (
+            id integer NOT NULL DEFAULT nextval('contacts_id_seq'),
+            firstname varchar(50) NOT NULL,
+            lastname varchar(50) NOT NULL,
+            email varchar(50),
+            phone varchar(20),
+            birthday timestamp,
+            created_at timestamp,
+            updated_at timestamp,
+            user_id integer NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            CONSTRAINT {SHADOW}_pkey PRIMARY KEY (id, user_id)
+        ) PARTITION BY HASH (user_id)
+    """))
+    for remainder in range(partitions):
+        conn.execute(text(f"CREATE TABLE {SHADOW}_p{remainder} PARTITION OF {SHADOW} "
+                          f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"))
+    conn.execute(text(f"CREATE INDEX ix_{SHADOW}_user_id_id ON {SHADOW} (user_id, id)"))
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in COLUMNS.split(", ")[1:-1])
+    values = ", ".join(f"NEW.{column}" for column in COLUMNS.split(", "))
+    conn.execute(text(f"""
+        CREATE FUNCTION {SHADOW}_mirror() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM {SHADOW} WHERE id = OLD.id AND user_id = OLD.user_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO {SHADOW} ({COLUMNS}) VALUES ({values})
+                ON CONFLICT (id, user_id) DO UPDATE SET {updates};
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """))
+    conn.execute(text(f"CREATE TRIGGER {SHADOW}_mirror AFTER INSERT OR UPDATE OR DELETE ON {SOURCE} "
+                      f"FOR EACH ROW EXECUTE FUNCTION {SHADOW}_mirror()"))
+    conn.execute(text(f"CREATE TABLE {BACKFILLED} (last_id integer NOT NULL, "
+                      f"finished_at timestamp NOT NULL DEFAULT now())"))
+
+
+def drop_shadow(conn: Connection) -> None:
+    """Drops partitioned copy and its trigger.
+
+    :param conn: Connection to PostgreSQL.
+    :type conn: Connection
+    """
+    conn.execute(text(f"DROP TRIGGER IF EXISTS {SHADOW}_mirror ON {SOURCE}"))
+    conn.execute(text(f"DROP FUNCTION IF EXISTS {SHADOW}_mirror()"))
+    conn.execute(text(f"DROP TABLE IF EXISTS {SHADOW}"))
+    conn.execute(text(f"DROP TABLE IF EXISTS {BACKFILLED}"))
+
+
+def check_orphans(conn: Connection) -> None:
+    """Fails if some contacts have no user_id, they would be lost by the move.
+
+    :param conn: Connection to PostgreSQL.
+    :type conn: Connection
+    :raises PartitioningError: If there are contacts without user_id.
+    """
+    orphans = conn.execute(text(f"SELECT count(*) FROM {SOURCE} WHERE user_id IS NULL")).scalar()
+    if orphans:
+        raise PartitioningError(f"{orphans} contacts have no user_id, assign them to a user or delete them "
+                                f"before moving contacts to partitions")
+
+
+def copy_batch(conn: Connection, after_id: int, batch_size: int) -> Optional[int]:
+    """Copies next batch of contacts to partitioned table.
+
+    Source rows are locked FOR SHARE until commit, so a concurrent update or
+    delete waits and is then mirrored by the trigger.
+
+    :param conn: Connection to PostgreSQL.
+    :type conn: Connection
+    :param after_id: Copy rows with id greater than this.
+    :type after_id: int
+    :param batch_size: Max rows in batch.
+    :type batch_size: int
+    :return: Last copied id or None if there are no more rows.
+    :rtype: Optional[int]
+    """
+    last_id = conn.execute(text(f"""
+        WITH batch AS (
+            SELECT {COLUMNS} FROM {SOURCE}
+            WHERE id > :after_id
+            ORDER BY id LIMIT :batch_size
+            FOR SHARE
+        ), copied AS (
+            INSERT INTO {SHADOW} ({COLUMNS}) SELECT {COLUMNS} FROM batch
+            ON CONFLICT (id, user_id) DO NOTHING
+        )
+        SELECT max(id) FROM batch
+    """), {"after_id": after_id, "batch_size": batch_size}).scalar()
+    return last_id
+
+
+def backfill(conn: Connection, batch_size: int = 5000, pause: float = 0.0, after_id: int = 0,
+             log=print) -> int:
+    """Copies all contacts to partitioned table, committing every batch.
+
+    Once the last batch is copied, the run is recorded in contacts_partitioned_backfilled,
+    swap refuses to run without it.
+
+    :param conn: Connection to PostgreSQL.
+    :type conn: Connection
+    :param batch_size: Rows per batch, defaults to 5000
+    :type batch_size: int, optional
+    :param pause: Seconds to sleep between batches, defaults to 0.0
+    :type pause: float, optional
+    :param after_id: Resume after this id, defaults to 0
+    :type after_id: int, optional
+    :param log: Progress callback, defaults to print
+    :raises PartitioningError: If there are contacts without user_id.
+    :return: Last copied id.
+    :rtype: int
+    """
+    check_orphans(conn)
+    conn.commit()
+    while True:
+        last_id = copy_batch(conn, after_id, batch_size)
+        if last_id is None:
+            conn.execute(text(f"INSERT INTO {BACKFILLED} (last_id) VALUES (:last_id)"), {"last_id": after_id})
+            conn.commit()
+            return after_id
+        conn.commit()
+        after_id = last_id
+        log(f"copied contacts up to id {after_id}")
+        if pause:
+            time.sleep(pause)
+
+
+def compare(conn: Connection) -> Tuple[int, int, int]:
+    """Compares contacts with partitioned copy, both are read in one snapshot.
+
+    Runs without locks, the trigger writes the copy in the transaction of
+    every change, so the tables match in any snapshot once backfill is done.
+
+    :param conn: Connection to PostgreSQL.
+    :type conn: Connection
+    :raises PartitioningError: If row counts or checksums differ.
+    :return: Row count, checksum and max id of contacts.
+    :rtype: Tuple[int, int, int]
+    """
+    checksum = f"coalesce(sum(hashtext(ROW({COLUMNS})::text)::bigint), 0)"
+    source, copy = conn.execute(text(f"""
+        SELECT (SELECT ROW(count(*), {checksum}, coalesce(max(id), 0))::text FROM {SOURCE}),
+               (SELECT ROW(count(*), {checksum}, coalesce(max(id), 0))::text FROM {SHADOW})
+    """)).one()
+    if source != copy:
+        raise PartitioningError(f"{SHADOW} differs from {SOURCE} (count, checksum, max id): {copy} != {source}, "
+                                f"run backfill first")
+    count, total, max_id = (int(value) for value in source.strip("()").split(","))
+    return count, total, max_id
+
+
+def swap(conn: Connection) -> None:
+    """Replaces contacts with partitioned table, old table is renamed to contacts_unpartitioned.
+
+    Backfill must have finished, the trigger then keeps both tables equal and
+    no rows are copied in bulk here. The tables are compared before the lock
+    is taken. Under the exclusive lock only rows written since the comparison
+    are copied, by the primary key index, and the tables are renamed.
+
+    :param conn: Connection to PostgreSQL.
+    :type conn: Connection
+    :raises PartitioningError: If there are contacts without user_id, backfill has not finished or tables differ.
+    """
+    check_orphans(conn)
+    backfilled = conn.execute(text(f"SELECT count(*) FROM {BACKFILLED}")).scalar()
+    if not backfilled and conn.execute(text(f"SELECT EXISTS (SELECT FROM {SOURCE})")).scalar():
+        raise PartitioningError(f"backfill of {SHADOW} has not finished, run "
+                                f"`python -m src.database.partitioning backfill` before the swap")
+    _, _, checked_id = compare(conn)
+    conn.execute(text(f"LOCK TABLE {SOURCE} IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text(f"""
+        INSERT INTO {SHADOW} ({COLUMNS}) SELECT {COLUMNS} FROM {SOURCE} WHERE id > :checked_id
+        ON CONFLICT (id, user_id) DO NOTHING
+    """), {"checked_id": checked_id})
+    conn.execute(text(f"DROP TRIGGER {SHADOW}_mirror ON {SOURCE}"))
+    conn.execute(text(f"DROP FUNCTION {SHADOW}_mirror()"))
+    conn.execute(text(f"DROP TABLE {BACKFILLED}"))
+    conn.execute(text(f"ALTER TABLE {SOURCE} RENAME TO {OLD}"))
+    conn.execute(text(f"ALTER TABLE {OLD} RENAME CONSTRAINT {SOURCE}_pkey TO {OLD}_pkey"))
+    conn.execute(text(f"ALTER INDEX ix_{SOURCE}_user_id_id RENAME TO ix_{OLD}_user_id_id"))
+    conn.execute(text(f"ALTER TABLE {SHADOW} RENAME TO {SOURCE}"))
+    conn.execute(text(f"ALTER TABLE {SOURCE} RENAME CONSTRAINT {SHADOW}_pkey TO {SOURCE}_pkey"))
+    conn.execute(text(f"ALTER INDEX ix_{SHADOW}_user_id_id RENAME TO ix_{SOURCE}_user_id_id"))
+    for name in partition_names(conn, SOURCE):
+        conn.execute(text(f"ALTER TABLE {name} RENAME TO {name.replace(SHADOW, SOURCE)}"))
+    conn.execute(text(f"ALTER SEQUENCE {SOURCE}_id_seq OWNED BY {SOURCE}.id"))
+
+
+def unswap(conn: Connection) -> None:
+    """Restores plain contacts table with current rows of partitioned table.
+
+    :param conn: Connection to PostgreSQL.
+    :type conn: Connection
+    """
+    conn.execute(text(f"LOCK TABLE {SOURCE} IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text(f"DELETE FROM {OLD}"))
+    conn.execute(text(f"INSERT INTO {OLD} ({COLUMNS}) SELECT {COLUMNS} FROM {SOURCE}"))
+    conn.execute(text(f"ALTER SEQUENCE {SOURCE}_id_seq OWNED BY {OLD}.id"))
+    conn.execute(text(f"DROP TABLE {SOURCE}"))
+    conn.execute(text(f"ALTER TABLE {OLD} RENAME TO {SOURCE}"))
+    conn.execute(text(f"ALTER TABLE {SOURCE} RENAME CONSTRAINT {OLD}_pkey TO {SOURCE}_pkey"))
+    conn.execute(text(f"ALTER INDEX ix_{OLD}_user_id_id RENAME TO ix_{SOURCE}_user_id_id"))
+
+
+def partition_names(conn: Connection, table: str) -> List[str]:
+    """Gets partitions of table.
+
+    :param conn: Connection to PostgreSQL.
+    :type conn: Connection
+    :param table: Partitioned table.
+    :type table: str
+    :return: Partition names.
+    :rtype: List[str]
+    """
+    return list(conn.execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = :table ORDER BY c.relname
+    """), {"table": table}).scalars())
+
+
+def scanned_partitions(conn: Connection, statement: str, params=None) -> List[str]:
+    """Gets partitions of contacts that PostgreSQL plans to read for statement.
+
+    :param conn: Connection to PostgreSQL.
+    :type conn: Connection
+    :param statement: SQL statement as sent to the driver.
+    :type statement: str
+    :param params: Statement parameters, defaults to None
+    :return: Names of scanned partitions.
+    :rtype: List[str]
+    """
+    names = set(partition_names(conn, SOURCE))
+    plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, params or {}).scalar()
+    found = set()
+
+    def walk(node):
+        if node.get("Relation Name") in names:
+            found.add(node["Relation Name"])
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return sorted(found)
+
+
+def verify(url: str, user_id: int) -> None:
+    """Prints partitions scanned by every repository query of one user.
+
+    One contact is created for the user and removed again.
+
+    :param url: Database url.
+    :type url: str
+    :param user_id: User to run queries for.
+    :type user_id: int
+    """
+    import asyncio
+
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    from src.database.models import Contact, User
+    from src.repository import contacts as repository_contacts
+    from src.schemas import ContactModel
+
+    engine = create_engine(url)
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "contacts" in statement and not statement.startswith("EXPLAIN"):
+            statements.append((statement, parameters))
+
+    async def run(db: Session) -> None:
+        user = db.get(User, user_id)
+        body = ContactModel(firstname="Verify", lastname="Partition", email="verify@example.com",
+                            phone="000", birthday="2000-01-01")
+        contact = await repository_contacts.create_contact(body, db, user)
+        await repository_contacts.get_contacts(db, user)
+        await repository_contacts.get_contact(contact.id, db, user)
+        await repository_contacts.get_contacts_with_name("Verify", db, user)
+        await repository_contacts.get_contacts_with_lastname("Partition", db, user)
+        await repository_contacts.get_contacts_with_email("verify@example.com", db, user)
+        await repository_contacts.get_contacts_with_recent_birthdays(db, user)
+        await repository_contacts.update_contact(contact.id, body, db, user)
+        await repository_contacts.remove_contact(contact.id, db, user)
+
+    with Session(engine) as db:
+        asyncio.run(run(db))
+    with engine.connect() as conn:
+        for statement, params in statements:
+            parts = scanned_partitions(conn, statement, params)
+            print(f"{len(parts):3} partition(s): {' '.join(statement.split())[:100]}")
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    from src.database.db import SQLALCHEMY_DATABASE_URL
+
+    parser = argparse.ArgumentParser(description="Online move of contacts to hash partitions.")
+    parser.add_argument("--database-url", default=SQLALCHEMY_DATABASE_URL)
+    sub = parser.add_subparsers(dest="command", required=True)
+    fill = sub.add_parser("backfill", help="copy existing contacts to contacts_partitioned")
+    fill.add_argument("--batch-size", type=int, default=5000)
+    fill.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    fill.add_argument("--after-id", type=int, default=0, help="resume after this contact id")
+    check = sub.add_parser("verify", help="print partitions scanned by repository queries")
+    check.add_argument("--user-id", type=int, required=True)
+    args = parser.parse_args(argv)
+    if args.command == "backfill":
+        with create_engine(args.database_url).connect() as conn:
+            backfill(conn, args.batch_size, args.pause, args.after_id)
+    else:
+        verify(args.database_url, args.user_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.conf.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised on the statement that goes over the route budget when settings.query_budget_strict is set."""
+
+
+@dataclass
+class QueryTrace:
+    budget: Optional[int] = None
+    count: int = 0
+    duration: float = 0.0
+    statements: Counter = field(default_factory=Counter)
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        """Gets statements run at least threshold times, a sign of N+1 queries.
+
+        :param threshold: Minimal number of runs.
+        :type threshold: int
+        :return: Statements with number of runs.
+        :rtype: Dict[str, int]
+        """
+        return {statement: count for statement, count in self.statements.items() if count >= threshold}
+
+    def server_timing(self) -> str:
+        """Gets Server-Timing header value.
+
+        :return: Header value with total query time and count.
+        :rtype: str
+        """
+        return f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries"'
+
+
+# Trace of request being handled, set by QueryTraceMiddleware.
+current_trace: ContextVar[Optional[QueryTrace]] = ContextVar("current_trace", default=None)
+
+
+def trace_queries(engine: Engine) -> None:
+    """Counts statements of engine in trace of current request.
+
+    :param engine: Engine to listen on.
+    :type engine: Engine
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        trace = current_trace.get()
+        if trace is None:
+            return
+        trace.count += 1
+        trace.statements[statement] += 1
+        if settings.query_budget_strict and trace.budget is not None and trace.count > trace.budget:
+            raise QueryBudgetExceeded(f"Query {trace.count} is over budget of {trace.budget}: {statement}")
+        conn.info.setdefault("trace_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        trace = current_trace.get()
+        if trace is not None:
+            trace.duration += time.perf_counter() - conn.info["trace_started"].pop()
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        if context.connection is not None and context.connection.info.get("trace_started"):
+            context.connection.info["trace_started"].pop()
+
+
+class QueryBudget:
+    """Route dependency that declares how many statements a request may run.
+
+    Requests over budget are logged, with settings.query_budget_strict the
+    statement over budget raises QueryBudgetExceeded, so tests fail on it.
+    """
+
+    def __init__(self, queries: int):
+        """Creates budget.
+
+        :param queries: Max statements per request, on all databases.
+        :type queries: int
+        """
+        self.queries = queries
+
+    async def __call__(self) -> None:
+        trace = current_trace.get()
+        if trace is not None:
+            trace.budget = self.queries
+
+
+class QueryTraceMiddleware:
+    """ASGI middleware that traces statements of every request.
+
+    Query count and time are sent in Server-Timing header. Requests over
+    their QueryBudget and statements repeated repeat_threshold times or more
+    are logged as warnings.
+    """
+
+    def __init__(self, app: ASGIApp, server_timing: bool = True, repeat_threshold: int = 5):
+        """Creates middleware.
+
+        :param app: Wrapped ASGI app.
+        :type app: ASGIApp
+        :param server_timing: Send Server-Timing header, defaults to True
+        :type server_timing: bool, optional
+        :param repeat_threshold: Runs of one statement logged as possible N+1, defaults to 5
+        :type repeat_threshold: int, optional
+        """
+        self.app = app
+        self.server_timing = server_timing
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace = QueryTrace()
+        token = current_trace.set(trace)
+
+        async def send_timing(message: Message) -> None:
+            if message["type"] == "http.response.start" and self.server_timing:
+                message["headers"] = [*message.get("headers", []), (b"server-timing", trace.server_timing().encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timing)
+        finally:
+            current_trace.reset(token)
+            self.report(scope, trace)
+
+    def report(self, scope: Scope, trace: QueryTrace) -> None:
+        """Logs request over budget and repeated statements.
+
+        :param scope: ASGI scope.
+        :type scope: Scope
+        :param trace: Finished trace.
+        :type trace: QueryTrace
+        """
+        if trace.budget is not None and trace.count > trace.budget:
+            logger.warning("%s %s ran %d queries, budget is %d", scope["method"], scope["path"], trace.count,
+                           trace.budget)
+        for statement, count in trace.repeated(self.repeat_threshold).items():
+            logger.warning("%s %s ran the same statement %d times, possible N+1: %s", scope["method"],
+                           scope["path"], count, statement)
@@ -0,0 +1,236 @@
+import asyncio
+import itertools
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from redis.exceptions import RedisError
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaSet:
+    """Read replicas picked round-robin, replicas that fail are skipped for cooldown seconds."""
+
+    def __init__(self, engines: Iterable[Engine], cooldown: float = 5.0):
+        """Creates replica set and listens for connection errors on every engine.
+
+        :param engines: Replica engines.
+        :type engines: Iterable[Engine]
+        :param cooldown: Seconds a failed replica is skipped, defaults to 5.0
+        :type cooldown: float, optional
+        """
+        self.engines: List[Engine] = list(engines)
+        self.cooldown = cooldown
+        self.down_until: Dict[Engine, float] = {}
+        self._counter = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+        for engine in self.engines:
+            event.listen(engine, "handle_error", self._on_error)
+
+    def _on_error(self, context) -> None:
+        if context.is_disconnect or context.connection is None:
+            self.mark_down(context.engine)
+
+    def mark_down(self, engine: Engine) -> None:
+        """Skips replica until cooldown passes.
+
+        :param engine: Replica engine.
+        :type engine: Engine
+        """
+        if engine not in self.down_until:
+            logger.warning("Replica %s is down", engine.url.render_as_string(hide_password=True))
+        self.down_until[engine] = time.monotonic() + self.cooldown
+
+    def is_healthy(self, engine: Engine) -> bool:
+        """Checks if replica is not in cooldown.
+
+        :param engine: Replica engine.
+        :type engine: Engine
+        :return: True if replica can be used.
+        :rtype: bool
+        """
+        return self.down_until.get(engine, 0) <= time.monotonic()
+
+    def pick(self) -> Optional[Engine]:
+        """Gets next healthy replica.
+
+        :return: Replica engine or None if there is no healthy replica.
+        :rtype: Optional[Engine]
+        """
+        for _ in range(len(self.engines)):
+            engine = self.engines[next(self._counter) % len(self.engines)]
+            if self.is_healthy(engine):
+                return engine
+        return None
+
+    def check(self) -> None:
+        """Pings every replica, failed ones are marked down and recovered ones are used again."""
+        for engine in self.engines:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+            except DBAPIError:
+                self.mark_down(engine)
+            else:
+                self.down_until.pop(engine, None)
+
+    async def start(self, interval: float) -> None:
+        """Starts health checks every interval seconds, does nothing without replicas.
+
+        :param interval: Seconds between checks.
+        :type interval: float
+        """
+        if self.engines and self._task is None:
+            self._task = asyncio.create_task(self._monitor(interval))
+
+    async def stop(self) -> None:
+        """Stops health checks."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _monitor(self, interval: float) -> None:
+        while True:
+            await run_in_threadpool(self.check)
+            await asyncio.sleep(interval)
+
+
+class WritePins:
+    """Remembers users who wrote recently, their reads stay on primary until replicas catch up.
+
+    With a redis client pins are shared by all workers, so a write handled by
+    one worker pins reads handled by any other. Without it pins are kept in
+    process memory only, which is enough for a single worker. Pins made by
+    this process are always kept in memory too and are checked first.
+    """
+
+    def __init__(self, seconds: float = 5.0, redis=None, prefix: str = "pin:user:"):
+        """Creates empty pins.
+
+        :param seconds: How long reads are pinned after a write, defaults to 5.0
+        :type seconds: float, optional
+        :param redis: Sync redis client to share pins between workers, defaults to None
+        :param prefix: Prefix of redis keys, defaults to "pin:user:"
+        :type prefix: str, optional
+        """
+        self.seconds = seconds
+        self.redis = redis
+        self.prefix = prefix
+        self.until: Dict[int, float] = {}
+
+    def pin(self, user_id: int) -> None:
+        """Pins reads of user to primary.
+
+        :param user_id: User id.
+        :type user_id: int
+        """
+        now = time.monotonic()
+        if len(self.until) > 10_000:
+            self.until = {key: value for key, value in self.until.items() if value > now}
+        self.until[user_id] = now + self.seconds
+        if self.redis is not None:
+            try:
+                self.redis.set(f"{self.prefix}{user_id}", 1, px=max(int(self.seconds * 1000), 1))
+            except RedisError as err:
+                logger.warning("Could not share write pin of user %s: %s", user_id, err)
+
+    def pinned_here(self, user_id: Optional[int]) -> bool:
+        """Checks pins made by this process.
+
+        :param user_id: User id or None.
+        :type user_id: Optional[int]
+        :return: True if user wrote through this process less than seconds ago.
+        :rtype: bool
+        """
+        return user_id is not None and self.until.get(user_id, 0) > time.monotonic()
+
+    def pinned(self, user_id: Optional[int]) -> bool:
+        """Checks if reads of user must go to primary.
+
+        If redis can not be reached, reads go to primary.
+
+        :param user_id: User id or None.
+        :type user_id: Optional[int]
+        :return: True if user wrote less than seconds ago.
+        :rtype: bool
+        """
+        if self.pinned_here(user_id):
+            return True
+        if user_id is None or self.redis is None:
+            return False
+        try:
+            return bool(self.redis.exists(f"{self.prefix}{user_id}"))
+        except RedisError as err:
+            logger.warning("Could not read write pin of user %s: %s", user_id, err)
+            return True
+
+
+class RoutingSession(Session):
+    """Session that sends reads to a replica when session.info["replica"] is set.
+
+    Flushes and reads after them always go to primary. Sessions of users with a
+    recent write, whose id is in session.info["user_id"], also stay on primary.
+    One replica is picked per session.
+    """
+
+    def __init__(self, *args, replicas: Optional[ReplicaSet] = None, pins: Optional[WritePins] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas
+        self.pins = pins
+        self._replica: Optional[Engine] = None
+        self._shared_pin: Optional[Tuple[Optional[int], bool]] = None
+
+    def _pinned(self) -> bool:
+        user_id = self.info.get("user_id")
+        if self.pins is None:
+            return False
+        if self.pins.pinned_here(user_id):
+            return True
+        # Pins of other workers cost a redis round trip, they are looked up once per session and user
+        if self._shared_pin is None or self._shared_pin[0] != user_id:
+            self._shared_pin = (user_id, self.pins.pinned(user_id))
+        return self._shared_pin[1]
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.replicas and self.info.get("replica") and not self._flushing and not self.info.get("wrote") \
+                and not self._pinned():
+            if self._replica is None or not self.replicas.is_healthy(self._replica):
+                self._replica = self.replicas.pick()
+            if self._replica is not None:
+                return self._replica
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+
+def track_writes(session_factory, pins: WritePins) -> None:
+    """Pins user of session to primary after it commits a write.
+
+    :param session_factory: Session factory to listen on.
+    :param pins: Pins to update.
+    :type pins: WritePins
+    """
+
+    @event.listens_for(session_factory, "after_flush")
+    def after_flush(session, flush_context):
+        session.info["wrote"] = True
+
+    @event.listens_for(session_factory, "do_orm_execute")
+    def do_orm_execute(state):
+        if state.is_update or state.is_delete or state.is_insert:
+            state.session.info["wrote"] = True
+
+    @event.listens_for(session_factory, "after_commit")
+    def after_commit(session):
+        if session.info.pop("wrote", False) and session.info.get("user_id") is not None:
+            pins.pin(session.info["user_id"])
+
+    @event.listens_for(session_factory, "after_rollback")
+    def after_rollback(session):
+        session.info.pop("wrote", None)
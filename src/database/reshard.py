@@ -0,0 +1,165 @@
+"""Moves contacts of users between shard databases while the application runs.
+
+A move of one user:
+
+1. marks the user frozen in ``contact_shards``, contact requests of the user
+   get 503 with Retry-After;
+2. waits until placements cached by workers expire (``shard_cache_ttl``);
+3. copies contacts to the target shard keeping their ids;
+4. points ``contact_shards`` at the target and unfreezes the user;
+5. deletes contacts from the source shard.
+
+To add a shard, append its url to ``contact_shard_urls``, create its table with
+``create``, run ``rebalance --placement <new count>`` and then set
+``contact_shard_placement`` to the new count. Jump hash moves only users that
+land on the new shard.
+
+To enable sharding on a database that already has contacts:
+
+1. set ``contact_shard_urls`` and run ``create``;
+2. restart every worker with the new setting at once. Users whose contacts
+   are on the primary have no ``contact_shards`` entry yet, so they keep
+   being served from the primary, and ids of new contacts continue after the
+   largest id on the primary and the shards;
+3. run ``rebalance``, it moves those users to their jump hash shards with the
+   same freeze and copy as any other move.
+
+A worker still running without ``contact_shard_urls`` during step 2 would
+write contacts of new users to the primary while other workers put them on
+their shard.
+"""
+import argparse
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from src.database.models import Contact, User
+from src.database.shards import ShardMap, shard_map as default_shard_map
+
+
+def copy_user(source: Session, target: Session, user_id: int) -> int:
+    """Replaces contacts of user on target with the ones on source.
+
+    :param source: Session of source shard.
+    :type source: Session
+    :param target: Session of target shard.
+    :type target: Session
+    :param user_id: User id.
+    :type user_id: int
+    :return: Number of copied contacts.
+    :rtype: int
+    """
+    table = Contact.__table__
+    rows = [dict(row) for row in source.execute(select(table).where(table.c.user_id == user_id)).mappings()]
+    target.execute(delete(table).where(table.c.user_id == user_id))
+    if rows:
+        target.execute(insert(table), rows)
+    target.commit()
+    return len(rows)
+
+
+def move_user(shard_map: ShardMap, user_id: int, target: int, grace: Optional[float] = None) -> int:
+    """Moves contacts of user to target shard.
+
+    :param shard_map: Shard map.
+    :type shard_map: ShardMap
+    :param user_id: User id.
+    :type user_id: int
+    :param target: Target shard index.
+    :type target: int
+    :param grace: Seconds to wait after freezing, defaults to shard cache ttl
+    :type grace: Optional[float], optional
+    :return: Number of moved contacts.
+    :rtype: int
+    """
+    source, _ = shard_map.lookup(user_id, cached=False)
+    if source == target:
+        return 0
+    shard_map.set_placement(user_id, source, frozen=True)
+    try:
+        time.sleep(shard_map.cache_ttl if grace is None else grace)
+        with shard_map.factory(source)() as src, shard_map.factory(target)() as dst:
+            moved = copy_user(src, dst, user_id)
+    except BaseException:
+        shard_map.set_placement(user_id, source)
+        raise
+    shard_map.set_placement(user_id, target)
+    with shard_map.factory(source)() as src:
+        src.execute(delete(Contact.__table__).where(Contact.__table__.c.user_id == user_id))
+        src.commit()
+    return moved
+
+
+def plan_rebalance(shard_map: ShardMap, user_ids: Iterable[int],
+                   placement: Optional[int] = None) -> List[Tuple[int, int, int]]:
+    """Finds users who are not on their jump hash shard.
+
+    :param shard_map: Shard map.
+    :type shard_map: ShardMap
+    :param user_ids: Users to check.
+    :type user_ids: Iterable[int]
+    :param placement: Number of shards to place over, defaults to shard_map.placement
+    :type placement: Optional[int], optional
+    :return: User id, current shard and target shard of every user to move.
+    :rtype: List[Tuple[int, int, int]]
+    """
+    moves = []
+    for user_id in user_ids:
+        current, _ = shard_map.lookup(user_id, cached=False)
+        target = shard_map.default_shard(user_id, placement)
+        if current != target:
+            moves.append((user_id, current, target))
+    return moves
+
+
+def rebalance(shard_map: ShardMap, placement: Optional[int] = None, grace: Optional[float] = None,
+              dry_run: bool = False) -> List[Tuple[int, int, int]]:
+    """Moves every user to its jump hash shard.
+
+    :param shard_map: Shard map.
+    :type shard_map: ShardMap
+    :param placement: Number of shards to place over, defaults to shard_map.placement
+    :type placement: Optional[int], optional
+    :param grace: Seconds to wait after freezing a user, defaults to shard cache ttl
+    :type grace: Optional[float], optional
+    :param dry_run: Only plan moves, defaults to False
+    :type dry_run: bool, optional
+    :return: Planned or done moves.
+    :rtype: List[Tuple[int, int, int]]
+    """
+    with shard_map.primary() as db:
+        user_ids = db.scalars(select(User.id).order_by(User.id)).all()
+    moves = plan_rebalance(shard_map, user_ids, placement)
+    if not dry_run:
+        for user_id, _, target in moves:
+            move_user(shard_map, user_id, target, grace)
+    return moves
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Online move of contacts between shard databases.")
+    parser.add_argument("--grace", type=float, default=None, help="seconds to wait after freezing a user")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("create", help="create contacts table on every shard")
+    move = sub.add_parser("move", help="move one user to a shard")
+    move.add_argument("--user-id", type=int, required=True)
+    move.add_argument("--to", type=int, required=True)
+    balance = sub.add_parser("rebalance", help="move users to their jump hash shard")
+    balance.add_argument("--placement", type=int, default=None, help="number of shards to place over")
+    balance.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    shard_map = default_shard_map
+    if args.command == "create":
+        shard_map.create_all()
+    elif args.command == "move":
+        print(f"moved {move_user(shard_map, args.user_id, args.to, args.grace)} contacts")
+    else:
+        for user_id, source, target in rebalance(shard_map, args.placement, args.grace, args.dry_run):
+            print(f"user {user_id}: {source} -> {target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""Fills a database with synthetic users and contacts at production scale.
+
+Rows are generated in worker processes, chunk by chunk, and loaded by the
+main process while workers prepare the next chunks. PostgreSQL is loaded
+with ``COPY``, other databases with batched executemany. Every user gets the
+same password, hashed once, and is confirmed, so seeded users can log in::
+
+    python -m src.database.seed --users 100000 --contacts-per-user 20 --workers 4
+    python -m src.database.seed --users 1000 --database-url sqlite:///./seed.db
+
+Users are appended after the highest existing user id. Contacts go to the
+given database and get ids of its sequence, which shards do not know about,
+so the command refuses to seed the configured database while
+``contact_shard_urls`` is set. Seed before enabling sharding and move the
+contacts with the cutover described in ``src.database.reshard``.
+"""
+import argparse
+import csv
+import io
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.engine import Engine
+
+from src.database.models import Base, Contact, User
+
+
+FIRSTNAMES = ["Oleksandr", "Olena", "Andrii", "Iryna", "Dmytro", "Tetiana", "Serhii", "Natalia", "Volodymyr",
+              "Yulia", "Mykola", "Oksana", "Ivan", "Kateryna", "Yurii", "Svitlana", "Oleh", "Maria", "Vasyl",
+              "Anna", "Petro", "Liudmyla", "Taras", "Sofia", "Bohdan", "Viktoriia", "Maksym", "Daria", "Artem",
+              "Anastasiia", "Roman", "Halyna", "Denys", "Khrystyna", "John", "Emma", "Michael", "Olivia",
+              "David", "Sophie"]
+LASTNAMES = ["Melnyk", "Shevchenko", "Boiko", "Kovalenko", "Bondarenko", "Tkachenko", "Kovalchuk", "Kravchenko",
+             "Oliinyk", "Shevchuk", "Koval", "Polishchuk", "Bondar", "Tkachuk", "Moroz", "Marchenko",
+             "Lysenko", "Rudenko", "Savchenko", "Petrenko", "Klymenko", "Pavlenko", "Savchuk", "Kuzmenko",
+             "Ponomarenko", "Vasylenko", "Levchenko", "Kharchenko", "Karpenko", "Smith", "Brown", "Wilson"]
+DOMAINS = ["gmail.com", "ukr.net", "i.ua", "outlook.com", "meta.ua", "yahoo.com", "icloud.com", "proton.me"]
+DOMAIN_WEIGHTS = [0.46, 0.2, 0.09, 0.08, 0.05, 0.05, 0.04, 0.03]
+# Mobile operator codes of Ukraine
+PHONE_CODES = ["50", "66", "95", "99", "67", "68", "96", "97", "98", "63", "73", "93"]
+PLANS = ["free", "pro"]
+PLAN_WEIGHTS = [0.92, 0.08]
+USER_COLUMNS = ["id", "username", "email", "password", "crated_at", "confirmed", "plan"]
+CONTACT_COLUMNS = ["firstname", "lastname", "email", "phone", "birthday", "created_at", "updated_at", "user_id"]
+EPOCH = np.datetime64("2021-01-01T00:00:00")
+
+
+def zipf_weights(size: int, exponent: float = 0.9) -> np.ndarray:
+    """Gets weights of ranked values, the first ones are the most common, like real names.
+
+    :param size: Number of values.
+    :type size: int
+    :param exponent: Skew, 0 is uniform, defaults to 0.9
+    :type exponent: float, optional
+    :return: Weights summing to 1.
+    :rtype: np.ndarray
+    """
+    weights = 1 / np.arange(1, size + 1) ** exponent
+    return weights / weights.sum()
+
+
+@dataclass
+class ChunkTask:
+    index: int
+    seed: int
+    first_user_id: int
+    users: int
+    contacts_per_user: float
+    max_contacts: int
+    password: str
+    copy: bool
+
+
+@dataclass
+class Chunk:
+    users: int
+    contacts: int
+    # CSV text for COPY or rows for executemany
+    user_rows: object
+    contact_rows: object
+
+
+def contacts_per_user(rng: np.random.Generator, users: int, mean: float, limit: int) -> np.ndarray:
+    """Draws skewed contact counts, most users have a few contacts and some have thousands.
+
+    Counts are log-normal with the given mean, so the median is about 60% of it.
+
+    :param rng: Random generator.
+    :type rng: np.random.Generator
+    :param users: Number of users.
+    :type users: int
+    :param mean: Mean contacts per user.
+    :type mean: float
+    :param limit: Max contacts of one user.
+    :type limit: int
+    :return: Contact count per user.
+    :rtype: np.ndarray
+    """
+    sigma = 1.0
+    mu = math.log(max(mean, 1e-9)) - sigma ** 2 / 2
+    return np.minimum(rng.lognormal(mu, sigma, users).round().astype(np.int64), limit)
+
+
+def timestamps(rng: np.random.Generator, size: int) -> List[str]:
+    seconds = rng.integers(0, 3 * 365 * 86400, size)
+    return [str(value).replace("T", " ") for value in EPOCH + seconds.astype("timedelta64[s]")]
+
+
+def generate_chunk(task: ChunkTask) -> Chunk:
+    """Generates users of one chunk with their contacts.
+
+    Rows depend only on seed and chunk index, so a run can be repeated.
+
+    :param task: Chunk to generate.
+    :type task: ChunkTask
+    :return: Rows as CSV text if task.copy, else as tuples.
+    :rtype: Chunk
+    """
+    rng = np.random.default_rng([task.seed, task.index])
+    first_weights, last_weights = zipf_weights(len(FIRSTNAMES)), zipf_weights(len(LASTNAMES))
+    ids = range(task.first_user_id, task.first_user_id + task.users)
+    firstnames = rng.choice(len(FIRSTNAMES), task.users, p=first_weights)
+    lastnames = rng.choice(len(LASTNAMES), task.users, p=last_weights)
+    domains = rng.choice(len(DOMAINS), task.users, p=DOMAIN_WEIGHTS)
+    plans = rng.choice(len(PLANS), task.users, p=PLAN_WEIGHTS)
+    created = timestamps(rng, task.users)
+    users = []
+    for user_id, first, last, domain, plan, created_at in zip(ids, firstnames, lastnames, domains, plans, created):
+        username = f"{FIRSTNAMES[first][:8].lower()}{user_id}"
+        email = f"{FIRSTNAMES[first].lower()}.{LASTNAMES[last].lower()}{user_id}@{DOMAINS[domain]}"
+        users.append((user_id, username, email, task.password, created_at, True, PLANS[plan]))
+
+    counts = contacts_per_user(rng, task.users, task.contacts_per_user, task.max_contacts)
+    total = int(counts.sum())
+    owners = np.repeat(np.arange(task.first_user_id, task.first_user_id + task.users), counts)
+    firstnames = rng.choice(len(FIRSTNAMES), total, p=first_weights)
+    lastnames = rng.choice(len(LASTNAMES), total, p=last_weights)
+    domains = rng.choice(len(DOMAINS), total, p=DOMAIN_WEIGHTS)
+    styles = rng.integers(0, 3, total)
+    numbers = rng.integers(1, 1000, total)
+    codes = rng.choice(len(PHONE_CODES), total)
+    subscribers = rng.integers(0, 10 ** 7, total)
+    # Ages from 18 to 80, most of them 25 to 45
+    ages = np.clip(rng.normal(36, 12, total), 18, 80)
+    birthdays = np.datetime64("2024-01-01") - (ages * 365.25).astype("timedelta64[D]")
+    created = timestamps(rng, total)
+    contacts = []
+    for first, last, domain, style, number, code, subscriber, birthday, created_at, owner in zip(
+            firstnames, lastnames, domains, styles, numbers, codes, subscribers, birthdays, created, owners):
+        firstname, lastname = FIRSTNAMES[first], LASTNAMES[last]
+        if style == 0:
+            local = f"{firstname}.{lastname}"
+        elif style == 1:
+            local = f"{firstname[0]}{lastname}{number}"
+        else:
+            local = f"{lastname}{firstname[:3]}{number}"
+        contacts.append((firstname, lastname, f"{local.lower()}@{DOMAINS[domain]}",
+                         f"+380{PHONE_CODES[code]}{subscriber:07d}", f"{birthday} 00:00:00", created_at, created_at,
+                         int(owner)))
+    if task.copy:
+        return Chunk(len(users), total, to_csv(users), to_csv(contacts))
+    return Chunk(len(users), total, users, contacts)
+
+
+def to_csv(rows: List[tuple]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def copy_rows(engine: Engine, table: str, columns: List[str], data: str) -> None:
+    """Loads CSV text into PostgreSQL table with COPY.
+
+    :param engine: PostgreSQL engine, psycopg2 or psycopg.
+    :type engine: Engine
+    :param table: Table name.
+    :type table: str
+    :param columns: Columns in CSV order.
+    :type columns: List[str]
+    :param data: CSV text.
+    :type data: str
+    """
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if hasattr(cursor, "copy_expert"):
+            cursor.copy_expert(sql, io.StringIO(data))
+        else:
+            with cursor.copy(sql) as copy:
+                copy.write(data)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def insert_rows(engine: Engine, table: str, columns: List[str], rows: List[tuple], batch: int = 10_000) -> None:
+    """Loads rows with batched executemany, used where COPY is not available.
+
+    :param engine: Database engine.
+    :type engine: Engine
+    :param table: Table name.
+    :type table: str
+    :param columns: Columns in row order.
+    :type columns: List[str]
+    :param rows: Rows.
+    :type rows: List[tuple]
+    :param batch: Rows per executemany, defaults to 10_000
+    :type batch: int, optional
+    """
+    marker = "?" if engine.dialect.paramstyle == "qmark" else "%s"
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join([marker] * len(columns))})"
+    with engine.begin() as conn:
+        for start in range(0, len(rows), batch):
+            conn.exec_driver_sql(sql, rows[start:start + batch])
+
+
+@dataclass
+class SeedResult:
+    users: int
+    contacts: int
+    seconds: float
+
+    @property
+    def rows_per_minute(self) -> float:
+        return (self.users + self.contacts) / self.seconds * 60 if self.seconds else 0.0
+
+
+def seed(engine: Engine, users: int, contacts_per_user: float = 20, max_contacts: int = 5000,
+         password: str = "123456", workers: Optional[int] = None, chunk_users: int = 5000,
+         random_seed: int = 0) -> SeedResult:
+    """Generates and loads users and contacts.
+
+    :param engine: Database engine, tables are created if missing.
+    :type engine: Engine
+    :param users: Number of users.
+    :type users: int
+    :param contacts_per_user: Mean contacts per user, defaults to 20
+    :type contacts_per_user: float, optional
+    :param max_contacts: Max contacts of one user, defaults to 5000
+    :type max_contacts: int, optional
+    :param password: Password of every user, defaults to "123456"
+    :type password: str, optional
+    :param workers: Generating processes, defaults to number of CPUs
+    :type workers: Optional[int], optional
+    :param chunk_users: Users per chunk, defaults to 5000
+    :type chunk_users: int, optional
+    :param random_seed: Seed, the same seed gives the same rows, defaults to 0
+    :type random_seed: int, optional
+    :return: Numbers of loaded rows and time taken.
+    :rtype: SeedResult
+    """
+    from src.database.auth import auth_service
+
+    started = time.perf_counter()
+    Base.metadata.create_all(bind=engine, tables=[User.__table__, Contact.__table__])
+    with engine.connect() as conn:
+        first_id = (conn.scalar(select(func.max(User.id))) or 0) + 1
+    postgres = engine.dialect.name == "postgresql"
+    hashed = auth_service.get_password_hash(password)
+    tasks = [ChunkTask(index, random_seed, first_id + start, min(chunk_users, users - start), contacts_per_user,
+                       max_contacts, hashed, postgres)
+             for index, start in enumerate(range(0, users, chunk_users))]
+    workers = workers or os.cpu_count() or 1
+    result = SeedResult(0, 0, 0.0)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk in _generated(pool, tasks, workers * 2):
+            load = copy_rows if postgres else insert_rows
+            load(engine, User.__tablename__, USER_COLUMNS, chunk.user_rows)
+            load(engine, Contact.__tablename__, CONTACT_COLUMNS, chunk.contact_rows)
+            result.users += chunk.users
+            result.contacts += chunk.contacts
+    if postgres and users:
+        with engine.begin() as conn:
+            conn.execute(text("SELECT setval(pg_get_serial_sequence('users', 'id'), (SELECT max(id) FROM users))"))
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def _generated(pool: ProcessPoolExecutor, tasks: List[ChunkTask], window: int) -> Iterable[Chunk]:
+    # Chunks come back in order, at most window of them are generated ahead of loading
+    tasks = iter(tasks)
+    pending = deque(pool.submit(generate_chunk, task) for _, task in zip(range(window), tasks))
+    while pending:
+        chunk = pending.popleft().result()
+        task = next(tasks, None)
+        if task is not None:
+            pending.append(pool.submit(generate_chunk, task))
+        yield chunk
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    from src.conf.config import settings
+
+    parser = argparse.ArgumentParser(description="Fill database with synthetic users and contacts.")
+    parser.add_argument("--users", type=int, required=True)
+    parser.add_argument("--contacts-per-user", type=float, default=20, help="mean, counts are log-normal")
+    parser.add_argument("--max-contacts", type=int, default=5000)
+    parser.add_argument("--password", default="123456", help="password of every seeded user")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-users", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url", default=None, help="defaults to sqlalchemy_database_url")
+    args = parser.parse_args(argv)
+    if settings.contact_shard_urls and args.database_url is None:
+        parser.error("contacts are sharded, seed before setting contact_shard_urls, see src.database.reshard")
+
+    engine = create_engine(args.database_url or settings.sqlalchemy_database_url)
+    result = seed(engine, args.users, args.contacts_per_user, args.max_contacts, args.password, args.workers,
+                  args.chunk_users, args.seed)
+    engine.dispose()
+    print(f"{result.users} users, {result.contacts} contacts in {result.seconds:.1f}s "
+          f"({result.rows_per_minute:,.0f} rows/min)")
+
+
+if __name__ == "__main__":
+    main()
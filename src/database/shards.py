@@ -0,0 +1,362 @@
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy import Column, Index, MetaData, Table, event, func, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.conf.config import settings
+from src.database.auth import auth_service
+from src.database.db import SessionLocal, create_db_engine, get_db, get_read_db
+from src.database.models import Contact, ContactShard, IdBlock, User
+
+
+# Shard index of the primary database, contacts added before sharding was enabled stay there until moved
+PRIMARY = -1
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash, going from n to n + 1 buckets moves only 1 / (n + 1) of keys.
+
+    :param key: Key to place.
+    :type key: int
+    :param buckets: Number of buckets.
+    :type buckets: int
+    :return: Bucket in range(buckets).
+    :rtype: int
+    """
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+
+def shard_metadata() -> MetaData:
+    """Builds metadata with contacts table for shard databases, users live on primary so there is no foreign key.
+
+    :return: Metadata with contacts table.
+    :rtype: MetaData
+    """
+    metadata = MetaData()
+    source = Contact.__table__
+    Table(source.name, metadata,
+          *[Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+            for column in source.columns],
+          *[Index(index.name, *[column.name for column in index.columns]) for index in source.indexes])
+    return metadata
+
+
+class HiLoAllocator:
+    """Hands out contact ids that are unique over all shards.
+
+    Blocks of ids are reserved in id_blocks table on primary database, so only
+    one primary write is made per block.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], name: str = "contacts", block: int = 1000,
+                 start: Callable[[], int] = lambda: 0):
+        """Creates allocator, nothing is reserved until first id is needed.
+
+        :param session_factory: Creates sessions of primary database.
+        :type session_factory: Callable[[], Session]
+        :param name: Name of id sequence, defaults to "contacts"
+        :type name: str, optional
+        :param block: Ids reserved at once, defaults to 1000
+        :type block: int, optional
+        :param start: Gets largest id already used, called once when sequence is created, defaults to 0
+        :type start: Callable[[], int], optional
+        """
+        self.session_factory = session_factory
+        self.name = name
+        self.block = block
+        self.start = start
+        self.lock = threading.Lock()
+        self.next = self.end = 0
+
+    def _reserve(self) -> int:
+        with self.session_factory() as db:
+            stmt = update(IdBlock).where(IdBlock.name == self.name)\
+                .values(next_id=IdBlock.next_id + self.block).returning(IdBlock.next_id)
+            end = db.execute(stmt).scalar()
+            if end is None:
+                end = self.start() + 1 + self.block
+                db.add(IdBlock(name=self.name, next_id=end))
+                try:
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()
+                    return self._reserve()
+            db.commit()
+        return end
+
+    def next_id(self) -> int:
+        """Gets next unused id.
+
+        :return: New id.
+        :rtype: int
+        """
+        with self.lock:
+            if self.next >= self.end:
+                self.end = self._reserve()
+                self.next = self.end - self.block
+            self.next += 1
+            return self.next - 1
+
+
+class ShardMap:
+    """Places contacts of every user on one of several databases.
+
+    A user lives on jump_hash(user_id, placement) unless contact_shards table on
+    primary says otherwise. Users without an entry whose contacts are still on
+    the primary, because they were added before sharding was enabled, are
+    served from the primary (shard PRIMARY) until rebalance moves them. Lookups
+    are cached for cache_ttl seconds. Frozen users are being moved, their
+    requests get 503 until the move is done.
+    """
+
+    def __init__(self, urls: List[str], primary: Callable[[], Session] = SessionLocal, placement: int = 0,
+                 cache_ttl: float = 5.0, id_block: int = 1000,
+                 engine_factory: Callable[[str], Engine] = create_db_engine):
+        """Creates engines for shards, connections are opened on first use.
+
+        :param urls: Shard database urls, empty list disables sharding.
+        :type urls: List[str]
+        :param primary: Creates sessions of primary database, defaults to SessionLocal
+        :type primary: Callable[[], Session], optional
+        :param placement: Number of shards used for default placement, 0 means all, defaults to 0
+        :type placement: int, optional
+        :param cache_ttl: Seconds a placement is cached, defaults to 5.0
+        :type cache_ttl: float, optional
+        :param id_block: Contact ids reserved at once, defaults to 1000
+        :type id_block: int, optional
+        :param engine_factory: Creates engine for url, defaults to create_db_engine
+        :type engine_factory: Callable[[str], Engine], optional
+        """
+        self.engines = [engine_factory(url) for url in urls]
+        self.factories = [sessionmaker(bind=engine, autocommit=False, autoflush=False, expire_on_commit=False)
+                          for engine in self.engines]
+        self.primary = primary
+        self.placement = placement or len(self.engines)
+        self.cache_ttl = cache_ttl
+        self.cache: Dict[int, Tuple[float, int, bool]] = {}
+        self.allocator = HiLoAllocator(primary, block=id_block, start=self.max_contact_id)
+        for factory in self.factories:
+            event.listen(factory, "before_flush", self._assign_ids)
+
+    @classmethod
+    def from_settings(cls) -> "ShardMap":
+        """Creates shard map configured by settings.
+
+        :return: New shard map.
+        :rtype: ShardMap
+        """
+        return cls(settings.contact_shard_urls, SessionLocal, settings.contact_shard_placement,
+                   settings.shard_cache_ttl, settings.shard_id_block)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.engines)
+
+    def create_all(self) -> None:
+        """Creates contacts table on every shard."""
+        metadata = shard_metadata()
+        for engine in self.engines:
+            metadata.create_all(bind=engine)
+
+    def default_shard(self, user_id: int, placement: Optional[int] = None) -> int:
+        """Gets shard of user when contact_shards has no entry.
+
+        :param user_id: User id.
+        :type user_id: int
+        :param placement: Number of shards to place over, defaults to self.placement
+        :type placement: Optional[int], optional
+        :return: Shard index.
+        :rtype: int
+        """
+        return jump_hash(user_id, placement or self.placement)
+
+    def lookup(self, user_id: int, cached: bool = True) -> Tuple[int, bool]:
+        """Gets shard of user and if user is frozen.
+
+        :param user_id: User id.
+        :type user_id: int
+        :param cached: Use cached placement, defaults to True
+        :type cached: bool, optional
+        :return: Shard index and frozen flag.
+        :rtype: Tuple[int, bool]
+        """
+        entry = self.cache.get(user_id)
+        if cached and entry is not None and entry[0] > time.monotonic():
+            return entry[1], entry[2]
+        with self.primary() as db:
+            row = db.get(ContactShard, user_id)
+            if row:
+                shard, frozen = row.shard, row.frozen
+            else:
+                shard = PRIMARY if self._on_primary(db, [user_id]) else self.default_shard(user_id)
+                frozen = False
+        self.cache[user_id] = (time.monotonic() + self.cache_ttl, shard, frozen)
+        return shard, frozen
+
+    def placements(self, db: Session, user_ids: Sequence[int], batch: int = 1000) -> Dict[int, int]:
+        """Gets shards of many users at once, bypassing the cache, for jobs that read all contacts.
+
+        :param db: Session of primary database.
+        :type db: Session
+        :param user_ids: User ids.
+        :type user_ids: Sequence[int]
+        :param batch: Users looked up per query, defaults to 1000
+        :type batch: int, optional
+        :return: Dictionary of user id to shard index.
+        :rtype: Dict[int, int]
+        """
+        result: Dict[int, int] = {}
+        for start in range(0, len(user_ids), batch):
+            ids = list(user_ids[start:start + batch])
+            rows = dict(db.execute(select(ContactShard.user_id, ContactShard.shard)
+                                   .where(ContactShard.user_id.in_(ids))).all())
+            on_primary = self._on_primary(db, [user_id for user_id in ids if user_id not in rows])
+            for user_id in ids:
+                if user_id in rows:
+                    result[user_id] = rows[user_id]
+                else:
+                    result[user_id] = PRIMARY if user_id in on_primary else self.default_shard(user_id)
+        return result
+
+    def contact_sessions(self, db: Session, user_ids: Sequence[int]) -> Iterator[Tuple[Session, List[int]]]:
+        """Groups users by shard and opens a session on every shard in turn.
+
+        :param db: Session of primary database, used for users on the primary.
+        :type db: Session
+        :param user_ids: User ids.
+        :type user_ids: Sequence[int]
+        :return: Iterator of session and ids of users whose contacts it holds.
+        :rtype: Iterator[Tuple[Session, List[int]]]
+        """
+        groups: Dict[int, List[int]] = {}
+        for user_id, shard in self.placements(db, user_ids).items():
+            groups.setdefault(shard, []).append(user_id)
+        for shard, ids in sorted(groups.items()):
+            if shard == PRIMARY:
+                yield db, ids
+                continue
+            with self.factories[shard]() as session:
+                yield session, ids
+
+    def factory(self, shard: int) -> Callable[[], Session]:
+        """Gets session factory of shard, PRIMARY gives primary sessions that allocate contact ids like shards.
+
+        :param shard: Shard index or PRIMARY.
+        :type shard: int
+        :return: Session factory.
+        :rtype: Callable[[], Session]
+        """
+        return self._primary_session if shard == PRIMARY else self.factories[shard]
+
+    def set_placement(self, user_id: int, shard: int, frozen: bool = False) -> None:
+        """Saves shard of user to contact_shards.
+
+        :param user_id: User id.
+        :type user_id: int
+        :param shard: Shard index.
+        :type shard: int
+        :param frozen: Reject requests of user, defaults to False
+        :type frozen: bool, optional
+        """
+        with self.primary() as db:
+            db.merge(ContactShard(user_id=user_id, shard=shard, frozen=frozen))
+            db.commit()
+        self.cache.pop(user_id, None)
+
+    def session(self, user_id: int) -> Session:
+        """Opens session on shard of user.
+
+        :param user_id: User id.
+        :type user_id: int
+        :raises HTTPException: If user is being moved to another shard.
+        :return: New session.
+        :rtype: Session
+        """
+        shard, frozen = self.lookup(user_id)
+        if frozen:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Contacts are being moved",
+                                headers={"Retry-After": str(max(1, round(self.cache_ttl)))})
+        return self.factory(shard)()
+
+    def max_contact_id(self) -> int:
+        """Gets largest contact id over primary and all shards.
+
+        :return: Largest id or 0.
+        :rtype: int
+        """
+        ids = [0]
+        for factory in [self.primary, *self.factories]:
+            with factory() as db:
+                ids.append(db.execute(select(func.max(Contact.id))).scalar() or 0)
+        return max(ids)
+
+    def _on_primary(self, db: Session, user_ids: List[int]) -> Set[int]:
+        if not user_ids:
+            return set()
+        return set(db.scalars(select(Contact.user_id).where(Contact.user_id.in_(user_ids)).distinct()))
+
+    def _primary_session(self) -> Session:
+        # ids from the primary sequence could collide with ids handed out on shards once the user is moved
+        db = self.primary()
+        event.listen(db, "before_flush", self._assign_ids)
+        return db
+
+    def _assign_ids(self, session: Session, flush_context, instances) -> None:
+        for obj in session.new:
+            if isinstance(obj, Contact) and obj.id is None:
+                obj.id = self.allocator.next_id()
+
+
+shard_map = ShardMap.from_settings()
+
+
+def _shard_session(request: Request, db: Session, user: User) -> Iterator[Session]:
+    if not shard_map.enabled:
+        yield db
+        return
+    shard_db = shard_map.session(user.id)
+    if hasattr(request.state, "db_sessions"):
+        request.state.db_sessions.append(shard_db)
+    try:
+        yield shard_db
+    finally:
+        shard_db.close()
+
+
+def get_contacts_db(request: Request, db: Session = Depends(get_db),
+                    current_user: User = Depends(auth_service.get_current_user)) -> Iterator[Session]:
+    """Gets session for contacts of current user, on its shard if sharding is configured.
+
+    :param request: Current request.
+    :type request: Request
+    :param db: The database session, defaults to Depends(get_db)
+    :type db: Session, optional
+    :param current_user: Owner of contacts, defaults to Depends(auth_service.get_current_user)
+    :type current_user: User, optional
+    :yield: Session of primary database or of user's shard.
+    """
+    yield from _shard_session(request, db, current_user)
+
+
+def get_contacts_read_db(request: Request, db: Session = Depends(get_read_db),
+                         current_user: User = Depends(auth_service.get_current_user)) -> Iterator[Session]:
+    """Same as get_contacts_db, but without sharding reads go to replicas.
+
+    :param request: Current request.
+    :type request: Request
+    :param db: The database session, defaults to Depends(get_read_db)
+    :type db: Session, optional
+    :param current_user: Owner of contacts, defaults to Depends(auth_service.get_current_user)
+    :type current_user: User, optional
+    :yield: Session of primary database, replica or of user's shard.
+    """
+    yield from _shard_session(request, db, current_user)
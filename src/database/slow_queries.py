@@ -0,0 +1,205 @@
+import json
+import logging
+import random
+import sys
+import time
+from collections import deque
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.conf.config import settings
+from src.services.metrics import request_scope
+
+
+logger = logging.getLogger(__name__)
+
+
+def parameter_shapes(parameters, executemany: bool = False):
+    """Gets types of bound parameters, values are not logged.
+
+    :param parameters: Parameters passed to cursor.
+    :param executemany: Parameters are a list of rows, defaults to False
+    :type executemany: bool, optional
+    :return: Type names in the same layout as parameters.
+    """
+    if executemany:
+        rows = list(parameters)
+        return {"rows": len(rows), "first": parameter_shapes(rows[0]) if rows else None}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def repository_caller(prefix: str = "src.repository") -> Optional[str]:
+    """Finds repository function that runs current query.
+
+    :param prefix: Module prefix to look for, defaults to "src.repository"
+    :type prefix: str, optional
+    :return: "module:function" of nearest frame in prefix or None.
+    :rtype: Optional[str]
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith(prefix):
+            return f"{module}:{frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+class SlowQueryLog:
+    """Records statements slower than threshold_ms.
+
+    Every entry has SQL, parameter types, duration, repository function and
+    request. On PostgreSQL a share of slow SELECT statements, explain_rate, is
+    run again with EXPLAIN (ANALYZE, BUFFERS) inside a savepoint, so the plan
+    is stored with the entry. The rerun happens on the request path and adds
+    the statement's latency to the request once more, so explain_rate should
+    stay small. Last keep entries are kept in memory, all are
+    written as JSON lines to logger.
+    """
+
+    def __init__(self, threshold_ms: float, explain_rate: float = 0.0, keep: int = 100,
+                 log: logging.Logger = logger, sample: Callable[[], float] = random.random):
+        """Creates empty log.
+
+        :param threshold_ms: Statements running longer are recorded.
+        :type threshold_ms: float
+        :param explain_rate: Share of slow SELECT statements explained on PostgreSQL, defaults to 0.0
+        :type explain_rate: float, optional
+        :param keep: Entries kept in memory, defaults to 100
+        :type keep: int, optional
+        :param log: Logger entries are written to, defaults to logger
+        :type log: logging.Logger, optional
+        :param sample: Returns random number in [0, 1), defaults to random.random
+        :type sample: Callable[[], float], optional
+        """
+        self.threshold = threshold_ms / 1000
+        self.explain_rate = explain_rate
+        self.entries: deque = deque(maxlen=keep)
+        self.log = log
+        self.sample = sample
+
+    @classmethod
+    def from_settings(cls) -> "SlowQueryLog":
+        """Creates log configured by settings, with rotating file if slow_query_log_file is set.
+
+        :return: New slow query log.
+        :rtype: SlowQueryLog
+        """
+        if settings.slow_query_ms and settings.slow_query_log_file and not logger.handlers:
+            Path(settings.slow_query_log_file).parent.mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(settings.slow_query_log_file, maxBytes=settings.slow_query_log_max_bytes,
+                                          backupCount=settings.slow_query_log_backups)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+        return cls(settings.slow_query_ms, settings.slow_query_explain_rate, settings.slow_query_keep)
+
+    def attach(self, engine: Engine) -> None:
+        """Times every statement executed by engine.
+
+        :param engine: Engine to listen on.
+        :type engine: Engine
+        """
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            duration = time.perf_counter() - conn.info["slow_query_started"].pop()
+            if duration >= self.threshold:
+                self.record(conn, cursor, statement, parameters, executemany, duration)
+
+        @event.listens_for(engine, "handle_error")
+        def handle_error(context):
+            if context.connection is not None and context.connection.info.get("slow_query_started"):
+                context.connection.info["slow_query_started"].pop()
+
+    def record(self, conn, cursor, statement: str, parameters, executemany: bool, duration: float) -> dict:
+        """Stores one slow statement.
+
+        :param conn: Connection that ran statement.
+        :param cursor: DBAPI cursor that ran statement.
+        :param statement: SQL.
+        :type statement: str
+        :param parameters: Bound parameters.
+        :param executemany: Parameters are a list of rows.
+        :type executemany: bool
+        :param duration: Seconds statement took.
+        :type duration: float
+        :return: Stored entry.
+        :rtype: dict
+        """
+        scope = request_scope.get()
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration * 1000, 3),
+            "statement": statement,
+            "parameters": parameter_shapes(parameters, executemany),
+            "caller": repository_caller(),
+            "route": f"{scope['method']} {scope['path']}" if scope else None,
+            "plan": None,
+        }
+        if conn.dialect.name == "postgresql" and not executemany \
+                and statement.lstrip()[:6].upper() == "SELECT" and self.sample() < self.explain_rate:
+            entry["plan"] = self.explain(cursor, statement, parameters)
+        self.entries.append(entry)
+        self.log.info(json.dumps(entry, default=str))
+        return entry
+
+    @staticmethod
+    def explain(cursor, statement: str, parameters) -> str:
+        """Runs EXPLAIN (ANALYZE, BUFFERS) of statement in a savepoint of the current transaction.
+
+        ANALYZE executes the statement again on the request's connection, so
+        an explained request waits for the slow statement twice. Any error is
+        returned as text, the savepoint is rolled back if it was taken.
+
+        :param cursor: DBAPI cursor of connection that ran statement.
+        :param statement: SELECT statement.
+        :type statement: str
+        :param parameters: Bound parameters.
+        :return: Plan text or error message.
+        :rtype: str
+        """
+        explain_cursor = None
+        savepoint = False
+        try:
+            explain_cursor = cursor.connection.cursor()
+            explain_cursor.execute("SAVEPOINT slow_query_explain")
+            savepoint = True
+            explain_cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+            plan = "\n".join(row[0] for row in explain_cursor.fetchall())
+            explain_cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+            return plan
+        except Exception as err:
+            if savepoint:
+                try:
+                    explain_cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                except Exception:
+                    logger.warning("Could not roll back explain savepoint", exc_info=True)
+            return f"explain failed: {err}"
+        finally:
+            if explain_cursor is not None:
+                explain_cursor.close()
+
+    def recent(self) -> List[dict]:
+        """Gets kept entries, newest first.
+
+        :return: Slow query entries.
+        :rtype: List[dict]
+        """
+        return list(reversed(self.entries))
+
+
+slow_query_log = SlowQueryLog.from_settings()
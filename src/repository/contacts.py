@@ -1,14 +1,32 @@
 from datetime import date, timedelta
 from typing import List
 
-from sqlalchemy import Column, Integer, String, Boolean, func, Table, Interval, and_
+from sqlalchemy import Column, Integer, String, Boolean, func, Table, Interval, and_, lambda_stmt, select
 from sqlalchemy.orm import Session
+from sqlalchemy.sql import StatementLambdaElement
 
 
 from src.database.models import Contact, User
 from src.schemas import ContactModel
+from src.services.tracing import traced
 
 
+def contact_stmt(contact_id: int, user_id: int) -> StatementLambdaElement:
+    """Builds cached statement selecting one contact of user.
+
+    The lambda is compiled once, later calls only bind new parameter values.
+
+    :param contact_id: The ID of the contact.
+    :type contact_id: int
+    :param user_id: The ID of the owner.
+    :type user_id: int
+    :return: Select statement.
+    :rtype: StatementLambdaElement
+    """
+    return lambda_stmt(lambda: select(Contact).where(Contact.id == contact_id, Contact.user_id == user_id))
+
+
+@traced()
 async def get_contacts(db: Session, user: User) -> List[Contact]:
     """Retrieves list of user's contacts.
 
@@ -19,9 +37,11 @@ async def get_contacts(db: Session, user: User) -> List[Contact]:
     :return: List of user's contacts.
     :rtype: List[Contact]
     """  
-    return db.query(Contact).filter(Contact.user_id == user.id).all
+    user_id = user.id
+    return db.scalars(lambda_stmt(lambda: select(Contact).where(Contact.user_id == user_id))).all()
 
 
+@traced()
 async def create_contact(body: ContactModel, db: Session, user: User) -> Contact:
     """Creates new contact.
 
@@ -46,6 +66,7 @@ async def create_contact(body: ContactModel, db: Session, user: User) -> Contact
     return contact
 
 
+@traced()
 async def get_contact(contact_id: int, db: Session, user: User) -> Contact:
     """ Retrieves a single contact with the specified ID for a specific user.
 
@@ -58,9 +79,10 @@ async def get_contact(contact_id: int, db: Session, user: User) -> Contact:
     :return: The contact with the specified ID, or None if it does not exist.
     :rtype: Contact | None
     """    
-    return db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
+    return db.scalars(contact_stmt(contact_id, user.id)).first()
 
 
+@traced()
 async def update_contact(contact_id: int, body: ContactModel, db: Session, user: User) -> Contact:
     """Updates a single contact with the specified ID for a specific user.
 
@@ -76,7 +98,7 @@ async def update_contact(contact_id: int, body: ContactModel, db: Session, user:
     :rtype: Contact | None
     """    
 
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
+    contact = db.scalars(contact_stmt(contact_id, user.id)).first()
     if not contact:
         return None
     contact.firstname = body.firstname
@@ -89,6 +111,7 @@ async def update_contact(contact_id: int, body: ContactModel, db: Session, user:
     return contact
 
 
+@traced()
 async def remove_contact(contact_id: int, db: Session, user: User) -> Contact:
     """Removes a single contact with the specified ID for a specific user.
 
@@ -101,7 +124,7 @@ async def remove_contact(contact_id: int, db: Session, user: User) -> Contact:
     :return: The removed contact, or None if it does not exist.
     :rtype: Contact
     """    
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
+    contact = db.scalars(contact_stmt(contact_id, user.id)).first()
     if not contact:
         return None
 
@@ -110,6 +133,7 @@ async def remove_contact(contact_id: int, db: Session, user: User) -> Contact:
     return contact
 
 
+@traced()
 async def get_contacts_with_name(name: str, db: Session, user: User) -> List[Contact]:
     """Retrieves contacts with the specified name for a specific user.
 
@@ -122,9 +146,12 @@ async def get_contacts_with_name(name: str, db: Session, user: User) -> List[Con
     :return: Contacts with the specified name for a specific user.
     :rtype: List[Contact]
     """    
-    return db.query(Contact).filter(and_(Contact.firstname == name, Contact.user_id == user.id)).all
+    user_id = user.id
+    return db.scalars(lambda_stmt(lambda: select(Contact).where(Contact.firstname == name,
+                                                                Contact.user_id == user_id))).all()
 
 
+@traced()
 async def get_contacts_with_lastname(lastname: str, db: Session, user: User) -> List[Contact]:
     """Retrieves contacts with the specified lastname for a specific user.
 
@@ -137,9 +164,12 @@ async def get_contacts_with_lastname(lastname: str, db: Session, user: User) ->
     :return: Contacts with the specified lastname for a specific user.
     :rtype: List[Contact]
     """
-    return db.query(Contact).filter(and_(Contact.lastname == lastname, Contact.user_id == user.id)).all
+    user_id = user.id
+    return db.scalars(lambda_stmt(lambda: select(Contact).where(Contact.lastname == lastname,
+                                                                Contact.user_id == user_id))).all()
 
 
+@traced()
 async def get_contacts_with_email(email: str, db: Session, user: User) -> List[Contact]:
     """Retrieves contacts with the specified email for a specific user.
 
@@ -152,9 +182,12 @@ async def get_contacts_with_email(email: str, db: Session, user: User) -> List[C
     :return: Contacts with the specified email for a specific user.
     :rtype: List[Contact]
     """    
-    return db.query(Contact).filter(and_(Contact.email == email, Contact.user_id == user.id)).all
+    user_id = user.id
+    return db.scalars(lambda_stmt(lambda: select(Contact).where(Contact.email == email,
+                                                                Contact.user_id == user_id))).all()
 
 
+@traced()
 async def get_contacts_with_recent_birthdays(db: Session, user: User) -> List[Contact]:
     """Retrieves contacts with recent birthdays for a specific user.
 
@@ -165,7 +198,9 @@ async def get_contacts_with_recent_birthdays(db: Session, user: User) -> List[Co
     :return: contacts with recent birthdays for a specific user.
     :rtype: List[Contact]
     """    
-    return db.query(Contact).filter(and_(has_birthday_next_week(Contact.birthday), Contact.user_id == user.id)).all
+    user_id = user.id
+    return db.scalars(lambda_stmt(lambda: select(Contact).where(has_birthday_next_week(Contact.birthday),
+                                                                Contact.user_id == user_id))).all()
 
 
 def has_birthday_next_week(birthday: date) -> bool:
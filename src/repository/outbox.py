@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import delete, or_, select
+from sqlalchemy.orm import Session
+
+from src.database.models import EmailOutbox
+from src.services.tracing import traced
+
+
+CONFIRM_EMAIL = "confirm_email"
+BIRTHDAY_DIGEST = "birthday_digest"
+
+PENDING = "pending"
+PROCESSING = "processing"
+SENT = "sent"
+DEAD = "dead"
+
+
+def add_email(kind: str, recipient: str, payload: dict, db: Session) -> EmailOutbox:
+    """Adds email to outbox without committing, so it is saved in caller's transaction.
+
+    :param kind: Kind of email, selects handler in outbox worker.
+    :type kind: str
+    :param recipient: Email address to send message to.
+    :type recipient: str
+    :param payload: Data to render message with.
+    :type payload: dict
+    :param db: The database session.
+    :type db: Session
+    :return: New outbox entry.
+    :rtype: EmailOutbox
+    """
+    entry = EmailOutbox(kind=kind, recipient=recipient, payload=payload, status=PENDING, attempts=0,
+                        available_at=datetime.utcnow())
+    db.add(entry)
+    return entry
+
+
+@traced()
+async def enqueue_email(kind: str, recipient: str, payload: dict, db: Session) -> EmailOutbox:
+    """Saves email to outbox.
+
+    :param kind: Kind of email, selects handler in outbox worker.
+    :type kind: str
+    :param recipient: Email address to send message to.
+    :type recipient: str
+    :param payload: Data to render message with.
+    :type payload: dict
+    :param db: The database session.
+    :type db: Session
+    :return: New outbox entry.
+    :rtype: EmailOutbox
+    """
+    entry = add_email(kind, recipient, payload, db)
+    db.commit()
+    return entry
+
+
+@traced()
+async def claim_batch(db: Session, limit: int, visibility_timeout: int) -> List[EmailOutbox]:
+    """Claims due entries for one worker.
+
+    Rows are locked with SKIP LOCKED, so concurrent workers get disjoint batches.
+    Claimed entries stay invisible for visibility_timeout seconds; if worker dies
+    before finishing them, they are claimed again after that.
+
+    :param db: The database session.
+    :type db: Session
+    :param limit: Max number of entries to claim.
+    :type limit: int
+    :param visibility_timeout: Seconds claimed entries are hidden from other workers.
+    :type visibility_timeout: int
+    :return: Claimed entries.
+    :rtype: List[EmailOutbox]
+    """
+    now = datetime.utcnow()
+    entries = db.query(EmailOutbox)\
+        .filter(or_(EmailOutbox.status == PENDING, EmailOutbox.status == PROCESSING),
+                EmailOutbox.available_at <= now)\
+        .order_by(EmailOutbox.available_at, EmailOutbox.id)\
+        .limit(limit)\
+        .with_for_update(skip_locked=True)\
+        .all()
+    for entry in entries:
+        entry.status = PROCESSING
+        entry.attempts += 1
+        entry.available_at = now + timedelta(seconds=visibility_timeout)
+    db.commit()
+    return entries
+
+
+@traced()
+async def mark_sent(entry: EmailOutbox, db: Session) -> None:
+    """Marks entry as sent, available_at keeps the time it was sent for purge_sent.
+
+    :param entry: Outbox entry.
+    :type entry: EmailOutbox
+    :param db: The database session.
+    :type db: Session
+    :return: None.
+    :rtype: None
+    """
+    entry.status = SENT
+    entry.last_error = None
+    entry.available_at = datetime.utcnow()
+    db.commit()
+
+
+@traced()
+async def mark_failed(entry: EmailOutbox, error: str, max_attempts: int, backoff: int, db: Session) -> None:
+    """Schedules entry for retry with exponential backoff or moves it to dead letters.
+
+    :param entry: Outbox entry.
+    :type entry: EmailOutbox
+    :param error: Error text.
+    :type error: str
+    :param max_attempts: Attempts after which entry is dead-lettered.
+    :type max_attempts: int
+    :param backoff: First retry delay in seconds.
+    :type backoff: int
+    :param db: The database session.
+    :type db: Session
+    :return: None.
+    :rtype: None
+    """
+    entry.last_error = error[:255]
+    if entry.attempts >= max_attempts:
+        entry.status = DEAD
+    else:
+        entry.status = PENDING
+        entry.available_at = datetime.utcnow() + timedelta(seconds=backoff * 2 ** (entry.attempts - 1))
+    db.commit()
+
+
+@traced()
+async def purge_sent(db: Session, retention_days: int, batch_size: int = 1000) -> int:
+    """Deletes entries sent more than retention_days ago in batches.
+
+    Lookups go through the status and available_at index, every batch is
+    committed on its own so row locks are held briefly.
+
+    :param db: The database session.
+    :type db: Session
+    :param retention_days: Days sent entries are kept for.
+    :type retention_days: int
+    :param batch_size: Max entries deleted in one transaction, defaults to 1000
+    :type batch_size: int, optional
+    :return: Number of deleted entries.
+    :rtype: int
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        ids = select(EmailOutbox.id).where(EmailOutbox.status == SENT, EmailOutbox.available_at < cutoff)\
+            .limit(batch_size).scalar_subquery()
+        count = db.execute(delete(EmailOutbox).where(EmailOutbox.id.in_(ids))).rowcount
+        db.commit()
+        deleted += count
+        if count < batch_size:
+            return deleted
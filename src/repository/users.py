@@ -1,11 +1,14 @@
 
+from sqlalchemy import lambda_stmt, select
 from sqlalchemy.orm import Session
-from libgravatar import Gravatar
 
 from src.database.models import User
+from src.repository import outbox as repository_outbox
 from src.schemas import UserModel
+from src.services.tracing import traced
 
 
+@traced()
 async def get_user_by_email(email: str, db: Session) -> User:
     """Retrieves user with specific email.
 
@@ -17,32 +20,36 @@ async def get_user_by_email(email: str, db: Session) -> User:
     :rtype: User with specific email.
     :rtype: User | None
     """ 
-    return db.query(User).filter(User.email == email).first()
+    return db.scalars(lambda_stmt(lambda: select(User).where(User.email == email))).first()
 
 
-async def create_user(body: UserModel, db: Session) -> User:
+@traced()
+async def create_user(body: UserModel, db: Session, host: str | None = None) -> User:
     """Creates a new user.
 
+    Avatar is left empty, it is resolved later by gravatar_resolver. If host is
+    given, confirmation email is put into outbox in the same transaction.
+
     :param body: The data for the user to create.
     :type body: UserModel
     :param db: The database session.
     :type db: Session
+    :param host: Host for confirmation link, defaults to None
+    :type host: str | None, optional
     :return: The newly created user.
     :rtype: User
     """    
-    avatar = None
-    try:
-        g = Gravatar(body.email)
-        avatar = g.get_image()
-    except Exception as e:
-        print(e)
-    new_user = User(**body.model_dump(), avatar=avatar)
+    new_user = User(**body.model_dump())
     db.add(new_user)
+    if host is not None:
+        repository_outbox.add_email(repository_outbox.CONFIRM_EMAIL, body.email,
+                                    {"email": body.email, "username": body.username, "host": host}, db)
     db.commit()
     db.refresh(new_user)
     return new_user
 
 
+@traced()
 async def update_token(user: User, token: str | None, db: Session) -> None:
     """Updates refresh token.
 
@@ -59,6 +66,7 @@ async def update_token(user: User, token: str | None, db: Session) -> None:
     db.commit()
 
 
+@traced()
 async def confirmed_email(email: str, db: Session) -> None:
     """Makes users email confirmed.
 
@@ -74,6 +82,7 @@ async def confirmed_email(email: str, db: Session) -> None:
     db.commit()
 
 
+@traced()
 async def update_avatar(email: str, url: str, db: Session) -> User:
     """Updates avatar for user with specific email.
 
@@ -1,16 +1,18 @@
 from typing import Union, List
 
 from fastapi import FastAPI, Path, APIRouter, HTTPException, Depends, status
-from fastapi_limiter.depends import RateLimiter
 from sqlalchemy.orm import Session
 
-from src.database.db import get_db
+from src.database.db import SessionReleasingRoute
+from src.database.query_budget import QueryBudget
 from src.database.auth import auth_service
+from src.database.shards import get_contacts_db, get_contacts_read_db
 from src.repository import contacts as repository_contacts
 from src.database.models import Contact, User
 from src.schemas import ContactModel, ContactResponse, ContactUpdate
+from src.services.rate_limit import UserRateLimiter
 
-router = APIRouter(tags=["contacts"])
+router = APIRouter(tags=["contacts"], route_class=SessionReleasingRoute)
 
 
 @router.get("/healthchecker")
@@ -25,12 +27,12 @@ def root() -> dict:
 
 @router.get("/contacts/", 
             response_model=List[ContactResponse], 
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))]
+            dependencies=[Depends(UserRateLimiter("contacts:list")), Depends(QueryBudget(3))]
             )
-async def read_contacts(db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)) -> List[Contact]:
+async def read_contacts(db: Session = Depends(get_contacts_read_db), current_user: User = Depends(auth_service.get_current_user)) -> List[Contact]:
     """Initialize db query to get list of user's contacts.
 
-    :param db: The database session, defaults to Depends(get_db)
+    :param db: The database session, defaults to Depends(get_contacts_read_db)
     :type db: Session, optional
     :param current_user: The user to retrieve contacts for, defaults to Depends(auth_service.get_current_user)
     :type current_user: User, optional
@@ -43,14 +45,14 @@ async def read_contacts(db: Session = Depends(get_db), current_user: User = Depe
 @router.post("/contacts/", 
              response_model=ContactResponse, 
              status_code=status.HTTP_201_CREATED,
-             dependencies=[Depends(RateLimiter(times=10, seconds=60))]
+             dependencies=[Depends(UserRateLimiter("contacts:create")), Depends(QueryBudget(4))]
              )
-async def create_contact(body: ContactModel, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)) -> Contact:
+async def create_contact(body: ContactModel, db: Session = Depends(get_contacts_db), current_user: User = Depends(auth_service.get_current_user)) -> Contact:
     """Initialize db query to get contact that belong to specific user.
 
     :param body: Data for creation new contact.
     :type body: ContactModel
-    :param db: The database session, defaults to Depends(get_db)
+    :param db: The database session, defaults to Depends(get_contacts_db)
     :type db: Session, optional
     :param current_user: The user to create contact for, defaults to Depends(auth_service.get_current_user)
     :type current_user: User, optional
@@ -62,16 +64,16 @@ async def create_contact(body: ContactModel, db: Session = Depends(get_db), curr
 
 @router.get("/contacts/{contact_id}", 
             response_model=ContactResponse,
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))]
+            dependencies=[Depends(UserRateLimiter("contacts:read")), Depends(QueryBudget(3))]
             )
 async def read_contact(contact_id: int = Path(description="The ID of the contact to get", ge=1),
-                       db: Session = Depends(get_db), 
+                       db: Session = Depends(get_contacts_read_db), 
                        current_user: User = Depends(auth_service.get_current_user)) -> Contact:
     """Initialize db query to get user's contact.
 
     :param contact_id: ID to get contact, defaults to Path(description="The ID of the contact to get", ge=1).
     :type contact_id: int, optional
-    :param db: The database session, defaults to Depends(get_db).
+    :param db: The database session, defaults to Depends(get_contacts_read_db).
     :type db: Session, optional
     :param current_user: The user to get contact related for, defaults to Depends(auth_service.get_current_user).
     :type current_user: User, optional
@@ -87,10 +89,10 @@ async def read_contact(contact_id: int = Path(description="The ID of the contact
 
 @router.put("/contacts/{contact_id}", 
             response_model=ContactResponse, 
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))]
+            dependencies=[Depends(UserRateLimiter("contacts:update")), Depends(QueryBudget(4))]
             )
 async def update_contact(body: ContactUpdate, contact_id: int = Path(description="The ID of the contact to put", ge=1),
-                         db: Session = Depends(get_db),
+                         db: Session = Depends(get_contacts_db),
                          current_user: User = Depends(auth_service.get_current_user)) -> Contact:
     """Initialize db query to update contact with specific ID.
 
@@ -98,7 +100,7 @@ async def update_contact(body: ContactUpdate, contact_id: int = Path(description
     :type body: ContactUpdate
     :param contact_id: ID to change contact with, defaults to Path(description="The ID of the contact to put", ge=1)
     :type contact_id: int, optional
-    :param db: The database session, defaults to Depends(get_db)
+    :param db: The database session, defaults to Depends(get_contacts_db)
     :type db: Session, optional
     :param current_user: The user to update contact related for, defaults to Depends(auth_service.get_current_user)
     :type current_user: User, optional
@@ -114,16 +116,16 @@ async def update_contact(body: ContactUpdate, contact_id: int = Path(description
 
 @router.delete("/contacts/{contact_id}", 
                response_model=ContactResponse,
-               dependencies=[Depends(RateLimiter(times=10, seconds=60))]
+               dependencies=[Depends(UserRateLimiter("contacts:delete")), Depends(QueryBudget(4))]
                )
 async def remove_contact(contact_id: int = Path(description="The ID of the contact to delete", ge=1),
-                         db: Session = Depends(get_db),
+                         db: Session = Depends(get_contacts_db),
                          current_user: User = Depends(auth_service.get_current_user)) -> Contact:
     """Initialize db query to remove contact with specific ID.
 
     :param contact_id: ID to remove contact with, defaults to Path(description="The ID of the contact to delete", ge=1)
     :type contact_id: int, optional
-    :param db: The database session, defaults to Depends(get_db)
+    :param db: The database session, defaults to Depends(get_contacts_db)
     :type db: Session, optional
     :param current_user: The user to remove contact related for, defaults to Depends(auth_service.get_current_user)
     :type current_user: User, optional
@@ -139,16 +141,16 @@ async def remove_contact(contact_id: int = Path(description="The ID of the conta
 
 @router.get("/contacts/search-by-firstname/{firstname}", 
             response_model=List[ContactResponse],
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))]
+            dependencies=[Depends(UserRateLimiter("contacts:search")), Depends(QueryBudget(3))]
             )
 async def read_contacts_by_firstname(firstname: str = Path(description="Show contacts with name", min_length=2, max_length=50),
-                                     db: Session = Depends(get_db),
+                                     db: Session = Depends(get_contacts_read_db),
                                      current_user: User = Depends(auth_service.get_current_user)) -> List[Contact]:
     """Initialize db query to get list of contacts with specific firstname.
 
     :param firstname: Firstname to get contacts with, defaults to Path(description="Show contacts with name", min_length=2, max_length=50).
     :type firstname: str, optional
-    :param db: The database session, defaults to Depends(get_db).
+    :param db: The database session, defaults to Depends(get_contacts_read_db).
     :type db: Session, optional
     :param current_user: The user to get list of contacts related with, defaults to Depends(auth_service.get_current_user).
     :type current_user: User, optional
@@ -160,16 +162,16 @@ async def read_contacts_by_firstname(firstname: str = Path(description="Show con
 
 @router.get("/contacts/search-by-lastname/{lastname}", 
             response_model=List[ContactResponse],
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))]
+            dependencies=[Depends(UserRateLimiter("contacts:search")), Depends(QueryBudget(3))]
             )
 async def read_contacts_by_lastname(lastname: str = Path(description="Show contacts with lastname", min_length=2, max_length=50),
-                                    db: Session = Depends(get_db),
+                                    db: Session = Depends(get_contacts_read_db),
                                     current_user: User = Depends(auth_service.get_current_user)) -> List[Contact]:
     """Initialize db query to get list of contacts with specific lastname.
 
     :param lastname: Lastname to get contacts with, defaults to Path(description="Show contacts with lastname", min_length=2, max_length=50)
     :type lastname: str, optional
-    :param db: The database session, defaults to Depends(get_db)
+    :param db: The database session, defaults to Depends(get_contacts_read_db)
     :type db: Session, optional
     :param current_user: The user to get list of contacts related with, defaults to Depends(auth_service.get_current_user)
     :type current_user: User, optional
@@ -181,16 +183,16 @@ async def read_contacts_by_lastname(lastname: str = Path(description="Show conta
 
 @router.get("/contacts/search-by-email/{email}", 
             response_model=List[ContactResponse],
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))]
+            dependencies=[Depends(UserRateLimiter("contacts:search")), Depends(QueryBudget(3))]
             )
 async def read_contacts_by_email(email: str = Path(description="Show contacts with email", min_length=2, max_length=50),
-                                 db: Session = Depends(get_db),
+                                 db: Session = Depends(get_contacts_read_db),
                                  current_user: User = Depends(auth_service.get_current_user)) -> List[Contact]:
     """Initialize db query to get list of contacts with specific email.
 
     :param email: Email to get contacts with, defaults to Path(description="Show contacts with email", min_length=2, max_length=50)
     :type email: str, optional
-    :param db: The database session, defaults to Depends(get_db)
+    :param db: The database session, defaults to Depends(get_contacts_read_db)
     :type db: Session, optional
     :param current_user: The user to get list of contacts related with, defaults to Depends(auth_service.get_current_user)
     :type current_user: User, optional
@@ -202,13 +204,13 @@ async def read_contacts_by_email(email: str = Path(description="Show contacts wi
 
 @router.get("/contacts/birthday-contacts/", 
             response_model=List[ContactResponse], 
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))]
+            dependencies=[Depends(UserRateLimiter("contacts:birthdays")), Depends(QueryBudget(3))]
             )
-async def read_contacts_with_recent_birthdays(db: Session = Depends(get_db), 
+async def read_contacts_with_recent_birthdays(db: Session = Depends(get_contacts_read_db), 
                                               current_user: User = Depends(auth_service.get_current_user)) -> List[Contact]:
     """Initialize db query to get list of contacts with birthday next week related to specific user.
 
-    :param db: The database session, defaults to Depends(get_db).
+    :param db: The database session, defaults to Depends(get_contacts_read_db).
     :type db: Session, optional
     :param current_user: The user to get list of contacts related with, defaults to Depends(auth_service.get_current_user).
     :type current_user: User, optional
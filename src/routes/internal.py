@@ -0,0 +1,145 @@
+from pathlib import Path
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse
+
+from src.conf.config import settings
+from src.database.auth import auth_service
+from src.database.db import engine, SessionReleasingRoute
+from src.database.slow_queries import slow_query_log
+from src.services.memory import live_objects, memory_tracker
+from src.services.profiling import list_profiles
+
+router = APIRouter(prefix='/internal', tags=["internal"], dependencies=[Depends(auth_service.get_current_admin)],
+                   route_class=SessionReleasingRoute)
+
+
+@router.get("/db/pool")
+async def db_pool_stats() -> dict:
+    """Gets state of database connection pool: checked out connections, overflow and checkout wait times.
+
+    :return: Dictionary with pool statistics.
+    :rtype: dict
+    """
+    return engine.pool.stats()
+
+
+
+@router.get("/db/slow-queries")
+async def slow_queries() -> List[dict]:
+    """Gets recent statements slower than settings.slow_query_ms, newest first.
+
+    :return: Slow query entries with SQL, parameter types, duration, caller, route and sampled plan.
+    :rtype: List[dict]
+    """
+    return slow_query_log.recent()
+
+
+@router.get("/profiles")
+async def profiles() -> List[str]:
+    """Gets names of request profiles saved by ProfilerMiddleware, newest first.
+
+    :return: Profile names.
+    :rtype: List[str]
+    """
+    return list_profiles(settings.profile_dir)
+
+
+@router.get("/profiles/{name}", response_class=FileResponse)
+async def read_profile(name: str) -> FileResponse:
+    """Downloads request profile in speedscope format.
+
+    :param name: Profile name from X-Profile-Id header.
+    :type name: str
+    :raises HTTPException: If profile does not exist.
+    :return: Profile file.
+    :rtype: FileResponse
+    """
+    if name not in list_profiles(settings.profile_dir):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return FileResponse(Path(settings.profile_dir) / name, media_type="application/json")
+
+
+@router.get("/memory")
+def memory_status() -> dict:
+    """Gets tracemalloc state with current and peak traced memory.
+
+    :return: Tracing status.
+    :rtype: dict
+    """
+    return memory_tracker.status()
+
+
+@router.post("/memory/start")
+def memory_start(frames: int = Query(1, ge=1, le=100)) -> dict:
+    """Starts tracemalloc and takes baseline snapshot.
+
+    :param frames: Frames stored per allocation, defaults to 1
+    :type frames: int, optional
+    :return: Tracing status.
+    :rtype: dict
+    """
+    return memory_tracker.start(frames)
+
+
+@router.post("/memory/stop")
+def memory_stop() -> dict:
+    """Stops tracemalloc.
+
+    :return: Tracing status.
+    :rtype: dict
+    """
+    return memory_tracker.stop()
+
+
+@router.post("/memory/baseline")
+def memory_baseline() -> dict:
+    """Takes new baseline snapshot for /memory/diff.
+
+    :return: Tracing status.
+    :rtype: dict
+    """
+    return memory_tracker.reset_baseline()
+
+
+@router.get("/memory/top")
+def memory_top(limit: int = Query(20, ge=1, le=500),
+               group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$")) -> List[dict]:
+    """Gets allocation sites holding most memory.
+
+    :param limit: Number of sites, defaults to 20
+    :type limit: int, optional
+    :param group_by: "lineno", "filename" or "traceback", defaults to "lineno"
+    :type group_by: str, optional
+    :return: Allocation sites.
+    :rtype: List[dict]
+    """
+    return memory_tracker.top(limit, group_by)
+
+
+@router.get("/memory/diff")
+def memory_diff(limit: int = Query(20, ge=1, le=500),
+                group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$")) -> List[dict]:
+    """Gets allocation sites that grew most since baseline.
+
+    :param limit: Number of sites, defaults to 20
+    :type limit: int, optional
+    :param group_by: "lineno", "filename" or "traceback", defaults to "lineno"
+    :type group_by: str, optional
+    :return: Allocation sites with changes.
+    :rtype: List[dict]
+    """
+    return memory_tracker.diff(limit, group_by)
+
+
+@router.get("/memory/objects")
+def memory_objects(limit: int = Query(20, ge=1, le=500)) -> dict:
+    """Counts live objects: ORM instances, Pydantic models, bytes buffers and most common types.
+
+    :param limit: Number of most common types, defaults to 20
+    :type limit: int, optional
+    :return: Object counts.
+    :rtype: dict
+    """
+    return live_objects(limit)
@@ -1,22 +1,22 @@
 from typing import List
 
-from fastapi import APIRouter, HTTPException, Depends, status, Security, BackgroundTasks, Request, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, status, Security, Request, UploadFile, File, BackgroundTasks
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
 from fastapi_limiter.depends import RateLimiter
 from sqlalchemy.orm import Session
-import cloudinary
-import cloudinary.uploader
 
-from src.database.db import get_db
+from src.database.db import get_db, get_read_db, SessionReleasingRoute
+from src.database.query_budget import QueryBudget
 from src.schemas import UserModel, UserResponse, TokenModel, RequestEmail
 from src.repository import users as repository_users
+from src.repository import outbox as repository_outbox
 from src.database.auth import auth_service
-from src.services.email import send_email
 from src.schemas import UserDb
-from src.conf.config import settings
+from src.services.avatars import avatar_service
+from src.services.gravatar import gravatar_resolver
 from src.database.models import User
 
-router = APIRouter(prefix='/auth', tags=["auth"])
+router = APIRouter(prefix='/auth', tags=["auth"], route_class=SessionReleasingRoute)
 security = HTTPBearer()
 
 
@@ -24,12 +24,15 @@ security = HTTPBearer()
              response_model=UserResponse, 
              status_code=status.HTTP_201_CREATED
              )
-async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request, db: Session = Depends(get_db)) -> dict:
-    """Initialize db query to create new user.
+async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request,
+                 db: Session = Depends(get_db)) -> dict:
+    """Initialize db query to create new user, confirmation email is saved to outbox with the user.
+
+    Gravatar is looked up after the response is sent.
 
     :param body: Data for creating new user.
     :type body: UserModel
-    :param background_tasks: BackgroundTasks to sent email background.
+    :param background_tasks: Tasks run after response.
     :type background_tasks: BackgroundTasks
     :param request: Request to get url from.
     :type request: Request
@@ -43,8 +46,8 @@ async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Re
     if exist_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
     body.password = auth_service.get_password_hash(body.password)
-    new_user = await repository_users.create_user(body, db)
-    background_tasks.add_task(send_email, new_user.email, new_user.username, request.base_url)
+    new_user = await repository_users.create_user(body, db, host=str(request.base_url))
+    background_tasks.add_task(gravatar_resolver.update_user_avatar, new_user.id, new_user.email)
     return {"user": new_user, "detail": "User successfully created"}
 
 
@@ -133,14 +136,11 @@ async def confirmed_email(token: str, db: Session = Depends(get_db)) -> dict:
 @router.post('/request_email',
              dependencies=[Depends(RateLimiter(times=10, seconds=60))]
              )
-async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
-                        db: Session = Depends(get_db)) -> dict:
-    """Sends email for email confirmation.
+async def request_email(body: RequestEmail, request: Request, db: Session = Depends(get_db)) -> dict:
+    """Saves email for email confirmation to outbox.
 
     :param body: Email to confirm.
     :type body: RequestEmail
-    :param background_tasks: BackgroundTasks to sent email background.
-    :type background_tasks: BackgroundTasks
     :param request: Request to get url from.
     :type request: Request
     :param db: The database session, defaults to Depends(get_db)
@@ -153,11 +153,13 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
     if user.confirmed:
         return {"message": "Your email is already confirmed"}
     if user:
-        background_tasks.add_task(send_email, user.email, user.username, request.base_url)
+        await repository_outbox.enqueue_email(repository_outbox.CONFIRM_EMAIL, user.email,
+                                              {"email": user.email, "username": user.username,
+                                               "host": str(request.base_url)}, db)
     return {"message": "Check your email for confirmation."}
 
 
-@router.get("/me/", response_model=UserDb)
+@router.get("/me/", response_model=UserDb, dependencies=[Depends(get_read_db), Depends(QueryBudget(1))])
 async def read_users_me(current_user: User = Depends(auth_service.get_current_user)) -> User:
     """Gets information about user.
 
@@ -180,18 +182,10 @@ async def update_avatar_user(file: UploadFile = File(), current_user: User = Dep
     :type current_user: User, optional
     :param db: The database session, defaults to Depends(get_db)
     :type db: Session, optional
+    :raises HTTPException: If file is too large or is not an image.
     :return: User with updated avatar.
     :rtype: User
     """     
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
-
-    r = cloudinary.uploader.upload(file.file, public_id=f'NotesApp/{current_user.username}', overwrite=True)
-    src_url = cloudinary.CloudinaryImage(f'NotesApp/{current_user.username}')\
-                        .build_url(width=250, height=250, crop='fill', version=r.get('version'))
+    src_url = await avatar_service.upload(file, 'NotesApp')
     user = await repository_users.update_avatar(current_user.email, src_url, db)
     return user
\ No newline at end of file
@@ -1,4 +1,5 @@
 from datetime import datetime, date
+from typing import Optional
 
 from pydantic import BaseModel, Field, EmailStr
 
@@ -44,7 +45,7 @@ class UserDb(BaseModel):
     username: str
     email: str
     created_at: datetime
-    avatar: str
+    avatar: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -0,0 +1,332 @@
+import hashlib
+import io
+import shutil
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import BinaryIO, Set
+
+import cloudinary
+import cloudinary.exceptions
+import cloudinary.uploader
+import httpx
+from fastapi import HTTPException, UploadFile, status
+from fastapi.staticfiles import StaticFiles
+from opentelemetry.trace import SpanKind
+from PIL import Image, ImageOps
+from starlette.concurrency import run_in_threadpool
+
+from src.conf.config import settings
+from src.services.tracing import traced
+
+
+CHUNK_SIZE = 1024 * 1024
+READ_SIZE = 64 * 1024
+FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Bump when process_image output changes, new uploads then get new names instead of old immutable files
+PIPELINE_VERSION = 1
+
+
+class StorageError(Exception):
+    """Raised by storage backends when an avatar can not be saved."""
+
+
+def process_image(fileobj: BinaryIO, size: int = 250, fmt: str = "webp", quality: int = 80,
+                  max_pixels: int = 40_000_000) -> bytes:
+    """Decodes image, crops it to size x size square and encodes it again.
+
+    JPEG images are decoded with draft mode, so large photos are scaled down
+    by the decoder instead of being fully loaded.
+
+    :param fileobj: Encoded image positioned at start.
+    :type fileobj: BinaryIO
+    :param size: Side of square avatar, defaults to 250
+    :type size: int, optional
+    :param fmt: Output format, webp or jpeg, defaults to "webp"
+    :type fmt: str, optional
+    :param quality: Encoder quality, defaults to 80
+    :type quality: int, optional
+    :param max_pixels: Max pixels of source image, defaults to 40_000_000
+    :type max_pixels: int, optional
+    :raises ValueError: If image is too big or can not be decoded.
+    :return: Encoded avatar.
+    :rtype: bytes
+    """
+    try:
+        img = Image.open(fileobj)
+        if img.width * img.height > max_pixels:
+            raise ValueError(f"Image has more than {max_pixels} pixels")
+        img.draft("RGB", (size * 2, size * 2))
+        img = ImageOps.exif_transpose(img)
+        img = ImageOps.fit(img, (size, size), Image.LANCZOS)
+    except (OSError, Image.DecompressionBombError) as err:
+        raise ValueError(str(err)) from err
+    if fmt == "jpeg" or img.mode not in ("RGB", "RGBA"):
+        alpha = "A" in img.getbands() or "transparency" in img.info
+        img = img.convert("RGBA" if fmt == "webp" and alpha else "RGB")
+    out = io.BytesIO()
+    img.save(out, FORMATS[fmt], quality=quality)
+    return out.getvalue()
+
+
+async def hash_upload(file: UploadFile, max_bytes: int) -> str:
+    """Hashes upload in chunks and stops as soon as it is bigger than limit.
+
+    Chunks are not kept, uploads over 1 MB are spooled to disk by Starlette,
+    so memory does not grow with file size. File is left at its start.
+
+    :param file: Uploaded file.
+    :type file: UploadFile
+    :param max_bytes: Max size of file.
+    :type max_bytes: int
+    :raises HTTPException: If file is bigger than max_bytes.
+    :return: sha256 hex digest of file.
+    :rtype: str
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Avatar is too large")
+    await file.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := await file.read(READ_SIZE):
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Avatar is too large")
+        digest.update(chunk)
+    await file.seek(0)
+    return digest.hexdigest()
+
+
+class AvatarStorage(ABC):
+    """Place where avatars are kept. Methods are blocking and run in thread pool."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Checks if image is already saved.
+
+        :param key: Name of image in storage.
+        :type key: str
+        :return: True if image exists.
+        :rtype: bool
+        """
+
+    @abstractmethod
+    def save(self, fileobj: BinaryIO, key: str) -> str:
+        """Saves image and returns its public url.
+
+        :param fileobj: Image file positioned at start.
+        :type fileobj: BinaryIO
+        :param key: Name of image in storage.
+        :type key: str
+        :raises StorageError: If image can not be saved.
+        :return: Url of saved avatar.
+        :rtype: str
+        """
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        """Gets public url of image.
+
+        :param key: Name of image in storage.
+        :type key: str
+        :return: Url of avatar.
+        :rtype: str
+        """
+
+
+class CloudinaryStorage(AvatarStorage):
+
+    """Cloudinary backend, existence is checked on the delivery url.
+
+    The Admin API has an hourly quota, so it is not called per upload. Names
+    are content hashes, an image that exists once exists for good, so found
+    names are cached. A wrong answer costs one upload, which never replaces
+    the stored image as it is sent with overwrite=False.
+    """
+
+    def __init__(self, cloud_name: str, api_key: str, api_secret: str, timeout: float = 2.0,
+                 cache_size: int = 10_000):
+        """Configures cloudinary client once.
+
+        :param cloud_name: Cloudinary cloud name.
+        :type cloud_name: str
+        :param api_key: Cloudinary api key.
+        :type api_key: str
+        :param api_secret: Cloudinary api secret.
+        :type api_secret: str
+        :param timeout: Timeout of HEAD request in seconds, defaults to 2.0
+        :type timeout: float, optional
+        :param cache_size: Max names remembered as existing, defaults to 10_000
+        :type cache_size: int, optional
+        """
+        cloudinary.config(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True)
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.known: Set[str] = set()
+
+    def _remember(self, key: str) -> None:
+        if len(self.known) >= self.cache_size:
+            self.known.clear()
+        self.known.add(key)
+
+    @traced("cloudinary head", kind=SpanKind.CLIENT)
+    def exists(self, key: str) -> bool:
+        if key in self.known:
+            return True
+        try:
+            response = httpx.head(self.url(key), timeout=self.timeout, follow_redirects=True)
+        except httpx.HTTPError:
+            return False
+        if response.status_code != 200:
+            return False
+        self._remember(key)
+        return True
+
+    @traced("cloudinary upload", kind=SpanKind.CLIENT)
+    def save(self, fileobj: BinaryIO, key: str) -> str:
+        public_id, _, _ = key.rpartition('.')
+        try:
+            cloudinary.uploader.upload_large(fileobj, public_id=public_id, overwrite=False, chunk_size=CHUNK_SIZE)
+        except (cloudinary.exceptions.Error, OSError) as err:
+            raise StorageError(f"Cloudinary upload failed: {err}") from err
+        self._remember(key)
+        return self.url(key)
+
+    def url(self, key: str) -> str:
+        public_id, _, fmt = key.rpartition('.')
+        return cloudinary.CloudinaryImage(public_id).build_url(format=fmt)
+
+
+class LocalStorage(AvatarStorage):
+
+    def __init__(self, folder: Path, base_url: str):
+        """Creates storage in local folder.
+
+        :param folder: Folder to keep avatars in.
+        :type folder: Path
+        :param base_url: Url the folder is served from.
+        :type base_url: str
+        """
+        self.folder = Path(folder)
+        self.base_url = base_url.rstrip('/')
+
+    def _path(self, key: str) -> Path:
+        path = (self.folder / key).resolve()
+        if not path.is_relative_to(self.folder.resolve()):
+            raise ValueError(f"Invalid avatar id: {key}")
+        return path
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def save(self, fileobj: BinaryIO, key: str) -> str:
+        path = self._path(key)
+        tmp = path.with_name(path.name + '.part')
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, 'wb') as out:
+                shutil.copyfileobj(fileobj, out, CHUNK_SIZE)
+            tmp.replace(path)
+        except OSError as err:
+            if tmp.exists():
+                tmp.unlink()
+            raise StorageError(f"Can not save avatar: {err}") from err
+        return self.url(key)
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """Static files with far-future caching, avatar names change with their content."""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = IMMUTABLE
+        return response
+
+
+class AvatarService:
+
+    def __init__(self, storage: AvatarStorage, size: int = 250, fmt: str = "webp", quality: int = 80,
+                 max_bytes: int = 5 * 1024 * 1024, max_pixels: int = 40_000_000):
+        """Creates service on top of storage backend.
+
+        :param storage: Storage backend.
+        :type storage: AvatarStorage
+        :param size: Side of square avatar, defaults to 250
+        :type size: int, optional
+        :param fmt: Output format, webp or jpeg, defaults to "webp"
+        :type fmt: str, optional
+        :param quality: Encoder quality, defaults to 80
+        :type quality: int, optional
+        :param max_bytes: Max size of uploaded file, defaults to 5 MB
+        :type max_bytes: int, optional
+        :param max_pixels: Max pixels of uploaded image, defaults to 40_000_000
+        :type max_pixels: int, optional
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported avatar format: {fmt}")
+        self.storage = storage
+        self.size = size
+        self.fmt = fmt
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+
+    @classmethod
+    def from_settings(cls) -> "AvatarService":
+        """Creates service with backend selected by settings.avatar_storage.
+
+        :return: New service.
+        :rtype: AvatarService
+        """
+        if settings.avatar_storage == "local":
+            storage = LocalStorage(Path(settings.avatar_local_dir), settings.avatar_base_url)
+        else:
+            storage = CloudinaryStorage(settings.cloudinary_name, settings.cloudinary_api_key,
+                                        settings.cloudinary_api_secret)
+        return cls(storage, settings.avatar_size, settings.avatar_format, settings.avatar_quality,
+                   settings.avatar_max_bytes, settings.avatar_max_pixels)
+
+    def key(self, prefix: str, digest: str) -> str:
+        """Builds storage name from hash of uploaded file, output settings and pipeline version.
+
+        :param prefix: Folder in storage.
+        :type prefix: str
+        :param digest: Hex digest of uploaded file.
+        :type digest: str
+        :return: Name of avatar in storage.
+        :rtype: str
+        """
+        return f"{prefix}/{digest[:32]}_{self.size}_q{self.quality}_v{PIPELINE_VERSION}.{self.fmt}"
+
+    async def upload(self, file: UploadFile, prefix: str) -> str:
+        """Resizes avatar and saves it by content hash, identical images are stored once.
+
+        Decoding, encoding and storage calls run in thread pool, so event loop is not blocked.
+
+        :param file: Uploaded file.
+        :type file: UploadFile
+        :param prefix: Folder in storage.
+        :type prefix: str
+        :raises HTTPException: If file is too large, is not an image or storage is unavailable.
+        :return: Url of saved avatar.
+        :rtype: str
+        """
+        digest = await hash_upload(file, self.max_bytes)
+        key = self.key(prefix, digest)
+        if await run_in_threadpool(self.storage.exists, key):
+            return self.storage.url(key)
+        try:
+            avatar = await run_in_threadpool(process_image, file.file, self.size, self.fmt, self.quality,
+                                             self.max_pixels)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Invalid image")
+        try:
+            return await run_in_threadpool(self.storage.save, io.BytesIO(avatar), key)
+        except StorageError:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Avatar storage is unavailable")
+
+
+avatar_service = AvatarService.from_settings()
@@ -0,0 +1,198 @@
+import argparse
+import asyncio
+import json
+import logging
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.db import SessionLocal
+from src.database.models import Contact, User
+from src.database.shards import ShardMap, shard_map as default_shard_map
+from src.repository import outbox as repository_outbox
+from src.services.birthdays import days_until_birthdays, to_datetime64
+
+
+logger = logging.getLogger(__name__)
+
+
+def _contact_rows(db: Session, users: list, after_user_id: int, shard_map: ShardMap) -> list:
+    stmt = select(Contact.user_id, Contact.id, Contact.firstname, Contact.lastname, Contact.birthday)\
+        .where(Contact.birthday.is_not(None))
+    if not shard_map.enabled:
+        return db.execute(stmt.where(Contact.user_id > after_user_id, Contact.user_id <= users[-1].id)
+                          .order_by(Contact.user_id, Contact.id)).all()
+    rows = []
+    for session, user_ids in shard_map.contact_sessions(db, [user.id for user in users]):
+        rows.extend(session.execute(stmt.where(Contact.user_id.in_(user_ids))).all())
+    return sorted(rows, key=lambda row: (row.user_id, row.id))
+
+
+def iter_upcoming(db: Session, today: date, days: int, after_user_id: int = 0, page_size: int = 1000,
+                  shard_map: ShardMap = default_shard_map) -> Iterator[Tuple[int, str, str, List[dict]]]:
+    """Yields users in id order with contacts having birthdays in next days.
+
+    Users are read in pages of page_size with keyset pagination and every page is
+    fetched completely, so no cursor stays open while the caller commits through
+    the same session and memory does not depend on table size. With sharding,
+    contacts of a page are read from the shard of every user.
+
+    :param db: The database session.
+    :type db: Session
+    :param today: Date to count from.
+    :type today: date
+    :param days: Number of days to look ahead.
+    :type days: int
+    :param after_user_id: Skip users with id less or equal, defaults to 0
+    :type after_user_id: int, optional
+    :param page_size: Users read at once, defaults to 1000
+    :type page_size: int, optional
+    :param shard_map: Placement of contacts, defaults to shard map configured by settings
+    :type shard_map: ShardMap, optional
+    :return: Iterator of user id, email, username and contacts with upcoming birthdays, possibly empty.
+    :rtype: Iterator[Tuple[int, str, str, List[dict]]]
+    """
+    while True:
+        users = db.execute(select(User.id, User.email, User.username).where(User.id > after_user_id)
+                           .order_by(User.id).limit(page_size)).all()
+        if not users:
+            return
+        rows = _contact_rows(db, users, after_user_id, shard_map)
+        birthdays = to_datetime64([row.birthday for row in rows])
+        left = days_until_birthdays(birthdays, today).tolist() if rows else []
+        upcoming: Dict[int, List[dict]] = {}
+        for row, birthday, days_left in zip(rows, birthdays.tolist(), left):
+            if days_left < days:
+                upcoming.setdefault(row.user_id, []).append({"firstname": row.firstname, "lastname": row.lastname,
+                                                             "birthday": birthday.isoformat(), "days": days_left})
+        for user_id, email, username in users:
+            contacts = sorted(upcoming.get(user_id, []), key=lambda contact: contact["days"])
+            yield user_id, email, username, contacts
+        after_user_id = users[-1].id
+
+
+def read_checkpoint(path: Path, today: date) -> int:
+    """Gets last processed user id of today's run.
+
+    :param path: Checkpoint file.
+    :type path: Path
+    :param today: Date of the run.
+    :type today: date
+    :return: Last processed user id or 0 if run for today has not started.
+    :rtype: int
+    """
+    try:
+        data = json.loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        return 0
+    if data.get("date") != today.isoformat():
+        return 0
+    return int(data.get("last_user_id", 0))
+
+
+def write_checkpoint(path: Path, today: date, last_user_id: int) -> None:
+    """Saves progress of run atomically.
+
+    :param path: Checkpoint file.
+    :type path: Path
+    :param today: Date of the run.
+    :type today: date
+    :param last_user_id: Last user whose digest is saved.
+    :type last_user_id: int
+    """
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"date": today.isoformat(), "last_user_id": last_user_id}))
+    tmp.replace(path)
+
+
+def run(today: date, days: int, checkpoint: Path, session_factory: Callable[[], Session] = SessionLocal,
+        batch_users: int = 500, shard_map: ShardMap = default_shard_map) -> int:
+    """Queues one digest email per user with birthdays of contacts in next days.
+
+    Digests go to email outbox. Contacts are read and digests written over one
+    session of the primary, contacts on shards are read over one shard session
+    at a time, progress is committed every batch_users users and saved to
+    checkpoint, so restarted run continues after last saved user.
+
+    :param today: Date of the run.
+    :type today: date
+    :param days: Number of days to look ahead.
+    :type days: int
+    :param checkpoint: Checkpoint file.
+    :type checkpoint: Path
+    :param session_factory: Factory of database sessions, defaults to SessionLocal
+    :type session_factory: Callable[[], Session], optional
+    :param batch_users: Users per commit, defaults to 500
+    :type batch_users: int, optional
+    :param shard_map: Placement of contacts, defaults to shard map configured by settings
+    :type shard_map: ShardMap, optional
+    :return: Number of queued digests.
+    :rtype: int
+    """
+    after_user_id = read_checkpoint(checkpoint, today)
+    db = session_factory()
+    queued = 0
+    pending = 0
+    last_user_id = after_user_id
+    try:
+        for user_id, email, username, contacts in iter_upcoming(db, today, days, after_user_id, batch_users,
+                                                                    shard_map):
+            if contacts:
+                repository_outbox.add_email(repository_outbox.BIRTHDAY_DIGEST, email,
+                                            {"email": email, "username": username, "days": days,
+                                             "contacts": contacts}, db)
+                queued += 1
+            last_user_id = user_id
+            pending += 1
+            if pending >= batch_users:
+                db.commit()
+                write_checkpoint(checkpoint, today, last_user_id)
+                pending = 0
+        db.commit()
+        write_checkpoint(checkpoint, today, last_user_id)
+    finally:
+        db.close()
+    logger.info("Queued %s birthday digests for %s", queued, today)
+    return queued
+
+
+async def run_daily(days: int, checkpoint: Path, at_hour: int) -> None:
+    """Runs job every day at given UTC hour.
+
+    :param days: Number of days to look ahead.
+    :type days: int
+    :param checkpoint: Checkpoint file.
+    :type checkpoint: Path
+    :param at_hour: UTC hour to run at.
+    :type at_hour: int
+    """
+    while True:
+        now = datetime.utcnow()
+        start = now.replace(hour=at_hour, minute=0, second=0, microsecond=0)
+        if start <= now:
+            await asyncio.to_thread(run, now.date(), days, checkpoint)
+            start += timedelta(days=1)
+        await asyncio.sleep((start - datetime.utcnow()).total_seconds())
+
+
+def main() -> None:
+    """Entry point of birthday reminder job."""
+    parser = argparse.ArgumentParser(description="Queue birthday digest emails for all users.")
+    parser.add_argument("--days", type=int, default=settings.birthday_reminder_days)
+    parser.add_argument("--checkpoint", type=Path, default=Path(settings.birthday_reminder_checkpoint))
+    parser.add_argument("--date", type=date.fromisoformat, default=None, help="run for date, defaults to today")
+    parser.add_argument("--daily", action="store_true", help="keep running and start every day")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.daily:
+        asyncio.run(run_daily(args.days, args.checkpoint, settings.birthday_reminder_hour))
+    else:
+        run(args.date or datetime.utcnow().date(), args.days, args.checkpoint)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+from contextlib import nullcontext
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.database.models import Contact
+from src.database.shards import PRIMARY, ShardMap, shard_map as default_shard_map
+
+
+def to_datetime64(values) -> np.ndarray:
+    """Converts dates, datetimes or None values to datetime64[D] array, None becomes NaT.
+
+    :param values: Sequence of dates.
+    :return: Array of days.
+    :rtype: np.ndarray
+    """
+    return np.array(values, dtype="datetime64[D]")
+
+
+def _month_and_day(days: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Splits day numbers into month of year and day of month.
+
+    Casting millions of dates to datetime64[M] is slow, so month and day are
+    computed once for every distinct day in the range and then looked up.
+
+    :param days: Days since 1970-01-01.
+    :type days: np.ndarray
+    :return: Month index 0-11 and day index starting from 0.
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    """
+    low = days.min()
+    table = np.arange(low, days.max() + 1).astype("datetime64[D]")
+    months = table.astype("datetime64[M]")
+    month_of_year = months.astype(np.int64) % 12
+    day_of_month = (table - months.astype("datetime64[D]")).astype(np.int64)
+    index = days - low
+    return month_of_year[index], day_of_month[index]
+
+
+def _occurrence(year: int, month_of_year: np.ndarray, day_of_month: np.ndarray) -> np.ndarray:
+    """Builds birthday day numbers in given year, days past month end are moved to last day of month.
+
+    :param year: Year of birthday.
+    :type year: int
+    :param month_of_year: Month index 0-11.
+    :type month_of_year: np.ndarray
+    :param day_of_month: Day index starting from 0.
+    :type day_of_month: np.ndarray
+    :return: Days since 1970-01-01.
+    :rtype: np.ndarray
+    """
+    months = np.arange(f"{year}-01", f"{year + 1}-02", dtype="datetime64[M]").astype("datetime64[D]").astype(np.int64)
+    starts, lengths = months[:-1], np.diff(months)
+    return starts[month_of_year] + np.minimum(day_of_month, lengths[month_of_year] - 1)
+
+
+def days_until_birthdays(birthdays: np.ndarray, today: date) -> np.ndarray:
+    """Gets days until next birthday for every date of birth.
+
+    29 February is celebrated on 28 February in common years, birthdays already
+    passed this year wrap to next year. NaT values give -1.
+
+    :param birthdays: Dates of birth as datetime64[D].
+    :type birthdays: np.ndarray
+    :param today: Date to count from.
+    :type today: date
+    :return: Days until next birthday, 0 if birthday is today.
+    :rtype: np.ndarray
+    """
+    birthdays = birthdays.astype("datetime64[D]")
+    missing = np.isnat(birthdays)
+    days = np.full(len(birthdays), -1, dtype=np.int64)
+    if missing.all():
+        return days
+    month_of_year, day_of_month = _month_and_day(birthdays[~missing].astype(np.int64))
+
+    now = np.datetime64(today, "D").astype(np.int64)
+    upcoming = _occurrence(today.year, month_of_year, day_of_month)
+    passed = upcoming < now
+    if passed.any():
+        upcoming[passed] = _occurrence(today.year + 1, month_of_year[passed], day_of_month[passed])
+    days[~missing] = upcoming - now
+    return days
+
+
+def top_k_per_user(user_ids: np.ndarray, contact_ids: np.ndarray, days: np.ndarray, k: int,
+                   within: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Selects k nearest birthdays for every user.
+
+    :param user_ids: User id of every contact.
+    :type user_ids: np.ndarray
+    :param contact_ids: Contact ids.
+    :type contact_ids: np.ndarray
+    :param days: Days until birthday, negative values are skipped.
+    :type days: np.ndarray
+    :param k: Max contacts per user.
+    :type k: int
+    :param within: Keep only birthdays in less than within days, defaults to None
+    :type within: Optional[int], optional
+    :return: User ids, contact ids and days ordered by user and days.
+    :rtype: Tuple[np.ndarray, np.ndarray, np.ndarray]
+    """
+    keep = days >= 0
+    if within is not None:
+        keep &= days < within
+    user_ids, contact_ids, days = user_ids[keep], contact_ids[keep], days[keep]
+    order = np.lexsort((contact_ids, days, user_ids))
+    user_ids, contact_ids, days = user_ids[order], contact_ids[order], days[order]
+    if len(user_ids) == 0:
+        return user_ids, contact_ids, days
+    positions = np.arange(len(user_ids))
+    starts = np.empty(len(user_ids), dtype=bool)
+    starts[0] = True
+    starts[1:] = user_ids[1:] != user_ids[:-1]
+    rank = positions - np.maximum.accumulate(np.where(starts, positions, 0))
+    top = rank < k
+    return user_ids[top], contact_ids[top], days[top]
+
+
+def _chunks(db: Session, chunk_size: int) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    stmt = select(Contact.user_id, Contact.id, Contact.birthday)\
+        .where(Contact.birthday.is_not(None))\
+        .execution_options(stream_results=True, yield_per=chunk_size)
+    for rows in db.execute(stmt).partitions():
+        user_ids, contact_ids, birthdays = zip(*rows)
+        yield (np.fromiter(user_ids, dtype=np.int64, count=len(rows)),
+               np.fromiter(contact_ids, dtype=np.int64, count=len(rows)),
+               to_datetime64(birthdays))
+
+
+def iter_birthday_chunks(db: Session, chunk_size: int = 100_000,
+                         shard_map: ShardMap = default_shard_map) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Streams birthdays of all contacts as arrays.
+
+    With sharding the primary and every shard are streamed in turn, rows of
+    users placed elsewhere, e.g. left behind by an unfinished move, are skipped.
+
+    :param db: Session of primary database.
+    :type db: Session
+    :param chunk_size: Rows per chunk, defaults to 100_000
+    :type chunk_size: int, optional
+    :param shard_map: Placement of contacts, defaults to shard map configured by settings
+    :type shard_map: ShardMap, optional
+    :return: Iterator of user ids, contact ids and birthdays as datetime64[D].
+    :rtype: Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]
+    """
+    if not shard_map.enabled:
+        yield from _chunks(db, chunk_size)
+        return
+    placed: Dict[int, int] = {}
+    for shard in [PRIMARY, *range(len(shard_map.factories))]:
+        with nullcontext(db) if shard == PRIMARY else shard_map.factories[shard]() as session:
+            for user_ids, contact_ids, birthdays in _chunks(session, chunk_size):
+                placed.update(shard_map.placements(db, [user_id for user_id in np.unique(user_ids).tolist()
+                                                        if user_id not in placed]))
+                keep = np.fromiter((placed[user_id] == shard for user_id in user_ids.tolist()), dtype=bool,
+                                   count=len(user_ids))
+                yield user_ids[keep], contact_ids[keep], birthdays[keep]
+
+
+def upcoming_birthdays(db: Session, today: date, k: int, within: Optional[int] = None, chunk_size: int = 100_000,
+                       shard_map: ShardMap = default_shard_map) -> Dict[int, List[Tuple[int, int]]]:
+    """Gets k nearest birthdays per user over all contacts.
+
+    Every chunk is folded into the running top k right away, so memory is
+    bounded by chunk size plus k entries per user.
+
+    :param db: Session of primary database.
+    :type db: Session
+    :param today: Date to count from.
+    :type today: date
+    :param k: Max contacts per user.
+    :type k: int
+    :param within: Keep only birthdays in less than within days, defaults to None
+    :type within: Optional[int], optional
+    :param chunk_size: Rows per chunk, defaults to 100_000
+    :type chunk_size: int, optional
+    :param shard_map: Placement of contacts, defaults to shard map configured by settings
+    :type shard_map: ShardMap, optional
+    :return: Dictionary of user id to list of contact id and days until birthday.
+    :rtype: Dict[int, List[Tuple[int, int]]]
+    """
+    empty = np.empty(0, dtype=np.int64)
+    running = (empty, empty, empty)
+    for user_ids, contact_ids, birthdays in iter_birthday_chunks(db, chunk_size, shard_map):
+        chunk = top_k_per_user(user_ids, contact_ids, days_until_birthdays(birthdays, today), k, within)
+        running = top_k_per_user(*(np.concatenate(part) for part in zip(running, chunk)), k)
+    result: Dict[int, List[Tuple[int, int]]] = {}
+    for user_id, contact_id, left in zip(*(part.tolist() for part in running)):
+        result.setdefault(user_id, []).append((contact_id, left))
+    return result
@@ -1,32 +1,49 @@
-from pathlib import Path
+import asyncio
+from email.message import EmailMessage
+from email.utils import formataddr
+from typing import List
 # from functools import lru_cache
 
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
 from pydantic import EmailStr
 
 from src.database.auth import auth_service
 from src.conf.config import settings
+from src.services.mail_dispatcher import mail_dispatcher
+from src.services.mail_templates import template_registry
+from src.services.tracing import traced
 
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=settings.mail_from,
-    MAIL_PORT=settings.mail_port,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_FROM_NAME="Example email",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=False,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
-)
+def build_message(subject: str, email: str, template_name: str, context: dict) -> EmailMessage:
+    """Renders template into message with plain text and html parts.
+
+    :param subject: Subject of message.
+    :type subject: str
+    :param email: Email to send message to.
+    :type email: str
+    :param template_name: Template name without extension.
+    :type template_name: str
+    :param context: Variables for template.
+    :type context: dict
+    :return: Message ready to be sent.
+    :rtype: EmailMessage
+    """
+    rendered = template_registry.render(template_name, context)
+    message = EmailMessage()
+    message["Subject"] = subject
+    message["From"] = formataddr((settings.mail_from_name, settings.mail_from))
+    message["To"] = email
+    if rendered.text is None:
+        message.set_content(rendered.html, subtype="html")
+    else:
+        message.set_content(rendered.text)
+        message.add_alternative(rendered.html, subtype="html")
+    return message
 
 
-async def send_email(email: EmailStr, username: str, host: str) -> None:
-    """Sends confirmation message to specific user.
+@traced("send_email")
+async def send_email(email: EmailStr, username: str, host: str) -> asyncio.Future:
+    """Puts confirmation message for specific user into mail queue.
 
     :param email: Email to send message to.
     :type email: EmailStr
@@ -34,16 +51,29 @@ async def send_email(email: EmailStr, username: str, host: str) -> None:
     :type username: str
     :param host: Host for recovery link.
     :type host: str
+    :return: Future resolved with None when message is delivered or with error text.
+    :rtype: asyncio.Future
     """    
-    try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
-        print(err)
+    token_verification = auth_service.create_email_token({"sub": email})
+    message = build_message("Confirm your email ", email, "email_template",
+                            {"host": host, "username": username, "token": token_verification})
+    return await mail_dispatcher.submit(message)
+
+
+async def send_birthday_digest(email: EmailStr, username: str, days: int, contacts: List[dict]) -> asyncio.Future:
+    """Puts digest of upcoming birthdays for specific user into mail queue.
+
+    :param email: Email to send message to.
+    :type email: EmailStr
+    :param username: Username to send message to.
+    :type username: str
+    :param days: Number of days the digest covers.
+    :type days: int
+    :param contacts: Contacts with firstname, lastname, birthday and days until birthday.
+    :type contacts: List[dict]
+    :return: Future resolved with None when message is delivered or with error text.
+    :rtype: asyncio.Future
+    """
+    message = build_message("Upcoming birthdays", email, "birthday_digest",
+                            {"username": username, "days": days, "contacts": contacts})
+    return await mail_dispatcher.submit(message)
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+import httpx
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.db import SessionLocal
+from src.database.models import User
+
+
+logger = logging.getLogger(__name__)
+
+
+def email_hash(email: str) -> str:
+    """Gets Gravatar hash of email.
+
+    :param email: Email address.
+    :type email: str
+    :return: Hex md5 digest of trimmed lower case email.
+    :rtype: str
+    """
+    return hashlib.md5(email.strip().lower().encode()).hexdigest()
+
+
+class TTLCache:
+    """Small LRU cache whose entries expire, ttl is given per entry."""
+
+    def __init__(self, maxsize: int = 10_000):
+        """Creates empty cache.
+
+        :param maxsize: Max entries kept, oldest are evicted first, defaults to 10_000
+        :type maxsize: int, optional
+        """
+        self.maxsize = maxsize
+        self.entries: OrderedDict[str, Tuple[float, Optional[str]]] = OrderedDict()
+
+    def get(self, key: str) -> Tuple[bool, Optional[str]]:
+        """Gets cached value.
+
+        :param key: Cache key.
+        :type key: str
+        :return: True and value if key is cached and not expired, else False and None.
+        :rtype: Tuple[bool, Optional[str]]
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self.entries[key]
+            return False, None
+        self.entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: Optional[str], ttl: float) -> None:
+        """Caches value for ttl seconds.
+
+        :param key: Cache key.
+        :type key: str
+        :param value: Value, None is cached too.
+        :type value: Optional[str]
+        :param ttl: Time to live in seconds.
+        :type ttl: float
+        """
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+
+class GravatarResolver:
+    """Finds out if email has a Gravatar image.
+
+    Lookups go through one async HTTP client with at most concurrency requests
+    in flight. Found images are cached for positive_ttl and missing ones for
+    negative_ttl, errors are not cached.
+    """
+
+    def __init__(self, base_url: str = "https://www.gravatar.com/avatar", concurrency: int = 10,
+                 timeout: float = 2.0, positive_ttl: float = 86400, negative_ttl: float = 3600,
+                 cache_size: int = 10_000, session_factory: Callable[[], Session] = SessionLocal):
+        """Creates resolver, HTTP client is opened by start.
+
+        :param base_url: Gravatar avatar url, defaults to "https://www.gravatar.com/avatar"
+        :type base_url: str, optional
+        :param concurrency: Max requests in flight, defaults to 10
+        :type concurrency: int, optional
+        :param timeout: Request timeout in seconds, defaults to 2.0
+        :type timeout: float, optional
+        :param positive_ttl: Seconds to cache found avatar, defaults to 86400
+        :type positive_ttl: float, optional
+        :param negative_ttl: Seconds to cache missing avatar, defaults to 3600
+        :type negative_ttl: float, optional
+        :param cache_size: Max cached emails, defaults to 10_000
+        :type cache_size: int, optional
+        :param session_factory: Creates database sessions for background updates, defaults to SessionLocal
+        :type session_factory: Callable[[], Session], optional
+        """
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.cache = TTLCache(cache_size)
+        self.session_factory = session_factory
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.client: Optional[httpx.AsyncClient] = None
+        self.requests = 0
+
+    @classmethod
+    def from_settings(cls) -> "GravatarResolver":
+        """Creates resolver configured by settings.
+
+        :return: New resolver.
+        :rtype: GravatarResolver
+        """
+        return cls(settings.gravatar_url, settings.gravatar_concurrency, settings.gravatar_timeout,
+                   settings.gravatar_positive_ttl, settings.gravatar_negative_ttl)
+
+    async def start(self) -> None:
+        """Opens shared HTTP client, without it every lookup uses its own client."""
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=self.timeout)
+
+    async def stop(self) -> None:
+        """Closes shared HTTP client."""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def _exists(self, url: str) -> bool:
+        async with self.semaphore:
+            self.requests += 1
+            if self.client is not None:
+                response = await self.client.head(url, params={"d": "404"})
+            else:
+                async with httpx.AsyncClient(timeout=self.timeout) as client:
+                    response = await client.head(url, params={"d": "404"})
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
+
+    async def resolve(self, email: str) -> Optional[str]:
+        """Gets Gravatar url of email.
+
+        :param email: Email address.
+        :type email: str
+        :return: Avatar url or None if there is no avatar or Gravatar is not available.
+        :rtype: Optional[str]
+        """
+        key = email_hash(email)
+        hit, url = self.cache.get(key)
+        if hit:
+            return url
+        url = f"{self.base_url}/{key}"
+        try:
+            found = await self._exists(url)
+        except httpx.HTTPError as err:
+            logger.warning("Gravatar lookup failed: %s", err)
+            return None
+        self.cache.set(key, url if found else None, self.positive_ttl if found else self.negative_ttl)
+        return url if found else None
+
+    async def update_user_avatar(self, user_id: int, email: str) -> Optional[str]:
+        """Resolves avatar and saves it to user who has not uploaded one. Used as background task.
+
+        :param user_id: User id.
+        :type user_id: int
+        :param email: User email.
+        :type email: str
+        :return: Avatar url or None.
+        :rtype: Optional[str]
+        """
+        url = await self.resolve(email)
+        if url is None:
+            return None
+        db = self.session_factory()
+        try:
+            db.query(User).filter(User.id == user_id, User.avatar.is_(None)).update({User.avatar: url})
+            db.commit()
+        finally:
+            db.close()
+        return url
+
+
+gravatar_resolver = GravatarResolver.from_settings()
@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, asdict
+from email.message import EmailMessage
+from typing import List, Optional, Tuple
+
+import aiosmtplib
+from opentelemetry import context as trace_context
+from opentelemetry.trace import SpanKind
+
+from src.conf.config import settings
+from src.services.tracing import tracing
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class MailMetrics:
+    sent: int = 0
+    failed: int = 0
+    retries: int = 0
+    connections: int = 0
+    latency_total: float = 0.0
+    latency_max: float = 0.0
+
+    def observe(self, latency: float) -> None:
+        """Records latency of one successfully sent message.
+
+        :param latency: Send latency in seconds.
+        :type latency: float
+        """
+        self.sent += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def as_dict(self) -> dict:
+        """Gets counters with average latency.
+
+        :return: Dictionary with counters.
+        :rtype: dict
+        """
+        data = asdict(self)
+        data["latency_avg"] = self.latency_total / self.sent if self.sent else 0.0
+        return data
+
+
+class MailDispatcher:
+    """Sends queued messages over a small pool of persistent SMTP connections.
+
+    Each worker owns one authenticated connection, takes up to batch_size messages
+    off the queue and sends them over the same session, reconnecting only after
+    a failure.
+    """
+
+    def __init__(self, hostname: str, port: int, username: Optional[str] = None, password: Optional[str] = None,
+                 use_tls: bool = True, validate_certs: bool = True, pool_size: int = 2, batch_size: int = 20,
+                 max_retries: int = 3, backoff: float = 0.5, timeout: float = 30):
+        """Creates dispatcher, connections are opened lazily by workers.
+
+        :param hostname: SMTP server host.
+        :type hostname: str
+        :param port: SMTP server port.
+        :type port: int
+        :param username: Login for SMTP server, defaults to None
+        :type username: Optional[str], optional
+        :param password: Password for SMTP server, defaults to None
+        :type password: Optional[str], optional
+        :param use_tls: Connect with SSL/TLS, defaults to True
+        :type use_tls: bool, optional
+        :param validate_certs: Validate server certificate, defaults to True
+        :type validate_certs: bool, optional
+        :param pool_size: Number of workers and connections, defaults to 2
+        :type pool_size: int, optional
+        :param batch_size: Max messages taken off the queue at once, defaults to 20
+        :type batch_size: int, optional
+        :param max_retries: Retries for a message before it is dropped, defaults to 3
+        :type max_retries: int, optional
+        :param backoff: First retry delay in seconds, doubled on every attempt, defaults to 0.5
+        :type backoff: float, optional
+        :param timeout: SMTP command timeout in seconds, defaults to 30
+        :type timeout: float, optional
+        """
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.validate_certs = validate_certs
+        self.pool_size = pool_size
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.metrics = MailMetrics()
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers: List[asyncio.Task] = []
+
+    @classmethod
+    def from_settings(cls) -> "MailDispatcher":
+        """Creates dispatcher configured from settings.
+
+        :return: New dispatcher.
+        :rtype: MailDispatcher
+        """
+        return cls(hostname=settings.mail_server,
+                   port=int(settings.mail_port),
+                   username=settings.mail_username,
+                   password=settings.mail_password,
+                   use_tls=True,
+                   validate_certs=False,
+                   pool_size=settings.mail_pool_size,
+                   batch_size=settings.mail_batch_size,
+                   max_retries=settings.mail_max_retries)
+
+    @property
+    def running(self) -> bool:
+        return bool(self.workers)
+
+    def depth(self) -> int:
+        """Gets number of messages waiting in queue.
+
+        :return: Queue depth.
+        :rtype: int
+        """
+        return self.queue.qsize() if self.queue is not None else 0
+
+    async def start(self) -> None:
+        """Starts workers on current event loop.
+
+        :return: None.
+        :rtype: None
+        """
+        if self.running:
+            return
+        self.queue = asyncio.Queue()
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.pool_size)]
+
+    async def stop(self) -> None:
+        """Sends messages left in queue, then stops workers and closes connections.
+
+        :return: None.
+        :rtype: None
+        """
+        if not self.running:
+            return
+        await self.queue.join()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    async def submit(self, message: EmailMessage) -> asyncio.Future:
+        """Puts message into queue, starting workers if needed.
+
+        :param message: Message to send.
+        :type message: EmailMessage
+        :return: Future resolved with None when message is delivered or with error text if it was dropped.
+        :rtype: asyncio.Future
+        """
+        await self.start()
+        delivered = asyncio.get_running_loop().create_future()
+        # trace context goes with the message, so delivery shows up in the trace of the request
+        await self.queue.put((message, delivered, trace_context.get_current()))
+        return delivered
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        """Opens and authenticates new SMTP connection.
+
+        :return: Connected client.
+        :rtype: aiosmtplib.SMTP
+        """
+        smtp = aiosmtplib.SMTP(hostname=self.hostname, port=self.port, username=self.username,
+                               password=self.password, use_tls=self.use_tls, validate_certs=self.validate_certs,
+                               timeout=self.timeout)
+        await smtp.connect()
+        self.metrics.connections += 1
+        return smtp
+
+    async def _worker(self) -> None:
+        """Takes batches off the queue and sends them over one connection.
+
+        :return: None.
+        :rtype: None
+        """
+        smtp = None
+        try:
+            while True:
+                batch = [await self.queue.get()]
+                while len(batch) < self.batch_size and not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                for message, delivered, context in batch:
+                    try:
+                        with tracing.tracer.start_as_current_span("smtp send", context=context, kind=SpanKind.CLIENT):
+                            smtp, error = await self._send(smtp, message)
+                        if not delivered.done():
+                            delivered.set_result(error)
+                    finally:
+                        self.queue.task_done()
+        finally:
+            if smtp is not None and smtp.is_connected:
+                try:
+                    await smtp.quit()
+                except aiosmtplib.SMTPException:
+                    smtp.close()
+
+    @staticmethod
+    def _permanent(err: Exception) -> bool:
+        """Checks whether error rejects the message itself, so retrying it is pointless.
+
+        :param err: Error raised while sending message.
+        :type err: Exception
+        :return: True for 5xx replies and for recipients all refused with 5xx.
+        :rtype: bool
+        """
+        if isinstance(err, aiosmtplib.SMTPRecipientsRefused):
+            return all(refused.code >= 500 for refused in err.recipients)
+        return isinstance(err, aiosmtplib.SMTPResponseException) and err.code >= 500
+
+    async def _send(self, smtp: Optional[aiosmtplib.SMTP],
+                    message: EmailMessage) -> Tuple[Optional[aiosmtplib.SMTP], Optional[str]]:
+        """Sends one message, reconnecting and retrying with backoff on transient errors.
+
+        :param smtp: Connection of the worker or None if it is not connected yet.
+        :type smtp: Optional[aiosmtplib.SMTP]
+        :param message: Message to send.
+        :type message: EmailMessage
+        :return: Connection to reuse for next message and error text if message was dropped.
+        :rtype: Tuple[Optional[aiosmtplib.SMTP], Optional[str]]
+        """
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                if smtp is None or not smtp.is_connected:
+                    smtp = await self._connect()
+                await smtp.send_message(message)
+                self.metrics.observe(time.perf_counter() - started)
+                return smtp, None
+            except (aiosmtplib.SMTPException, OSError) as err:
+                permanent = self._permanent(err)
+                # aiosmtplib resets the envelope after a rejected message, so the session is kept;
+                # after other errors its state is unknown and next attempt starts on a fresh connection
+                if smtp is not None and not (permanent and smtp.is_connected):
+                    smtp.close()
+                    smtp = None
+                if attempt == self.max_retries or permanent:
+                    self.metrics.failed += 1
+                    logger.error("Failed to send email to %s: %s", message["To"], err)
+                    return smtp, str(err)
+                self.metrics.retries += 1
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+
+
+mail_dispatcher = MailDispatcher.from_settings()
@@ -0,0 +1,64 @@
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from jinja2 import Environment, FileSystemLoader, TemplateNotFound, select_autoescape
+
+from src.conf.config import settings
+
+
+class RenderedEmail(NamedTuple):
+    html: str
+    text: Optional[str]
+
+
+class TemplateRegistry:
+    """Jinja environment shared by all emails.
+
+    Templates are compiled once and kept in memory; with auto_reload the
+    environment checks file modification time on every render, for development.
+    """
+
+    def __init__(self, folder: Path, auto_reload: bool = False):
+        """Creates registry for templates in folder.
+
+        :param folder: Folder with templates.
+        :type folder: Path
+        :param auto_reload: Recompile templates changed on disk, defaults to False
+        :type auto_reload: bool, optional
+        """
+        self.folder = folder
+        self.env = Environment(loader=FileSystemLoader(folder),
+                               autoescape=select_autoescape(["html"]),
+                               auto_reload=auto_reload,
+                               cache_size=-1)
+
+    def load(self) -> int:
+        """Compiles all templates in folder.
+
+        :return: Number of compiled templates.
+        :rtype: int
+        """
+        names = self.env.list_templates(extensions=["html", "txt"])
+        for name in names:
+            self.env.get_template(name)
+        return len(names)
+
+    def render(self, name: str, context: dict) -> RenderedEmail:
+        """Renders html and plain text parts of email from one context.
+
+        :param name: Template name without extension.
+        :type name: str
+        :param context: Variables for template.
+        :type context: dict
+        :return: Html and plain text, text is None if there is no .txt template.
+        :rtype: RenderedEmail
+        """
+        html = self.env.get_template(f"{name}.html").render(context)
+        try:
+            text = self.env.get_template(f"{name}.txt").render(context)
+        except TemplateNotFound:
+            text = None
+        return RenderedEmail(html=html, text=text)
+
+
+template_registry = TemplateRegistry(Path(__file__).parent / 'templates', auto_reload=settings.mail_templates_auto_reload)
@@ -0,0 +1,157 @@
+import gc
+import threading
+import tracemalloc
+from collections import Counter
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+
+
+SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def _site(stat) -> str:
+    frame = stat.traceback[0]
+    return f"{frame.filename}:{frame.lineno}"
+
+
+class MemoryTracker:
+    """Starts and stops tracemalloc, compares snapshots and counts live objects.
+
+    Tracing slows allocations down and keeps a traceback of every live block,
+    so it runs only between start and stop.
+    """
+
+    def __init__(self):
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1) -> dict:
+        """Starts tracing and takes baseline snapshot.
+
+        :param frames: Frames stored per allocation, more frames cost more memory, defaults to 1
+        :type frames: int, optional
+        :return: Tracing status.
+        :rtype: dict
+        """
+        with self.lock:
+            if not self.tracing:
+                tracemalloc.start(frames)
+            self.baseline = self._snapshot()
+        return self.status()
+
+    def stop(self) -> dict:
+        """Stops tracing and drops baseline.
+
+        :return: Tracing status.
+        :rtype: dict
+        """
+        with self.lock:
+            tracemalloc.stop()
+            self.baseline = None
+        return self.status()
+
+    def status(self) -> dict:
+        """Gets tracing state and traced memory.
+
+        :return: Dictionary with tracing flag, frames and current and peak traced bytes.
+        :rtype: dict
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        return {"tracing": self.tracing, "frames": tracemalloc.get_traceback_limit(), "current": current,
+                "peak": peak}
+
+    def reset_baseline(self) -> dict:
+        """Takes new baseline snapshot, later diffs are made against it.
+
+        :return: Tracing status.
+        :rtype: dict
+        """
+        with self.lock:
+            self.baseline = self._snapshot()
+        return self.status()
+
+    def top(self, limit: int = 20, group_by: str = "lineno") -> List[dict]:
+        """Gets allocation sites holding most memory now.
+
+        :param limit: Number of sites, defaults to 20
+        :type limit: int, optional
+        :param group_by: "lineno", "filename" or "traceback", defaults to "lineno"
+        :type group_by: str, optional
+        :return: Sites with size in bytes and number of blocks.
+        :rtype: List[dict]
+        """
+        stats = self._snapshot().statistics(group_by)[:limit]
+        return [{"site": _site(stat), "size": stat.size, "count": stat.count,
+                 "traceback": stat.traceback.format() if group_by == "traceback" else None} for stat in stats]
+
+    def diff(self, limit: int = 20, group_by: str = "lineno") -> List[dict]:
+        """Gets allocation sites that grew most since baseline.
+
+        :param limit: Number of sites, defaults to 20
+        :type limit: int, optional
+        :param group_by: "lineno", "filename" or "traceback", defaults to "lineno"
+        :type group_by: str, optional
+        :return: Sites with size and blocks now and their change since baseline.
+        :rtype: List[dict]
+        """
+        snapshot = self._snapshot()
+        if self.baseline is None:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="No baseline snapshot")
+        stats = snapshot.compare_to(self.baseline, group_by)[:limit]
+        return [{"site": _site(stat), "size": stat.size, "size_diff": stat.size_diff, "count": stat.count,
+                 "count_diff": stat.count_diff,
+                 "traceback": stat.traceback.format() if group_by == "traceback" else None} for stat in stats]
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        if not self.tracing:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="tracemalloc is not running")
+        return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+
+def live_objects(limit: int = 20) -> dict:
+    """Counts live objects by type, works without tracemalloc.
+
+    ORM instances and Pydantic models are counted per class. bytes and
+    bytearray are not tracked by gc, so buffers referenced from tracked
+    objects are counted instead. Walks the whole heap, so call it rarely.
+
+    :param limit: Number of most common types, defaults to 20
+    :type limit: int, optional
+    :return: Counts of ORM instances, Pydantic models, buffers and most common types.
+    :rtype: dict
+    """
+    gc.collect()
+    types, orm, models = Counter(), Counter(), Counter()
+    buffers = {}
+    for obj in gc.get_objects():
+        cls = type(obj)
+        types[cls.__qualname__] += 1
+        # Checks look at the class only, attribute access on objects may run lazy imports
+        if "_sa_class_manager" in cls.__dict__:
+            orm[cls.__qualname__] += 1
+        elif BaseModel in cls.__mro__:
+            models[cls.__qualname__] += 1
+        for ref in gc.get_referents(obj):
+            if type(ref) in (bytes, bytearray):
+                buffers[id(ref)] = ref
+    buffer_types = Counter(type(buffer).__name__ for buffer in buffers.values())
+    return {
+        "orm": dict(orm.most_common()),
+        "pydantic": dict(models.most_common()),
+        "buffers": {"count": dict(buffer_types), "size": sum(len(buffer) for buffer in buffers.values())},
+        "types": dict(types.most_common(limit)),
+    }
+
+
+memory_tracker = MemoryTracker()
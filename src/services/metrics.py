@@ -0,0 +1,150 @@
+import inspect
+import time
+import weakref
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import BaseRoute, Mount
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route.", ["method", "route"])
+REQUESTS = Counter("http_requests", "Responses by route and status.", ["method", "route", "status"])
+DB_QUERY_LATENCY = Histogram("db_query_duration_seconds", "SQL statement latency.", ["database", "statement"],
+                             buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, float("inf")))
+REDIS_COMMAND_LATENCY = Histogram("redis_command_duration_seconds", "Redis command latency.", ["client", "command"],
+                                  buckets=(.0002, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, float("inf")))
+MAIL_QUEUE_DEPTH = Gauge("mail_queue_depth", "Messages waiting in mail dispatcher queue.")
+
+# Scope of request being handled, set by MetricsMiddleware so code deeper in the stack can tell which request it serves.
+request_scope: ContextVar[Optional[Scope]] = ContextVar("request_scope", default=None)
+
+
+_routes: "weakref.WeakKeyDictionary[ASGIApp, Dict[object, str]]" = weakref.WeakKeyDictionary()
+
+
+def route_template(scope: Scope) -> str:
+    """Gets path template of route that handled request.
+
+    :param scope: ASGI scope after routing.
+    :type scope: Scope
+    :return: Route path or "unmatched".
+    :rtype: str
+    """
+    app = scope.get("app")
+    if app is None:
+        return "unmatched"
+    routes = _routes.get(app)
+    if routes is None:
+        routes = _routes[app] = {_endpoint(route): route.path for route in getattr(app, "routes", [])}
+    return routes.get(scope.get("endpoint"), "unmatched")
+
+
+def _endpoint(route: BaseRoute) -> object:
+    return route.app if isinstance(route, Mount) else getattr(route, "endpoint", None)
+
+
+class MetricsMiddleware:
+    """ASGI middleware that records latency and status of every request.
+
+    Requests are labelled by route path template, so /api/contacts/1 and
+    /api/contacts/2 share one series. Requests that match no route are
+    labelled "unmatched".
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = request_scope.set(scope)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = route_template(scope)
+            REQUEST_LATENCY.labels(scope["method"], route).observe(time.perf_counter() - started)
+            REQUESTS.labels(scope["method"], route, str(status_code)).inc()
+            request_scope.reset(token)
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """Records latency of every statement executed by engine.
+
+    :param engine: Engine to listen on.
+    :type engine: Engine
+    :param name: Database label, for example "primary" or "replica".
+    :type name: str
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        kind = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        DB_QUERY_LATENCY.labels(name, kind).observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        if context.connection is not None and context.connection.info.get("query_started"):
+            context.connection.info["query_started"].pop()
+
+
+def instrument_redis(client, name: str):
+    """Records latency of every command sent by redis client, sync or asyncio.
+
+    Scripts are timed too, they are sent as EVALSHA.
+
+    :param client: Redis client.
+    :param name: Client label, for example "auth" or "limiter".
+    :type name: str
+    :return: The same client.
+    """
+    execute = client.execute_command
+    if getattr(execute, "instrumented", False):
+        return client
+
+    if inspect.iscoroutinefunction(execute):
+        async def timed(*args, **options):
+            started = time.perf_counter()
+            try:
+                return await execute(*args, **options)
+            finally:
+                REDIS_COMMAND_LATENCY.labels(name, str(args[0]).upper()).observe(time.perf_counter() - started)
+    else:
+        def timed(*args, **options):
+            started = time.perf_counter()
+            try:
+                return execute(*args, **options)
+            finally:
+                REDIS_COMMAND_LATENCY.labels(name, str(args[0]).upper()).observe(time.perf_counter() - started)
+
+    timed.instrumented = True
+    client.execute_command = timed
+    return client
+
+
+def metrics() -> Response:
+    """Gets all metrics in Prometheus text format.
+
+    :return: Response with metrics.
+    :rtype: Response
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
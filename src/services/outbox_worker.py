@@ -0,0 +1,190 @@
+import argparse
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.db import SessionLocal
+from src.database.models import EmailOutbox
+from src.repository import outbox as repository_outbox
+from src.services.email import send_email, send_birthday_digest
+from src.services.mail_dispatcher import mail_dispatcher
+
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {
+    repository_outbox.CONFIRM_EMAIL: lambda payload: send_email(payload["email"], payload["username"], payload["host"]),
+    repository_outbox.BIRTHDAY_DIGEST: lambda payload: send_birthday_digest(payload["email"], payload["username"],
+                                                                            payload["days"], payload["contacts"]),
+}
+
+
+class OutboxWorker:
+    """Delivers emails saved to outbox by web workers.
+
+    Several worker processes can run at once: every batch is claimed with
+    SKIP LOCKED, so each entry is handled by one consumer at a time. Sent
+    entries are deleted once they are older than retention_days.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal,
+                 batch_size: Optional[int] = None, concurrency: Optional[int] = None,
+                 max_attempts: Optional[int] = None, visibility_timeout: Optional[int] = None,
+                 backoff: Optional[int] = None, poll_interval: Optional[float] = None,
+                 retention_days: Optional[int] = None, purge_interval: Optional[int] = None):
+        """Creates worker, missing options are taken from settings.
+
+        :param session_factory: Factory of database sessions, defaults to SessionLocal
+        :type session_factory: Callable[[], Session], optional
+        :param batch_size: Entries claimed at once.
+        :type batch_size: Optional[int], optional
+        :param concurrency: Entries sent at the same time.
+        :type concurrency: Optional[int], optional
+        :param max_attempts: Attempts before entry is dead-lettered.
+        :type max_attempts: Optional[int], optional
+        :param visibility_timeout: Seconds claimed entries are hidden from other workers.
+        :type visibility_timeout: Optional[int], optional
+        :param backoff: First retry delay in seconds.
+        :type backoff: Optional[int], optional
+        :param poll_interval: Seconds to wait when outbox is empty.
+        :type poll_interval: Optional[float], optional
+        :param retention_days: Days sent entries are kept for.
+        :type retention_days: Optional[int], optional
+        :param purge_interval: Seconds between purges of sent entries.
+        :type purge_interval: Optional[int], optional
+        """
+        self.session_factory = session_factory
+        self.batch_size = batch_size or settings.outbox_batch_size
+        self.concurrency = concurrency or settings.outbox_concurrency
+        self.max_attempts = max_attempts or settings.outbox_max_attempts
+        self.visibility_timeout = visibility_timeout or settings.outbox_visibility_timeout
+        self.backoff = backoff or settings.outbox_backoff
+        self.poll_interval = poll_interval or settings.outbox_poll_interval
+        self.retention_days = retention_days or settings.outbox_retention_days
+        self.purge_interval = purge_interval or settings.outbox_purge_interval
+        self.purged_at: Optional[float] = None
+        self.stopped = asyncio.Event()
+
+    async def deliver(self, entry: EmailOutbox, semaphore: asyncio.Semaphore) -> Optional[str]:
+        """Sends one entry through its handler.
+
+        :param entry: Outbox entry.
+        :type entry: EmailOutbox
+        :param semaphore: Semaphore limiting concurrent sends.
+        :type semaphore: asyncio.Semaphore
+        :return: None if message was delivered or error text.
+        :rtype: Optional[str]
+        """
+        handler = HANDLERS.get(entry.kind)
+        if handler is None:
+            return f"Unknown email kind: {entry.kind}"
+        async with semaphore:
+            try:
+                delivered = await handler(entry.payload)
+                return await delivered
+            except Exception as err:
+                return repr(err)
+
+    async def run_once(self) -> int:
+        """Claims one batch and delivers it.
+
+        :return: Number of processed entries.
+        :rtype: int
+        """
+        db = self.session_factory()
+        db.expire_on_commit = False
+        try:
+            entries = await repository_outbox.claim_batch(db, self.batch_size, self.visibility_timeout)
+            semaphore = asyncio.Semaphore(self.concurrency)
+            errors = await asyncio.gather(*(self.deliver(entry, semaphore) for entry in entries))
+            for entry, error in zip(entries, errors):
+                if error is None:
+                    await repository_outbox.mark_sent(entry, db)
+                else:
+                    logger.warning("Outbox entry %s failed on attempt %s: %s", entry.id, entry.attempts, error)
+                    await repository_outbox.mark_failed(entry, error, self.max_attempts, self.backoff, db)
+            return len(entries)
+        finally:
+            db.close()
+
+    async def purge(self) -> int:
+        """Deletes sent entries older than retention_days.
+
+        :return: Number of deleted entries.
+        :rtype: int
+        """
+        db = self.session_factory()
+        try:
+            deleted = await repository_outbox.purge_sent(db, self.retention_days)
+        finally:
+            db.close()
+        self.purged_at = time.monotonic()
+        if deleted:
+            logger.info("Purged %s sent outbox entries", deleted)
+        return deleted
+
+    async def run(self) -> None:
+        """Processes outbox until stop is called, purging sent entries every purge_interval.
+
+        :return: None.
+        :rtype: None
+        """
+        while not self.stopped.is_set():
+            if self.purged_at is None or time.monotonic() - self.purged_at >= self.purge_interval:
+                await self.purge()
+            if await self.run_once() == 0:
+                try:
+                    await asyncio.wait_for(self.stopped.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def stop(self) -> None:
+        """Asks worker to stop after current batch.
+
+        :return: None.
+        :rtype: None
+        """
+        self.stopped.set()
+
+
+async def serve(worker: OutboxWorker, once: bool = False) -> None:
+    """Runs worker with mail dispatcher.
+
+    :param worker: Worker to run.
+    :type worker: OutboxWorker
+    :param once: Process one batch and exit, defaults to False
+    :type once: bool, optional
+    :return: None.
+    :rtype: None
+    """
+    await mail_dispatcher.start()
+    try:
+        if once:
+            await worker.run_once()
+        else:
+            await worker.run()
+    finally:
+        await mail_dispatcher.stop()
+
+
+def main() -> None:
+    """Entry point of outbox worker process."""
+    parser = argparse.ArgumentParser(description="Send emails saved to outbox.")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--once", action="store_true", help="process one batch and exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    worker = OutboxWorker(batch_size=args.batch_size, concurrency=args.concurrency)
+    try:
+        asyncio.run(serve(worker, once=args.once))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import time
+import uuid
+from pathlib import Path
+from typing import List
+
+from pyinstrument import Profiler
+from pyinstrument.renderers import SpeedscopeRenderer
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.database.auth import auth_service
+
+
+class ProfilerMiddleware:
+    """Runs a sampling profiler around one request when an admin asks for it.
+
+    A request with header ``X-Profile: 1`` and an admin access token is
+    profiled from routing to the last byte of the response: dependencies
+    like get_current_user, the route handler, repository calls and response
+    serialization. The profile is saved in speedscope format, which shows as
+    a flamegraph in https://www.speedscope.app, and its name is returned in
+    the ``X-Profile-Id`` response header. Other requests only pay for one
+    scan of the header list.
+    """
+
+    def __init__(self, app: ASGIApp, directory: str = "profiles", interval: float = 0.001):
+        """Creates middleware.
+
+        :param app: Wrapped ASGI app.
+        :type app: ASGIApp
+        :param directory: Folder for saved profiles, defaults to "profiles"
+        :type directory: str, optional
+        :param interval: Sampling interval in seconds, defaults to 0.001
+        :type interval: float, optional
+        """
+        self.app = app
+        self.directory = Path(directory)
+        self.interval = interval
+
+    def requested(self, scope: Scope) -> bool:
+        """Checks if request asks for profiling and is sent by an admin.
+
+        :param scope: ASGI scope.
+        :type scope: Scope
+        :return: True if request must be profiled.
+        :rtype: bool
+        """
+        headers = dict(scope["headers"])
+        if headers.get(b"x-profile") not in (b"1", b"true"):
+            return False
+        scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+        return scheme.lower() == "bearer" and auth_service.is_admin_token(token)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not any(name == b"x-profile" for name, _ in scope["headers"]) \
+                or not self.requested(scope):
+            await self.app(scope, receive, send)
+            return
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.speedscope.json"
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", name.encode())]
+            await send(message)
+
+        profiler = Profiler(interval=self.interval, async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiler.stop()
+            await run_in_threadpool(self.save, profiler, name)
+
+    def save(self, profiler: Profiler, name: str) -> Path:
+        """Writes profile in speedscope format.
+
+        :param profiler: Stopped profiler.
+        :type profiler: Profiler
+        :param name: File name.
+        :type name: str
+        :return: Path of saved profile.
+        :rtype: Path
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / name
+        path.write_text(profiler.output(SpeedscopeRenderer()))
+        return path
+
+
+def list_profiles(directory: str) -> List[str]:
+    """Gets names of saved profiles, newest first.
+
+    :param directory: Folder with profiles.
+    :type directory: str
+    :return: Profile file names.
+    :rtype: List[str]
+    """
+    folder = Path(directory)
+    if not folder.is_dir():
+        return []
+    return sorted((path.name for path in folder.glob("*.speedscope.json")), reverse=True)
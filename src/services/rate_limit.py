@@ -0,0 +1,139 @@
+import math
+import time
+from typing import Optional
+from uuid import uuid4
+
+from fastapi import Depends, HTTPException, Response, status
+from redis.asyncio import Redis
+
+from src.conf.config import settings
+from src.database.auth import auth_service
+from src.database.models import User
+from src.services.token_bucket import LeasedTokenBucket
+
+
+# Sliding window log: one sorted set per user and route, scored by request time in ms.
+# Trimming, counting and adding happen inside one script, so every check costs one round trip.
+SLIDING_WINDOW_LUA = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local member = ARGV[4]
+
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+local count = redis.call('ZCARD', key)
+local allowed = 0
+if count < limit then
+    redis.call('ZADD', key, now, member)
+    count = count + 1
+    allowed = 1
+end
+
+local reset = window
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+if oldest[2] then
+    reset = tonumber(oldest[2]) + window - now
+end
+redis.call('PEXPIRE', key, window)
+return {allowed, limit - count, reset}
+"""
+
+
+class UserRateLimiter:
+    redis: Optional[Redis] = None
+    script = None
+    bucket: Optional[LeasedTokenBucket] = None
+    prefix: str = "ratelimit"
+
+    def __init__(self, name: str, times: Optional[int] = None, seconds: Optional[int] = None):
+        """Creates rate limit dependency for a route.
+
+        :param name: Route name used in redis keys and in settings.rate_limit_routes.
+        :type name: str
+        :param times: Requests allowed per window, defaults to settings.rate_limit_times.
+        :type times: Optional[int], optional
+        :param seconds: Window length in seconds, defaults to settings.rate_limit_seconds.
+        :type seconds: Optional[int], optional
+        """
+        self.name = name
+        self.times = times
+        self.seconds = seconds
+
+    @classmethod
+    async def init(cls, r: Redis, prefix: str = "ratelimit") -> None:
+        """Registers sliding window script on redis connection.
+
+        If settings.rate_limit_lease_fraction is above zero, checks go through
+        a per-worker LeasedTokenBucket that leases slices of the same sliding
+        window budget for settings.rate_limit_lease_seconds.
+
+        :param r: Redis connection.
+        :type r: Redis
+        :param prefix: Prefix for redis keys, defaults to "ratelimit"
+        :type prefix: str, optional
+        :return: None.
+        :rtype: None
+        """
+        cls.redis = r
+        cls.prefix = prefix
+        cls.script = r.register_script(SLIDING_WINDOW_LUA)
+        cls.bucket = None
+        if settings.rate_limit_lease_fraction > 0:
+            cls.bucket = LeasedTokenBucket(r, prefix=f"{prefix}:lease", lease_fraction=settings.rate_limit_lease_fraction,
+                                           lease_seconds=settings.rate_limit_lease_seconds)
+
+    def limit_for(self, user: User) -> int:
+        """Gets number of requests allowed for user in one window.
+
+        :param user: User to get limit for.
+        :type user: User
+        :return: Number of requests allowed in one window.
+        :rtype: int
+        """
+        times = settings.rate_limit_routes.get(self.name, self.times or settings.rate_limit_times)
+        multiplier = settings.rate_limit_plans.get(user.plan or "free", 1.0)
+        return max(1, int(times * multiplier))
+
+    def window(self) -> int:
+        """Gets window length in seconds.
+
+        :return: Window length in seconds.
+        :rtype: int
+        """
+        return self.seconds or settings.rate_limit_seconds
+
+    async def __call__(self, response: Response, current_user: User = Depends(auth_service.get_current_user)) -> None:
+        """Checks rate limit for current user and sets RateLimit-* headers.
+
+        :param response: Response to set headers to.
+        :type response: Response
+        :param current_user: User to check limit for, defaults to Depends(auth_service.get_current_user)
+        :type current_user: User, optional
+        :raises RuntimeError: If UserRateLimiter.init was not called.
+        :raises HTTPException: If user has exceeded the limit.
+        :return: None.
+        :rtype: None
+        """
+        if self.script is None:
+            raise RuntimeError("You must call UserRateLimiter.init in startup event of fastapi!")
+        limit = self.limit_for(current_user)
+        if self.bucket is not None:
+            allowed, remaining, reset = await self.bucket.acquire(f"{self.name}:{current_user.id}", limit, self.window())
+        else:
+            window_ms = self.window() * 1000
+            now_ms = int(time.time() * 1000)
+            key = f"{self.prefix}:{self.name}:{current_user.id}"
+            allowed, remaining, reset_ms = await self.script(keys=[key],
+                                                             args=[now_ms, window_ms, limit, f"{now_ms}:{uuid4().hex}"])
+            reset = math.ceil(int(reset_ms) / 1000)
+        headers = {
+            "RateLimit-Limit": str(limit),
+            "RateLimit-Remaining": str(max(0, int(remaining))),
+            "RateLimit-Reset": str(reset),
+        }
+        if not int(allowed):
+            headers["Retry-After"] = headers["RateLimit-Reset"]
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too Many Requests",
+                                headers=headers)
+        response.headers.update(headers)
@@ -0,0 +1,157 @@
+import asyncio
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+from uuid import uuid4
+
+from redis.asyncio import Redis
+
+
+
+# Sliding window log of leases: one sorted set per user and route, members are "{tokens}:{id}".
+# A lease is scored by the time its tokens stop being usable, not by the grant time, so a token
+# spent late in its lease still counts against every window it was spent in.
+# Grants up to ARGV[4] tokens and returns granted tokens, budget left and ms until the oldest lease leaves.
+LEASE_LUA = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local requested = tonumber(ARGV[4])
+local expires = tonumber(ARGV[5])
+local member = ARGV[6]
+
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+local used = 0
+for _, leased in ipairs(redis.call('ZRANGE', key, 0, -1)) do
+    used = used + tonumber(string.match(leased, '^(%d+):'))
+end
+local granted = math.max(0, math.min(requested, limit - used))
+if granted > 0 then
+    redis.call('ZADD', key, expires, granted .. ':' .. member)
+    redis.call('PEXPIRE', key, expires + window - now)
+end
+
+local reset = window
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+if oldest[2] then
+    reset = tonumber(oldest[2]) + window - now
+end
+return {granted, limit - used - granted, reset}
+"""
+
+
+@dataclass
+class Lease:
+    tokens: int = 0
+    expires: float = 0.0
+    remaining: int = 0
+    reset_at: float = 0.0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class LeasedTokenBucket:
+    """Per-worker token bucket that leases slices of a global sliding window budget.
+
+    Every worker keeps a local lease per user and route and calls redis only when
+    the lease is used up or expired. Leased tokens are usable for lease_seconds
+    and count against the window until lease_seconds + window after the grant,
+    so workers together never grant more than the limit within any window, also
+    across window boundaries. A bigger lease means fewer round trips but more
+    tokens stranded in idle workers.
+    """
+
+    def __init__(self, r: Redis, prefix: str = "ratelimit:lease", lease_fraction: float = 0.1,
+                 lease_seconds: float = 1.0):
+        """Creates bucket on top of redis connection.
+
+        :param r: Redis connection.
+        :type r: Redis
+        :param prefix: Prefix for redis keys, defaults to "ratelimit:lease"
+        :type prefix: str, optional
+        :param lease_fraction: Part of the limit leased to a worker at once, defaults to 0.1
+        :type lease_fraction: float, optional
+        :param lease_seconds: Seconds leased tokens stay usable, defaults to 1.0
+        :type lease_seconds: float, optional
+        """
+        self.redis = r
+        self.prefix = prefix
+        self.lease_fraction = lease_fraction
+        self.lease_seconds = lease_seconds
+        self.script = r.register_script(LEASE_LUA)
+        self.leases: Dict[str, Lease] = {}
+        self.swept_at = 0.0
+        self.redis_calls = 0
+
+    def lease_size(self, limit: int) -> int:
+        """Gets number of tokens requested from redis at once.
+
+        :param limit: Requests allowed per window.
+        :type limit: int
+        :return: Number of tokens in one lease.
+        :rtype: int
+        """
+        return max(1, math.ceil(limit * self.lease_fraction))
+
+    def _sweep(self, now: float) -> None:
+        """Drops leases that are expired and whose budget is free again.
+
+        :param now: Current time in seconds.
+        :type now: float
+        """
+        self.leases = {key: lease for key, lease in self.leases.items()
+                       if lease.expires > now or lease.reset_at > now or lease.lock.locked()}
+        self.swept_at = now
+
+    def _needs_refill(self, lease: Lease, now: float) -> bool:
+        """Checks whether lease is used up and redis may have budget left.
+
+        :param lease: Local lease.
+        :type lease: Lease
+        :param now: Current time in seconds.
+        :type now: float
+        :return: True if redis should be asked for more tokens.
+        :rtype: bool
+        """
+        if lease.expires <= now:
+            lease.tokens = 0
+        # once the budget is spent nothing frees up before the oldest lease leaves the window
+        return lease.tokens == 0 and (lease.remaining > 0 or lease.reset_at <= now)
+
+    async def acquire(self, key: str, limit: int, seconds: int) -> Tuple[bool, int, int]:
+        """Takes one token for key from local lease, refilling it from redis if needed.
+
+        :param key: Key of the budget, e.g. route name and user id.
+        :type key: str
+        :param limit: Requests allowed per window.
+        :type limit: int
+        :param seconds: Window length in seconds.
+        :type seconds: int
+        :return: Whether request is allowed, approximate remaining budget and seconds to reset.
+        :rtype: Tuple[bool, int, int]
+        """
+        now = time.time()
+        if now - self.swept_at >= seconds:
+            self._sweep(now)
+        lease = self.leases.setdefault(key, Lease())
+        if self._needs_refill(lease, now):
+            # concurrent requests of this worker wait for one refill instead of each calling redis
+            async with lease.lock:
+                now = time.time()
+                if self._needs_refill(lease, now):
+                    self.redis_calls += 1
+                    expires = now + self.lease_seconds
+                    granted, remaining, reset_ms = await self.script(
+                        keys=[f"{self.prefix}:{key}"],
+                        args=[int(now * 1000), seconds * 1000, limit, self.lease_size(limit), int(expires * 1000),
+                              uuid4().hex])
+                    lease.tokens = int(granted)
+                    lease.expires = expires
+                    lease.remaining = int(remaining)
+                    lease.reset_at = now + int(reset_ms) / 1000
+        reset = max(0, math.ceil(lease.reset_at - now))
+        if lease.tokens == 0:
+            return False, 0, reset
+        lease.tokens -= 1
+        return True, max(0, lease.remaining) + lease.tokens, reset
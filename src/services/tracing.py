@@ -0,0 +1,232 @@
+import base64
+import functools
+import inspect
+import json
+import threading
+from pathlib import Path
+from typing import Callable, Optional
+
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import (BatchSpanProcessor, ConsoleSpanExporter, SpanExporter,
+                                            SpanExportResult, SpanProcessor)
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.trace import SpanKind, StatusCode
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.conf.config import settings
+from src.services.metrics import route_template
+
+
+ID_FIELDS = {"traceId", "spanId", "parentSpanId"}
+
+
+def _hex_ids(value):
+    # Protobuf JSON mapping writes ids as base64, OTLP/JSON wants lowercase hex
+    if isinstance(value, dict):
+        return {key: base64.b64decode(item).hex() if key in ID_FIELDS and isinstance(item, str) else _hex_ids(item)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [_hex_ids(item) for item in value]
+    return value
+
+
+class OTLPJsonFileExporter(SpanExporter):
+    """Appends spans to a file in OTLP/JSON, one export request per line.
+
+    Needs no running collector, the file can be loaded later by the
+    collector's otlpjsonfile receiver.
+    """
+
+    def __init__(self, path: str):
+        """Creates exporter, the file is created on first export.
+
+        :param path: File to append to.
+        :type path: str
+        """
+        self.path = Path(path)
+        self.lock = threading.Lock()
+
+    def export(self, spans) -> SpanExportResult:
+        from google.protobuf.json_format import MessageToDict
+        from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+
+        # OTLP/JSON writes enums as integers
+        request = MessageToDict(encode_spans(spans), use_integers_for_enums=True)
+        line = json.dumps(_hex_ids(request), separators=(",", ":"))
+        with self.lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a") as file:
+                file.write(line + "\n")
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        pass
+
+
+def exporter_from_settings() -> Optional[SpanExporter]:
+    """Creates exporter named by settings.tracing_exporter.
+
+    :raises ValueError: If exporter name is unknown.
+    :return: Exporter or None for "none".
+    :rtype: Optional[SpanExporter]
+    """
+    name = settings.tracing_exporter
+    if name == "none":
+        return None
+    if name == "file":
+        return OTLPJsonFileExporter(settings.tracing_file)
+    if name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter(endpoint=settings.tracing_otlp_endpoint)
+    if name == "console":
+        return ConsoleSpanExporter()
+    raise ValueError(f"Unknown tracing exporter: {name}")
+
+
+class Tracing:
+    """Holds tracer of the app, a no-op tracer until configure is called.
+
+    A share of requests, sample_rate, is traced, unless the caller sent a
+    sampled traceparent. Spans of requests that are not traced are never
+    created, so with tracing off every hook costs one context lookup.
+    """
+
+    def __init__(self):
+        self.provider: Optional[TracerProvider] = None
+        self.tracer: trace.Tracer = trace.NoOpTracer()
+
+    def configure(self, exporter: SpanExporter, sample_rate: float, service_name: str = "contacts-api",
+                  processor: Callable[[SpanExporter], SpanProcessor] = BatchSpanProcessor) -> None:
+        """Starts sending spans to exporter.
+
+        :param exporter: Span exporter.
+        :type exporter: SpanExporter
+        :param sample_rate: Share of new traces recorded, from 0 to 1.
+        :type sample_rate: float
+        :param service_name: Service name of spans, defaults to "contacts-api"
+        :type service_name: str, optional
+        :param processor: Creates span processor for exporter, defaults to BatchSpanProcessor
+        :type processor: Callable[[SpanExporter], SpanProcessor], optional
+        """
+        self.shutdown()
+        self.provider = TracerProvider(resource=Resource.create({"service.name": service_name}),
+                                       sampler=ParentBased(TraceIdRatioBased(sample_rate)))
+        self.provider.add_span_processor(processor(exporter))
+        self.tracer = self.provider.get_tracer(__name__)
+
+    def configure_from_settings(self) -> None:
+        """Configures tracing from settings, does nothing if exporter is "none"."""
+        exporter = exporter_from_settings()
+        if exporter is not None:
+            self.configure(exporter, settings.tracing_sample_rate, settings.tracing_service_name)
+
+    def shutdown(self) -> None:
+        """Sends buffered spans and switches back to no-op tracer."""
+        if self.provider is not None:
+            self.provider.shutdown()
+        self.provider = None
+        self.tracer = trace.NoOpTracer()
+
+
+tracing = Tracing()
+
+
+def traced(name: Optional[str] = None, kind: SpanKind = SpanKind.INTERNAL) -> Callable:
+    """Decorator that runs function in a child span of the current span.
+
+    Nothing is recorded if there is no recording span, so functions called
+    outside traced requests run as before.
+
+    :param name: Span name, defaults to module and name of function.
+    :type name: Optional[str], optional
+    :param kind: Span kind, defaults to SpanKind.INTERNAL
+    :type kind: SpanKind, optional
+    :return: Decorator.
+    :rtype: Callable
+    """
+
+    def decorator(func: Callable) -> Callable:
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if not trace.get_current_span().is_recording():
+                    return await func(*args, **kwargs)
+                with tracing.tracer.start_as_current_span(span_name, kind=kind):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not trace.get_current_span().is_recording():
+                    return func(*args, **kwargs)
+                with tracing.tracer.start_as_current_span(span_name, kind=kind):
+                    return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def trace_redis(client, name: str):
+    """Runs every command of sync redis client in a child span of the current span.
+
+    :param client: Redis client.
+    :param name: Client label, for example "auth".
+    :type name: str
+    :return: The same client.
+    """
+    execute = client.execute_command
+    if getattr(execute, "traced", False):
+        return client
+
+    def traced_execute(*args, **options):
+        if not trace.get_current_span().is_recording():
+            return execute(*args, **options)
+        command = str(args[0]).upper()
+        with tracing.tracer.start_as_current_span(f"redis {command}", kind=SpanKind.CLIENT,
+                                                  attributes={"db.system": "redis", "db.operation": command,
+                                                              "redis.client": name}):
+            return execute(*args, **options)
+
+    traced_execute.traced = True
+    client.execute_command = traced_execute
+    return client
+
+
+class TracingMiddleware:
+    """ASGI middleware that opens a server span per request.
+
+    Context of the caller is taken from traceparent and tracestate headers.
+    The span is named by method and route template once routing is done.
+    """
+
+    def __init__(self, app: ASGIApp, tracer: Tracing = tracing):
+        self.app = app
+        self.tracing = tracer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.tracing.provider is None:
+            await self.app(scope, receive, send)
+            return
+        carrier = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        attributes = {"http.method": scope["method"], "http.target": scope["path"]}
+        with self.tracing.tracer.start_as_current_span(f"{scope['method']} {scope['path']}", kind=SpanKind.SERVER,
+                                                       context=propagate.extract(carrier),
+                                                       attributes=attributes) as span:
+
+            async def send_status(message: Message) -> None:
+                if message["type"] == "http.response.start" and span.is_recording():
+                    span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.set_status(StatusCode.ERROR)
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_status)
+            finally:
+                if span.is_recording():
+                    route = route_template(scope)
+                    span.set_attribute("http.route", route)
+                    span.update_name(f"{scope['method']} {route}")
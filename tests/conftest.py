@@ -1,4 +1,8 @@
 
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -6,7 +10,10 @@ from sqlalchemy.orm import sessionmaker
 
 from main import app
 from src.database.models import Base
+from src.conf.config import settings
 from src.database.db import get_db
+from src.database.query_budget import trace_queries
+from src.services.gravatar import email_hash, gravatar_resolver
 
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -15,6 +22,53 @@ engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+trace_queries(engine)
+
+
+class GravatarStub(ThreadingHTTPServer):
+    """Local stand-in for Gravatar, knows avatars of emails in known."""
+
+    def __init__(self, known=()):
+        self.known = {email_hash(email) for email in known}
+        self.requests = 0
+        self.fail = False
+        self.delay = 0
+        self.in_flight = self.peak = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_HEAD(self):
+                with stub.lock:
+                    stub.requests += 1
+                    stub.in_flight += 1
+                    stub.peak = max(stub.peak, stub.in_flight)
+                time.sleep(stub.delay)
+                with stub.lock:
+                    stub.in_flight -= 1
+                if stub.fail:
+                    code = 503
+                else:
+                    code = 200 if self.path.split("?")[0].rsplit("/", 1)[-1] in stub.known else 404
+                self.send_response(code)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}/avatar"
+
+
+@pytest.fixture(scope="session")
+def gravatar_stub():
+    stub = GravatarStub(known=["deadpool@example.com"])
+    thread = threading.Thread(target=stub.serve_forever, daemon=True)
+    thread.start()
+    yield stub
+    stub.shutdown()
+    stub.server_close()
 
 
 @pytest.fixture(scope="module")
@@ -32,8 +86,11 @@ def session():
 
 
 @pytest.fixture(scope="module")
-def client(session):
+def client(session, gravatar_stub):
     # Dependency override
+    gravatar_resolver.base_url = gravatar_stub.url
+    gravatar_resolver.session_factory = TestingSessionLocal
+    settings.query_budget_strict = True
 
     def override_get_db():
         try:
@@ -44,6 +101,7 @@ def client(session):
     app.dependency_overrides[get_db] = override_get_db
 
     yield TestClient(app)
+    settings.query_budget_strict = False
 
 
 @pytest.fixture(scope="module")
@@ -0,0 +1,67 @@
+from unittest.mock import AsyncMock, patch
+
+from src.conf.config import settings
+from src.database.auth import auth_service
+from src.database.models import User
+from src.database.slow_queries import slow_query_log
+
+
+def test_db_pool_stats(client):
+    admin = User(id=1, email="admin@example.com")
+    with patch.object(auth_service, "get_current_user", AsyncMock(return_value=admin)), \
+            patch.object(settings, "admin_emails", ["admin@example.com"]):
+        response = client.get("/api/internal/db/pool", headers={"Authorization": "Bearer token"})
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert {"size", "checked_out", "overflow", "checkouts", "wait_avg", "timeouts"} <= data.keys()
+
+
+def test_db_pool_stats_forbidden(client):
+    user = User(id=2, email="user@example.com")
+    with patch.object(auth_service, "get_current_user", AsyncMock(return_value=user)):
+        response = client.get("/api/internal/db/pool", headers={"Authorization": "Bearer token"})
+    assert response.status_code == 403, response.text
+
+
+def test_slow_queries(client):
+    admin = User(id=1, email="admin@example.com")
+    entry = {"statement": "SELECT 1", "duration_ms": 250.0}
+    with patch.object(auth_service, "get_current_user", AsyncMock(return_value=admin)), \
+            patch.object(settings, "admin_emails", ["admin@example.com"]), \
+            patch.object(slow_query_log, "entries", [entry]):
+        response = client.get("/api/internal/db/slow-queries", headers={"Authorization": "Bearer token"})
+    assert response.status_code == 200, response.text
+    assert response.json() == [entry]
+
+
+def test_profiles_endpoints(client, tmp_path):
+    (tmp_path / "20260101-000000-abcdef01.speedscope.json").write_text('{"frames": []}')
+    admin = User(id=1, email="admin@example.com")
+    headers = {"Authorization": "Bearer token"}
+    with patch.object(auth_service, "get_current_user", AsyncMock(return_value=admin)), \
+            patch.object(settings, "admin_emails", ["admin@example.com"]), \
+            patch.object(settings, "profile_dir", str(tmp_path)):
+        names = client.get("/api/internal/profiles", headers=headers).json()
+        assert names == ["20260101-000000-abcdef01.speedscope.json"]
+        response = client.get(f"/api/internal/profiles/{names[0]}", headers=headers)
+        assert response.json() == {"frames": []}
+        response = client.get("/api/internal/profiles/..%2Fsecret.speedscope.json", headers=headers)
+        assert response.status_code == 404
+
+
+def test_memory_endpoints(client):
+    admin = User(id=1, email="admin@example.com")
+    headers = {"Authorization": "Bearer token"}
+    with patch.object(auth_service, "get_current_user", AsyncMock(return_value=admin)), \
+            patch.object(settings, "admin_emails", ["admin@example.com"]):
+        assert client.get("/api/internal/memory/top", headers=headers).status_code == 409
+        assert client.post("/api/internal/memory/start?frames=5", headers=headers).json()["frames"] == 5
+        try:
+            response = client.get("/api/internal/memory/diff?limit=3&group_by=traceback", headers=headers)
+            assert response.status_code == 200, response.text
+            assert len(response.json()) <= 3
+        finally:
+            assert client.post("/api/internal/memory/stop", headers=headers).json()["tracing"] is False
+        response = client.get("/api/internal/memory/objects", headers=headers)
+        assert response.status_code == 200, response.text
+        assert {"orm", "pydantic", "buffers", "types"} <= response.json().keys()
@@ -0,0 +1,21 @@
+from prometheus_client import REGISTRY
+
+
+def requests_count(route: str, status: str) -> float:
+    return REGISTRY.get_sample_value("http_requests_total", {"method": "GET", "route": route, "status": status}) or 0
+
+
+def test_requests_are_counted_by_route_template(client):
+    before = requests_count("/api/contacts/{contact_id}", "401")
+    client.get("/api/contacts/1")
+    client.get("/api/contacts/2")
+    assert requests_count("/api/contacts/{contact_id}", "401") == before + 2
+
+
+def test_metrics_endpoint(client):
+    client.get("/")
+    response = client.get("/metrics")
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_bucket{le="0.005",method="GET",route="/"}' in response.text
+    assert "mail_queue_depth 0.0" in response.text
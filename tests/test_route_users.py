@@ -1,13 +1,12 @@
 from unittest.mock import MagicMock, patch
 from fastapi_limiter import FastAPILimiter
 
-from src.database.models import User
+from src.database.models import User, EmailOutbox
 from src.database.auth import auth_service
+from src.services.gravatar import email_hash
 
 
-def test_signup(client, user, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.users.send_email", mock_send_email)
+def test_signup(client, session, user):
     response = client.post(
         "/api/auth/signup",
         json=user,
@@ -16,6 +15,12 @@ def test_signup(client, user, monkeypatch):
     data = response.json()
     assert data["user"]["email"] == user.get("email")
     assert "id" in data["user"]
+    email = session.query(EmailOutbox).filter(EmailOutbox.recipient == user.get("email")).first()
+    assert email is not None
+    assert email.payload["username"] == user.get("username")
+    created = session.query(User).filter(User.email == user.get("email")).first()
+    assert data["user"]["avatar"] is None
+    assert created.avatar.endswith("/" + email_hash(user.get("email")))
 
 
 def test_repeat_create_user(client, user):
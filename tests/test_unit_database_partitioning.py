@@ -0,0 +1,164 @@
+import os
+import unittest
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.database import partitioning
+from src.database.models import Base, Contact, User
+from src.repository import contacts as repository_contacts
+from src.schemas import ContactModel
+
+
+POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+
+
+@contextmanager
+def captured(engine):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "contacts" in statement and not statement.startswith("EXPLAIN"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+
+async def run_repository(db, user, birthdays=True):
+    body = ContactModel(firstname="Jane", lastname="Dou", email="jd@mail.com", phone="1", birthday="2000-01-01")
+    contact = await repository_contacts.create_contact(body, db, user)
+    await repository_contacts.get_contacts(db, user)
+    await repository_contacts.get_contact(contact.id, db, user)
+    await repository_contacts.get_contacts_with_name("Jane", db, user)
+    await repository_contacts.get_contacts_with_lastname("Dou", db, user)
+    await repository_contacts.get_contacts_with_email("jd@mail.com", db, user)
+    if birthdays:
+        await repository_contacts.get_contacts_with_recent_birthdays(db, user)
+    await repository_contacts.update_contact(contact.id, body, db, user)
+    await repository_contacts.remove_contact(contact.id, db, user)
+
+
+class TestRepositoryFiltersByPartitionKey(unittest.IsolatedAsyncioTestCase):
+
+    async def test_every_contacts_statement_filters_by_user_id(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        user = User(id=1, email="a@mail.com", password="x")
+        db.add(user)
+        db.commit()
+        with captured(engine) as statements:
+            await run_repository(db, user, birthdays=False)
+        db.close()
+        checked = [s for s, _ in statements if not s.startswith("INSERT")]
+        self.assertGreaterEqual(len(checked), 8)
+        for statement in checked:
+            where = statement.split("WHERE", 1)[-1]
+            self.assertIn("contacts.user_id = ?", where, statement)
+
+
+@unittest.skipUnless(POSTGRES_URL, "TEST_POSTGRES_URL is not set")
+class TestPostgresPartitioning(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.engine = create_engine(POSTGRES_URL)
+        with self.engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {partitioning.OLD}, {partitioning.SHADOW}, "
+                              f"{partitioning.BACKFILLED}, contacts CASCADE"))
+            conn.execute(text(f"DROP FUNCTION IF EXISTS {partitioning.SHADOW}_mirror()"))
+        Base.metadata.create_all(bind=self.engine)
+        self.factory = sessionmaker(bind=self.engine, expire_on_commit=False)
+        with self.factory() as db:
+            db.query(User).delete()
+            db.add_all([User(id=n, email=f"user{n}@mail.com", password="x") for n in range(1, 41)])
+            db.add_all([Contact(firstname="J", lastname="D", user_id=n % 40 + 1) for n in range(400)])
+            db.commit()
+
+    def tearDown(self):
+        with self.engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {partitioning.OLD}, {partitioning.SHADOW}, "
+                              f"{partitioning.BACKFILLED}, contacts CASCADE"))
+            conn.execute(text(f"DROP FUNCTION IF EXISTS {partitioning.SHADOW}_mirror()"))
+        Base.metadata.drop_all(bind=self.engine)
+        self.engine.dispose()
+
+
+    async def test_online_move_and_pruning(self):
+        with self.engine.begin() as conn:
+            partitioning.create_shadow(conn)
+        with self.factory() as db:
+            db.add(Contact(firstname="During", lastname="Backfill", user_id=3))
+            db.query(Contact).filter(Contact.user_id == 5).delete()
+            db.query(Contact).filter(Contact.user_id == 7).update({Contact.lastname: "Changed"})
+            db.commit()
+        with self.engine.connect() as conn:
+            partitioning.backfill(conn, batch_size=50, log=lambda message: None)
+        with self.engine.begin() as conn:
+            partitioning.swap(conn)
+            self.assertEqual(conn.execute(text(f"SELECT count(*) FROM {partitioning.OLD}")).scalar(),
+                             conn.execute(text("SELECT count(*) FROM contacts")).scalar())
+            self.assertEqual(len(partitioning.partition_names(conn, "contacts")), partitioning.PARTITIONS)
+
+        with self.factory() as db:
+            user = db.get(User, 11)
+            with captured(self.engine) as statements:
+                await run_repository(db, user)
+        with self.engine.connect() as conn:
+            for statement, params in statements:
+                if not statement.startswith("INSERT"):
+                    self.assertEqual(len(partitioning.scanned_partitions(conn, statement, params)), 1, statement)
+
+        with self.engine.begin() as conn:
+            partitioning.unswap(conn)
+            self.assertEqual(partitioning.partition_names(conn, "contacts"), [])
+            self.assertEqual(conn.execute(text("SELECT count(*) FROM contacts")).scalar(), 391)
+
+    def test_swap_refuses_without_backfill(self):
+        with self.engine.begin() as conn:
+            partitioning.create_shadow(conn)
+        with self.factory() as db:
+            # Mirrored by the trigger, rows below it are only copied by backfill
+            db.add(Contact(firstname="After", lastname="Shadow", user_id=3))
+            db.commit()
+        with self.engine.connect() as conn:
+            with self.assertRaisesRegex(partitioning.PartitioningError, "backfill"):
+                partitioning.swap(conn)
+            conn.rollback()
+            self.assertEqual(conn.execute(text(f"SELECT count(*) FROM {partitioning.SHADOW}")).scalar(), 1)
+            partitioning.backfill(conn, batch_size=50, log=lambda message: None)
+            conn.execute(text(f"UPDATE {partitioning.SHADOW} SET lastname = 'Lost' WHERE id = 10"))
+            with self.assertRaisesRegex(partitioning.PartitioningError, "differs"):
+                partitioning.swap(conn)
+
+    def test_swap_of_empty_table_needs_no_backfill(self):
+        with self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM contacts"))
+            partitioning.create_shadow(conn)
+        with self.engine.begin() as conn:
+            partitioning.swap(conn)
+            self.assertEqual(len(partitioning.partition_names(conn, "contacts")), partitioning.PARTITIONS)
+
+    def test_contacts_without_user_fail_loudly(self):
+        with self.engine.begin() as conn:
+            conn.execute(text("INSERT INTO contacts (firstname, lastname) VALUES ('No', 'Owner')"))
+            partitioning.create_shadow(conn)
+        with self.engine.connect() as conn:
+            with self.assertRaises(partitioning.PartitioningError):
+                partitioning.backfill(conn, log=lambda message: None)
+            conn.rollback()
+            with self.assertRaises(partitioning.PartitioningError):
+                partitioning.swap(conn)
+        with self.assertRaises(IntegrityError):
+            with self.engine.begin() as conn:
+                conn.execute(text("INSERT INTO contacts (firstname, lastname) VALUES ('New', 'Orphan')"))
+
+
+if __name__ == '__main__':
+    unittest.main()
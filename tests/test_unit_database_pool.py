@@ -0,0 +1,55 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from src.database.db import InstrumentedQueuePool
+
+
+class TestInstrumentedQueuePool(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{Path(self.folder.name) / 'pool.db'}",
+                                    poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=1, pool_timeout=0.2)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.folder.cleanup()
+
+
+    def test_records_checkouts_and_overflow(self):
+        with self.engine.connect() as first, self.engine.connect() as second:
+            first.execute(text("select 1"))
+            second.execute(text("select 1"))
+            stats = self.engine.pool.stats()
+            self.assertEqual(stats["checked_out"], 2)
+            self.assertEqual(stats["overflow"], 1)
+        stats = self.engine.pool.stats()
+        self.assertEqual(stats["checked_out"], 0)
+        self.assertEqual(stats["checkouts"], 2)
+        self.assertEqual(stats["overflow_max"], 1)
+        self.assertEqual(stats["timeouts"], 0)
+
+
+    def test_records_wait_and_timeouts(self):
+        with self.engine.connect(), self.engine.connect():
+            with self.assertRaises(PoolTimeoutError):
+                self.engine.connect()
+        self.assertEqual(self.engine.pool.stats()["timeouts"], 1)
+
+        held = [self.engine.connect(), self.engine.connect()]
+        threading.Timer(0.05, held[0].close).start()
+        with self.engine.connect():
+            pass
+        held[1].close()
+        stats = self.engine.pool.stats()
+        self.assertGreaterEqual(stats["wait_max"], 0.04)
+        self.assertGreater(stats["wait_avg"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from unittest.mock import patch
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import selectinload, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.conf.config import settings
+from src.database.models import Base, Contact, User
+from src.database.query_budget import QueryBudget, QueryBudgetExceeded, QueryTraceMiddleware, trace_queries
+
+
+class TestQueryBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=self.engine)
+        factory = sessionmaker(bind=self.engine)
+        with factory() as db:
+            for n in range(1, 5):
+                db.add(User(id=n, email=f"user{n}@mail.com", password="x"))
+                db.add(Contact(id=n, firstname="Ann", lastname="Lee", user_id=n))
+            db.commit()
+        trace_queries(self.engine)
+
+        app = FastAPI()
+        app.add_middleware(QueryTraceMiddleware, repeat_threshold=3)
+
+        @app.get("/lazy", dependencies=[Depends(QueryBudget(2))])
+        def lazy_notes():
+            with factory() as db:
+                return [len(user.notes) for user in db.scalars(select(User)).all()]
+
+        @app.get("/eager", dependencies=[Depends(QueryBudget(2))])
+        def eager_notes():
+            with factory() as db:
+                return [len(user.notes) for user in db.scalars(select(User).options(selectinload(User.notes))).all()]
+
+        self.client = TestClient(app)
+        strict = patch.object(settings, "query_budget_strict", False)
+        strict.start()
+        self.addCleanup(strict.stop)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_within_budget(self):
+        with self.assertNoLogs("src.database.query_budget"):
+            response = self.client.get("/eager")
+        self.assertEqual(response.json(), [1, 1, 1, 1])
+        self.assertRegex(response.headers["Server-Timing"], r'^db;dur=[\d.]+;desc="2 queries"$')
+
+    def test_lazy_loads_are_logged(self):
+        with self.assertLogs("src.database.query_budget", "WARNING") as logs:
+            response = self.client.get("/lazy")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('desc="5 queries"', response.headers["Server-Timing"])
+        self.assertIn("ran 5 queries, budget is 2", logs.output[0])
+        self.assertIn("same statement 4 times, possible N+1", logs.output[1])
+
+    def test_strict_budget_raises(self):
+        with patch.object(settings, "query_budget_strict", True), self.assertRaises(QueryBudgetExceeded):
+            self.client.get("/lazy")
@@ -0,0 +1,114 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from fakeredis import FakeRedis, FakeServer
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, User
+from src.database.replicas import ReplicaSet, RoutingSession, WritePins, track_writes
+
+
+def make_engine(path: Path, email: str):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add(User(id=1, email=email, password="x"))
+        db.commit()
+    return engine
+
+
+class TestReplicaRouting(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        folder = Path(self.folder.name)
+        self.primary = make_engine(folder / "primary.db", "primary@mail.com")
+        self.replica_engines = [make_engine(folder / f"replica{n}.db", f"replica{n}@mail.com") for n in range(2)]
+        self.replicas = ReplicaSet(self.replica_engines, cooldown=60)
+        self.pins = WritePins(seconds=0.2)
+        self.factory = sessionmaker(bind=self.primary, class_=RoutingSession, replicas=self.replicas, pins=self.pins)
+        track_writes(self.factory, self.pins)
+
+    def tearDown(self):
+        for engine in [self.primary, *self.replica_engines]:
+            engine.dispose()
+        self.folder.cleanup()
+
+    def read_email(self, replica=True, user_id=None) -> str:
+        with self.factory() as db:
+            db.info["replica"] = replica
+            db.info["user_id"] = user_id
+            return db.get(User, 1).email
+
+
+    def test_reads_go_to_replicas_round_robin(self):
+        self.assertEqual(self.read_email(replica=False), "primary@mail.com")
+        emails = [self.read_email() for _ in range(4)]
+        self.assertEqual(emails, ["replica0@mail.com", "replica1@mail.com"] * 2)
+
+
+    def test_writes_and_reads_after_them_use_primary(self):
+        with self.factory() as db:
+            db.info.update(replica=True, user_id=1)
+            db.add(User(id=2, email="new@mail.com", password="x"))
+            db.flush()
+            self.assertEqual(db.get(User, 2).email, "new@mail.com")
+            db.commit()
+        self.assertEqual(self.read_email(user_id=1), "primary@mail.com")
+        self.assertTrue(self.read_email(user_id=2).startswith("replica"))
+        time.sleep(0.25)
+        self.assertTrue(self.read_email(user_id=1).startswith("replica"))
+
+
+    def test_pins_are_shared_between_workers(self):
+        shared = FakeRedis()
+        workers = [WritePins(seconds=0.2, redis=shared) for _ in range(2)]
+        factories = [sessionmaker(bind=self.primary, class_=RoutingSession, replicas=self.replicas, pins=pins)
+                     for pins in workers]
+        for factory, pins in zip(factories, workers):
+            track_writes(factory, pins)
+        with factories[0]() as db:
+            db.info["user_id"] = 1
+            db.get(User, 1).username = "changed"
+            db.commit()
+        self.assertFalse(workers[1].pinned_here(1))
+        self.assertTrue(workers[1].pinned(1))
+        with factories[1]() as db:
+            db.info.update(replica=True, user_id=1)
+            self.assertEqual(db.get(User, 1).email, "primary@mail.com")
+        time.sleep(0.25)
+        self.assertFalse(workers[1].pinned(1))
+
+
+    def test_reads_stay_on_primary_when_pins_can_not_be_read(self):
+        server = FakeServer()
+        server.connected = False
+        pins = WritePins(redis=FakeRedis(server=server))
+        pins.pin(1)
+        self.assertTrue(pins.pinned(1))
+        self.assertTrue(pins.pinned(2))
+        self.assertFalse(pins.pinned(None))
+
+
+    def test_unhealthy_replica_is_skipped(self):
+        broken = create_engine(f"sqlite:///{Path(self.folder.name) / 'missing' / 'replica.db'}")
+        replicas = ReplicaSet([broken, self.replica_engines[0]], cooldown=60)
+        replicas.check()
+        self.assertFalse(replicas.is_healthy(broken))
+        self.assertEqual([replicas.pick() for _ in range(3)], [self.replica_engines[0]] * 3)
+
+        replicas.mark_down(self.replica_engines[0])
+        self.assertIsNone(replicas.pick())
+        factory = sessionmaker(bind=self.primary, class_=RoutingSession, replicas=replicas)
+        with factory() as db:
+            db.info["replica"] = True
+            self.assertEqual(db.get(User, 1).email, "primary@mail.com")
+        replicas.check()
+        self.assertEqual(replicas.pick(), self.replica_engines[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.auth import auth_service
+from src.database.models import Contact, User
+from src.database.seed import ChunkTask, generate_chunk, main, seed
+
+
+class TestGenerateChunk(unittest.TestCase):
+
+    def task(self, **kwargs) -> ChunkTask:
+        values = dict(index=3, seed=7, first_user_id=101, users=2000, contacts_per_user=20, max_contacts=500,
+                      password="hash", copy=False)
+        values.update(kwargs)
+        return ChunkTask(**values)
+
+    def test_rows_repeat_for_same_seed(self):
+        self.assertEqual(generate_chunk(self.task()), generate_chunk(self.task()))
+        self.assertNotEqual(generate_chunk(self.task()).contact_rows, generate_chunk(self.task(index=4)).contact_rows)
+
+    def test_contacts_per_user_are_skewed(self):
+        chunk = generate_chunk(self.task())
+        counts = [0] * 2000
+        for row in chunk.contact_rows:
+            counts[row[-1] - 101] += 1
+        counts.sort()
+        self.assertAlmostEqual(chunk.contacts / chunk.users, 20, delta=2)
+        self.assertLess(counts[1000], 20)
+        self.assertGreater(counts[-1], 100)
+        self.assertLessEqual(counts[-1], 500)
+
+    def test_users_are_unique_and_confirmed(self):
+        users = generate_chunk(self.task()).user_rows
+        self.assertEqual([row[0] for row in users], list(range(101, 2101)))
+        self.assertEqual(len({row[2] for row in users}), 2000)
+        self.assertTrue(all(row[3] == "hash" and row[5] is True for row in users))
+
+    def test_copy_chunk_is_csv(self):
+        chunk = generate_chunk(self.task(users=10, copy=True))
+        self.assertEqual(chunk.user_rows.count("\n"), 10)
+        self.assertTrue(chunk.user_rows.startswith("101,"))
+
+
+class TestSeed(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{Path(self.folder.name) / 'seed.db'}")
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.folder.cleanup()
+
+    def test_seed_appends_users_with_shared_password(self):
+        first = seed(self.engine, 300, contacts_per_user=5, password="secret", workers=2, chunk_users=100)
+        second = seed(self.engine, 50, contacts_per_user=5, password="secret", workers=1, chunk_users=100)
+        with Session(self.engine) as db:
+            self.assertEqual(db.scalar(select(func.count()).select_from(User)), 350)
+            self.assertEqual(db.scalar(select(func.count()).select_from(Contact)), first.contacts + second.contacts)
+            self.assertEqual(db.scalar(select(func.max(User.id))), 350)
+            self.assertEqual(len(set(db.scalars(select(User.password)))), 2)
+            user = db.scalars(select(User).where(User.id == 350)).one()
+            contact = db.scalars(select(Contact)).first()
+        self.assertTrue(user.confirmed)
+        self.assertTrue(auth_service.verify_password("secret", user.password))
+        self.assertIsNotNone(contact.birthday)
+
+    def test_refuses_configured_database_while_sharded(self):
+        with patch.object(settings, "contact_shard_urls", ["sqlite:///./shard0.db"]), \
+                patch("src.database.seed.create_engine") as create:
+            with self.assertRaises(SystemExit):
+                main(["--users", "10"])
+        create.assert_not_called()
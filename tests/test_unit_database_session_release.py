@@ -0,0 +1,91 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, FastAPI, Request
+from fastapi.testclient import TestClient
+from pydantic import BaseModel, field_validator
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.database.db import SessionReleasingRoute, create_db_engine, get_db
+from src.database.models import Base, User
+
+
+checked_out_on_serialize = []
+# Engine on a temporary file, created in setUpClass
+engine = None
+
+
+class CountResponse(BaseModel):
+    count: int
+
+    @field_validator("count")
+    @classmethod
+    def record_pool(cls, value):
+        checked_out_on_serialize.append(engine.pool.checkedout())
+        return value
+
+
+router = APIRouter(route_class=SessionReleasingRoute)
+
+
+@router.get("/count", response_model=CountResponse)
+async def count(db: Session = Depends(get_db)) -> dict:
+    assert engine.pool.checkedout() == 0
+    value = db.execute(select(func.count()).select_from(User)).scalar()
+    assert engine.pool.checkedout() == 1
+    return {"count": value}
+
+
+@router.get("/idle")
+def idle(db: Session = Depends(get_db)) -> dict:
+    return {"count": 0}
+
+
+class TestSessionRelease(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        global engine
+        cls.folder = tempfile.TemporaryDirectory()
+        engine = create_db_engine(f"sqlite:///{Path(cls.folder.name) / 'release.db'}")
+        Base.metadata.create_all(bind=engine)
+        factory = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+        def override_get_db(request: Request):
+            # Registered on request.state like get_db, so SessionReleasingRoute can close it
+            db = factory()
+            request.state.db_sessions = getattr(request.state, "db_sessions", []) + [db]
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app = FastAPI()
+        app.include_router(router)
+        app.dependency_overrides[get_db] = override_get_db
+        cls.client = TestClient(app)
+
+    @classmethod
+    def tearDownClass(cls):
+        engine.dispose()
+        cls.folder.cleanup()
+
+
+    def test_connection_released_before_serialization(self):
+        checked_out_on_serialize.clear()
+        response = self.client.get("/count")
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertEqual(checked_out_on_serialize, [0])
+
+
+    def test_session_without_queries_takes_no_connection(self):
+        checkouts = engine.pool.stats()["checkouts"]
+        response = self.client.get("/idle")
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertEqual(engine.pool.stats()["checkouts"], checkouts)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import tempfile
+import unittest
+from collections import Counter
+from datetime import date
+from pathlib import Path
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, Contact, User
+from src.database.reshard import move_user, plan_rebalance, rebalance
+from src.database.shards import PRIMARY, HiLoAllocator, ShardMap, jump_hash
+from src.repository import contacts as repository_contacts
+from src.schemas import ContactModel
+
+
+class TestJumpHash(unittest.TestCase):
+
+    def test_adding_bucket_moves_keys_only_to_new_bucket(self):
+        before = [jump_hash(key, 3) for key in range(3000)]
+        after = [jump_hash(key, 4) for key in range(3000)]
+        moved = [b for a, b in zip(before, after) if a != b]
+        self.assertTrue(all(bucket == 3 for bucket in moved))
+        self.assertAlmostEqual(len(moved) / 3000, 0.25, delta=0.05)
+        self.assertTrue(all(count > 900 for count in Counter(before).values()))
+
+
+class TestShards(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        folder = Path(self.folder.name)
+        self.primary = create_engine(f"sqlite:///{folder / 'primary.db'}")
+        Base.metadata.create_all(bind=self.primary)
+        self.primary_factory = sessionmaker(bind=self.primary, expire_on_commit=False)
+        with self.primary_factory() as db:
+            db.add_all([User(id=n, email=f"user{n}@mail.com", password="x") for n in range(1, 21)])
+            db.commit()
+        urls = [f"sqlite:///{folder / f'shard{n}.db'}" for n in range(3)]
+        self.shard_map = ShardMap(urls, self.primary_factory, cache_ttl=60, id_block=5, engine_factory=create_engine)
+        self.shard_map.create_all()
+        self.users = {n: User(id=n, email=f"user{n}@mail.com") for n in range(1, 21)}
+        self.body = ContactModel(firstname="Ann", lastname="Lee", email="ann@mail.com", phone="0501234567",
+                                 birthday=date(1990, 1, 1))
+
+    def tearDown(self):
+        for engine in [self.primary, *self.shard_map.engines]:
+            engine.dispose()
+        self.folder.cleanup()
+
+    async def create(self, user_id: int) -> Contact:
+        with self.shard_map.session(user_id) as db:
+            return await repository_contacts.create_contact(self.body, db, self.users[user_id])
+
+    def contacts_on(self, shard: int, user_id: int) -> list:
+        with self.shard_map.factories[shard]() as db:
+            return db.scalars(select(Contact.id).where(Contact.user_id == user_id).order_by(Contact.id)).all()
+
+
+    async def test_contacts_are_stored_on_user_shard_with_unique_ids(self):
+        ids = [(await self.create(user_id)).id for user_id in self.users for _ in range(2)]
+        self.assertEqual(len(set(ids)), 40)
+        for user_id in self.users:
+            shard = jump_hash(user_id, 3)
+            self.assertEqual(len(self.contacts_on(shard, user_id)), 2)
+            self.assertEqual([len(self.contacts_on(n, user_id)) for n in range(3) if n != shard], [0, 0])
+        self.assertEqual(len({jump_hash(user_id, 3) for user_id in self.users}), 3)
+        with self.shard_map.session(1) as db:
+            contacts = await repository_contacts.get_contacts(db, self.users[1])
+        self.assertEqual(len(contacts), 2)
+
+
+    async def test_move_user_keeps_ids_and_frees_source(self):
+        ids = [(await self.create(1)).id for _ in range(3)]
+        source = jump_hash(1, 3)
+        target = (source + 1) % 3
+        self.assertEqual(move_user(self.shard_map, 1, target, grace=0), 3)
+        self.assertEqual(self.contacts_on(target, 1), ids)
+        self.assertEqual(self.contacts_on(source, 1), [])
+        self.assertEqual(self.shard_map.lookup(1), (target, False))
+        with self.shard_map.session(1) as db:
+            contact = await repository_contacts.get_contact(ids[0], db, self.users[1])
+        self.assertEqual(contact.firstname, "Ann")
+        self.assertNotIn(((await self.create(1)).id), ids)
+
+
+    async def test_contacts_on_primary_are_served_until_rebalance(self):
+        with self.primary_factory() as db:
+            db.add_all([Contact(id=n, firstname="Old", lastname="Lee", user_id=n % 2 + 1) for n in range(1, 51)])
+            db.commit()
+        self.assertEqual(self.shard_map.lookup(1), (PRIMARY, False))
+        self.assertEqual(self.shard_map.lookup(3), (jump_hash(3, 3), False))
+        with self.shard_map.session(2) as db:
+            self.assertEqual(len(await repository_contacts.get_contacts(db, self.users[2])), 25)
+        created = (await self.create(2)).id
+        self.assertGreater(created, 50)
+        with self.primary_factory() as db:
+            self.assertEqual(db.scalar(select(Contact.id).where(Contact.id == created)), created)
+
+        moves = rebalance(self.shard_map, grace=0)
+        self.assertEqual(moves, [(1, PRIMARY, jump_hash(1, 3)), (2, PRIMARY, jump_hash(2, 3))])
+        with self.primary_factory() as db:
+            self.assertEqual(db.scalars(select(Contact.id)).all(), [])
+        self.assertEqual(len(self.contacts_on(jump_hash(2, 3), 2)), 26)
+        self.assertIn(created, self.contacts_on(jump_hash(2, 3), 2))
+        self.assertEqual(self.shard_map.lookup(2), (jump_hash(2, 3), False))
+
+
+    def test_frozen_user_gets_503(self):
+        self.shard_map.set_placement(2, 0, frozen=True)
+        with self.assertRaises(HTTPException) as err:
+            self.shard_map.session(2)
+        self.assertEqual(err.exception.status_code, 503)
+        self.assertIn("Retry-After", err.exception.headers)
+
+
+    async def test_rebalance_to_new_placement(self):
+        self.shard_map.placement = 2
+        for user_id in self.users:
+            await self.create(user_id)
+        planned = plan_rebalance(self.shard_map, self.users, placement=3)
+        self.assertTrue(planned)
+        self.assertTrue(all(target == 2 for _, _, target in planned))
+        self.assertEqual(rebalance(self.shard_map, placement=3, grace=0), planned)
+        self.shard_map.placement = 3
+        self.shard_map.cache.clear()
+        self.assertEqual(plan_rebalance(self.shard_map, self.users), [])
+        for user_id in self.users:
+            self.assertEqual(len(self.contacts_on(jump_hash(user_id, 3), user_id)), 1)
+
+
+class TestHiLoAllocator(unittest.TestCase):
+
+    def test_blocks_do_not_overlap_and_start_after_existing_ids(self):
+        with tempfile.TemporaryDirectory() as folder:
+            engine = create_engine(f"sqlite:///{Path(folder) / 'primary.db'}")
+            Base.metadata.create_all(bind=engine)
+            factory = sessionmaker(bind=engine)
+            first = HiLoAllocator(factory, block=3, start=lambda: 100)
+            second = HiLoAllocator(factory, block=3, start=lambda: 100)
+            ids = [first.next_id(), second.next_id(), first.next_id(), first.next_id(), first.next_id()]
+            self.assertEqual(ids, [101, 104, 102, 103, 107])
+            engine.dispose()
@@ -0,0 +1,76 @@
+import json
+import logging
+from logging.handlers import BufferingHandler
+import sqlite3
+import unittest
+from datetime import date
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, Contact, User
+from src.database.slow_queries import SlowQueryLog, parameter_shapes
+from src.repository import contacts as repository_contacts
+from src.services.metrics import request_scope
+
+
+class TestSlowQueryLog(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.user = User(id=1, email="user@mail.com", password="x")
+        self.session.add_all([self.user, Contact(id=1, firstname="Ann", lastname="Lee", birthday=date(1990, 1, 1),
+                                                 user_id=1)])
+        self.session.commit()
+        self.handler = BufferingHandler(capacity=100)
+        log = logging.getLogger("test_slow_queries")
+        log.handlers = [self.handler]
+        log.setLevel(logging.INFO)
+        self.slow_log = SlowQueryLog(threshold_ms=0, keep=2, log=log)
+        self.slow_log.attach(self.engine)
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    async def test_records_caller_route_and_parameter_types(self):
+        token = request_scope.set({"method": "GET", "path": "/api/contacts/by_name/Ann"})
+        try:
+            await repository_contacts.get_contacts_with_name("Ann", self.session, self.user)
+        finally:
+            request_scope.reset(token)
+        entry = self.slow_log.recent()[0]
+        self.assertIn("FROM contacts", entry["statement"])
+        self.assertEqual(entry["caller"], "src.repository.contacts:get_contacts_with_name")
+        self.assertEqual(entry["route"], "GET /api/contacts/by_name/Ann")
+        self.assertEqual(entry["parameters"], ["str", "int"])
+        self.assertIsNone(entry["plan"])
+        self.assertEqual(json.loads(self.handler.buffer[-1].getMessage())["caller"], entry["caller"])
+
+    def test_keeps_last_entries_and_skips_fast_statements(self):
+        for _ in range(3):
+            self.session.get(User, 1)
+            self.session.expire_all()
+        self.assertEqual(len(self.slow_log.recent()), 2)
+        self.slow_log.threshold = 60
+        self.session.get(Contact, (1, 1))
+        self.assertEqual(len(self.handler.buffer), 3)
+
+    def test_explain_errors_are_returned(self):
+        connection = sqlite3.connect(":memory:")
+        connection.execute("CREATE TABLE t (x)")
+        connection.execute("INSERT INTO t VALUES (1)")
+        cursor = connection.cursor()
+        # sqlite has no EXPLAIN (ANALYZE), the savepoint is rolled back and the transaction goes on
+        self.assertRegex(SlowQueryLog.explain(cursor, "SELECT x FROM t", ()), "^explain failed: ")
+        connection.commit()
+        self.assertEqual(connection.execute("SELECT count(*) FROM t").fetchone(), (1,))
+        connection.close()
+        self.assertRegex(SlowQueryLog.explain(cursor, "SELECT x FROM t", ()), "^explain failed: ")
+
+    def test_parameter_shapes(self):
+        self.assertEqual(parameter_shapes({"id": 1, "name": "x"}), {"id": "int", "name": "str"})
+        self.assertEqual(parameter_shapes([(1, None), (2, None)], executemany=True),
+                         {"rows": 2, "first": ["int", "NoneType"]})
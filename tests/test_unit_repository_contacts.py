@@ -1,9 +1,11 @@
 import unittest
 from unittest.mock import MagicMock
 
-from sqlalchemy.orm import Session
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
 
-from src.database.models import Contact, User
+from src.database.models import Base, Contact, User
 from src.schemas import ContactModel, ContactResponse, ContactUpdate
 from src.repository.contacts import (
     get_contacts, 
@@ -28,20 +30,20 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
     
     async def test_get_contacts(self):
         contacts = [Contact(), Contact(), Contact()]
-        self.session.query().filter().all = contacts
+        self.session.scalars.return_value.all.return_value = contacts
         result = await get_contacts(db=self.session, user=self.user)
         self.assertEqual(result, contacts)
 
 
     async def test_get_contact(self):
         contact = Contact()
-        self.session.query().filter().first.return_value = contact
+        self.session.scalars.return_value.first.return_value = contact
         result = await get_contact(contact_id=1, db=self.session, user=self.user)
         self.assertEqual(result, contact)
 
 
     async def test_get_contact_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.scalars.return_value.first.return_value = None
         result = await get_contact(contact_id=1, db=self.session, user=self.user)
         self.assertIsNone(result)
 
@@ -68,7 +70,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
                             birthday="2000-10-31",
                             user_id=self.user.id)
         contact = Contact()
-        self.session.query().filter().first.return_value = contact
+        self.session.scalars.return_value.first.return_value = contact
         self.session.commit.return_value = None
         result = await update_contact(contact_id=1, body=body, user=self.user, db=self.session)
         self.assertEqual(result, contact)
@@ -80,7 +82,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
                              email='jdou@mail.com',
                              phone='08877777777',
                              birthday="2000-10-31")
-        self.session.query().filter().first.return_value = None
+        self.session.scalars.return_value.first.return_value = None
         self.session.commit.return_value = None
         result = await update_contact(contact_id=1, body=body, user=self.user, db=self.session)
         self.assertIsNone(result)
@@ -88,13 +90,13 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     async def test_remove_contact(self):
         contact = Contact()
-        self.session.query().filter().first.return_value = contact
+        self.session.scalars.return_value.first.return_value = contact
         result = await remove_contact(contact_id=1, user=self.user, db=self.session)
         self.assertEqual(result, contact)
 
 
     async def test_remove_note_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.scalars.return_value.first.return_value = None
         result = await remove_contact(contact_id=1, user=self.user, db=self.session)
         self.assertIsNone(result)
 
@@ -102,7 +104,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
     async def test_get_contacts_with_name(self):
         name='Jane'
         contacts = [Contact(firstname=name), Contact(firstname=name), Contact(firstname=name)]
-        self.session.query().filter().all = contacts
+        self.session.scalars.return_value.all.return_value = contacts
         result = await get_contacts_with_name(db=self.session, name=name, user=self.user)
         self.assertEqual(result, contacts)
 
@@ -110,7 +112,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
     async def test_get_contacts_with_lasname(self):
         lastname='Dou'
         contacts = [Contact(lastname=lastname), Contact(lastname=lastname), Contact(lastname=lastname)]
-        self.session.query().filter().all = contacts
+        self.session.scalars.return_value.all.return_value = contacts
         result = await get_contacts_with_lastname(db=self.session, lastname=lastname, user=self.user)
         self.assertEqual(result, contacts)
 
@@ -118,18 +120,51 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
     async def test_get_contacts_with_email(self):
         email='dou@mail.com'
         contacts = [Contact(email=email), Contact(email=email), Contact(email=email)]
-        self.session.query().filter().all = contacts
+        self.session.scalars.return_value.all.return_value = contacts
         result = await get_contacts_with_email(db=self.session, email=email, user=self.user)
         self.assertEqual(result, contacts)
 
 
     async def test_get_contacts_with_recent_birthdays(self):
         contacts = [Contact(), Contact(), Contact()]
-        self.session.query().filter().all = contacts
+        self.session.scalars.return_value.all.return_value = contacts
         result = await get_contacts_with_recent_birthdays(db=self.session, user=self.user)
         self.assertEqual(result, contacts)
 
 
+class TestContactQueries(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.user, self.other = User(id=1, email="a@mail.com", password="x"), User(id=2, email="b@mail.com", password="x")
+        self.session.add_all([self.user, self.other,
+                              Contact(id=1, firstname="Jane", lastname="Dou", email="jd@mail.com", user_id=1),
+                              Contact(id=2, firstname="Jane", lastname="Roe", email="jr@mail.com", user_id=2)])
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+
+    async def test_queries_are_scoped_to_user(self):
+        self.assertEqual((await get_contact(1, self.session, self.user)).lastname, "Dou")
+        self.assertIsNone(await get_contact(2, self.session, self.user))
+        self.assertEqual([c.id for c in await get_contacts(self.session, self.other)], [2])
+        self.assertEqual([c.id for c in await get_contacts_with_name("Jane", self.session, self.user)], [1])
+        self.assertEqual(await get_contacts_with_lastname("Roe", self.session, self.user), [])
+        self.assertEqual([c.id for c in await get_contacts_with_email("jr@mail.com", self.session, self.other)], [2])
+
+
+    async def test_statements_are_compiled_once(self):
+        await get_contact(1, self.session, self.user)
+        cached = len(self.engine._compiled_cache)
+        for contact_id in range(2, 20):
+            await get_contact(contact_id, self.session, self.other)
+        self.assertEqual(len(self.engine._compiled_cache), cached)
+
+
 if __name__ == '__main__':
     unittest.main()
 
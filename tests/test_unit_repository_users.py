@@ -3,7 +3,7 @@ from unittest.mock import MagicMock
 
 from sqlalchemy.orm import Session
 
-from src.database.models import Contact, User
+from src.database.models import Contact, User, EmailOutbox
 from src.schemas import UserDb, UserModel, UserResponse
 from src.repository.users import (
     get_user_by_email,
@@ -23,7 +23,7 @@ class TestUsers(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_users(self):
         user = User()
-        self.session.query().filter().first.return_value = user
+        self.session.scalars.return_value.first.return_value = user
         result = await get_user_by_email(db=self.session, email='test@mail.com')
         self.assertEqual(result, user)
 
@@ -38,6 +38,17 @@ class TestUsers(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result.password, body.password)
         self.assertTrue(hasattr(result, "id"))
 
+
+    async def test_create_user_with_confirmation_email(self):
+        body = UserModel(username='testname',
+                         email='jd@mail.com',
+                         password='654321')
+        await create_user(body=body, db=self.session, host='http://localhost/')
+        outbox = [call.args[0] for call in self.session.add.call_args_list if isinstance(call.args[0], EmailOutbox)]
+        self.assertEqual(len(outbox), 1)
+        self.assertEqual(outbox[0].payload["host"], 'http://localhost/')
+        self.session.commit.assert_called_once()
+
     
     async def test_update_token(self):
         self.session.commit.return_value = None
@@ -53,7 +64,7 @@ class TestUsers(unittest.IsolatedAsyncioTestCase):
 
     async def test_update_avatar(self):
         user = User()
-        self.session.query().filter().first.return_value = user
+        self.session.scalars.return_value.first.return_value = user
         self.session.commit.return_value = user
         result = await update_avatar(email='test@mail.com', url='test_url', db=self.session)
         self.assertEqual(result, user)
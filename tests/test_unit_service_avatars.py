@@ -0,0 +1,143 @@
+import io
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import cloudinary.exceptions
+import httpx
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+from src.services.avatars import AvatarService, CloudinaryStorage, LocalStorage, process_image
+
+
+def make_image(width=1200, height=800, fmt="PNG", mode="RGB") -> bytes:
+    out = io.BytesIO()
+    Image.new(mode, (width, height), "red").save(out, fmt)
+    return out.getvalue()
+
+
+def upload_file(content: bytes) -> UploadFile:
+    return UploadFile(file=io.BytesIO(content), filename="a.png")
+
+
+class CountingStorage(LocalStorage):
+
+    def __init__(self, folder):
+        super().__init__(folder, "/static/avatars/")
+        self.saves = 0
+        self.thread = None
+
+    def save(self, fileobj, key):
+        self.saves += 1
+        self.thread = threading.get_ident()
+        return super().save(fileobj, key)
+
+
+class TestProcessImage(unittest.TestCase):
+
+    def test_crops_to_square(self):
+        for fmt, source in (("webp", make_image()), ("jpeg", make_image(3000, 2000, "JPEG")),
+                            ("webp", make_image(300, 300, "PNG", "RGBA")), ("jpeg", make_image(400, 300, "GIF", "P"))):
+            with self.subTest(fmt=fmt):
+                avatar = Image.open(io.BytesIO(process_image(io.BytesIO(source), 250, fmt)))
+                self.assertEqual(avatar.size, (250, 250))
+                self.assertEqual(avatar.format, fmt.upper())
+
+
+    def test_rejects_invalid_images(self):
+        with self.assertRaises(ValueError):
+            process_image(io.BytesIO(b"not an image"))
+        with self.assertRaises(ValueError):
+            process_image(io.BytesIO(make_image()), max_pixels=1000)
+
+
+class TestAvatarService(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.storage = CountingStorage(Path(self.folder.name))
+        self.service = AvatarService(self.storage, max_bytes=1024 * 1024)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    async def test_upload_resizes_and_stores_by_content_hash(self):
+        source = make_image()
+        url = await self.service.upload(upload_file(source), "NotesApp")
+        self.assertRegex(url, r"^/static/avatars/NotesApp/[0-9a-f]{32}_250_q80_v1\.webp$")
+        saved = Path(self.folder.name) / url.removeprefix("/static/avatars/")
+        self.assertLess(saved.stat().st_size, len(source))
+        self.assertEqual(Image.open(saved).size, (250, 250))
+        self.assertNotEqual(self.storage.thread, threading.get_ident())
+
+        self.assertEqual(await self.service.upload(upload_file(source), "NotesApp"), url)
+        self.assertEqual(self.storage.saves, 1)
+        self.assertNotEqual(await self.service.upload(upload_file(make_image(600, 600)), "NotesApp"), url)
+        self.assertEqual(self.storage.saves, 2)
+
+        self.service.quality = 60
+        self.assertNotEqual(await self.service.upload(upload_file(source), "NotesApp"), url)
+        self.assertEqual(self.storage.saves, 3)
+
+
+    async def test_upload_too_large(self):
+        with self.assertRaises(HTTPException) as err:
+            await self.service.upload(upload_file(b"\x89PNG" + b"x" * 2 * 1024 * 1024), "NotesApp")
+        self.assertEqual(err.exception.status_code, 413)
+        self.assertEqual(self.storage.saves, 0)
+
+
+    async def test_upload_not_an_image(self):
+        with self.assertRaises(HTTPException) as err:
+            await self.service.upload(upload_file(b"hello"), "NotesApp")
+        self.assertEqual(err.exception.status_code, 415)
+
+
+    async def test_storage_failure_is_service_unavailable(self):
+        Path(self.folder.name, "NotesApp").write_text("a file where the folder should be")
+        with self.assertRaises(HTTPException) as err:
+            await self.service.upload(upload_file(make_image()), "NotesApp")
+        self.assertEqual(err.exception.status_code, 503)
+
+        with patch("src.services.avatars.httpx.head", return_value=httpx.Response(404)), \
+                patch("src.services.avatars.cloudinary.uploader.upload_large",
+                      side_effect=cloudinary.exceptions.GeneralError("Server returned unexpected status code - 502")):
+            with self.assertRaises(HTTPException) as err:
+                await AvatarService(CloudinaryStorage("cloud", "key", "secret")).upload(upload_file(make_image()),
+                                                                                        "NotesApp")
+        self.assertEqual(err.exception.status_code, 503)
+
+
+    async def test_local_storage_rejects_paths_outside_folder(self):
+        with self.assertRaises(ValueError):
+            self.storage.exists("../outside.webp")
+
+
+    async def test_cloudinary_storage(self):
+        with patch("src.services.avatars.httpx.head", return_value=httpx.Response(404)) as head, \
+                patch("src.services.avatars.cloudinary.uploader.upload_large") as upload:
+            storage = CloudinaryStorage("cloud", "key", "secret")
+            url = await AvatarService(storage).upload(upload_file(make_image()), "NotesApp")
+            self.assertEqual(await AvatarService(storage).upload(upload_file(make_image()), "NotesApp"), url)
+        self.assertEqual(head.call_args.args[0], url)
+        self.assertEqual(head.call_count, 1)
+        self.assertEqual(upload.call_count, 1)
+        self.assertEqual(upload.call_args.kwargs["overwrite"], False)
+        self.assertRegex(upload.call_args.kwargs["public_id"], r"^NotesApp/[0-9a-f]{32}_250_q80_v1$")
+        self.assertRegex(url, r"/NotesApp/[0-9a-f]{32}_250_q80_v1\.webp$")
+
+    async def test_cloudinary_storage_finds_image_on_delivery_url(self):
+        with patch("src.services.avatars.httpx.head", return_value=httpx.Response(200)) as head, \
+                patch("src.services.avatars.cloudinary.uploader.upload_large") as upload:
+            storage = CloudinaryStorage("cloud", "key", "secret")
+            self.assertTrue(storage.exists("NotesApp/abc_250_q80_v1.webp"))
+            self.assertTrue(storage.exists("NotesApp/abc_250_q80_v1.webp"))
+        self.assertEqual(head.call_count, 1)
+        upload.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import tempfile
+import unittest
+from datetime import date, datetime
+from pathlib import Path
+
+from sqlalchemy import create_engine, delete, event
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, Contact, EmailOutbox, User
+from src.database.reshard import copy_user
+from src.database.shards import ShardMap, jump_hash
+from src.repository import outbox as repository_outbox
+from src.services.birthday_reminders import read_checkpoint, run
+
+
+class TestBirthdayReminderJob(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        engine = self.engine = create_engine(f"sqlite:///{self.folder.name}/job.db")
+        self.addCleanup(engine.dispose)
+        Base.metadata.create_all(bind=engine)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        self.checkpoint = Path(self.folder.name) / "checkpoint.json"
+        self.today = date(2023, 10, 30)
+        db = self.SessionLocal()
+        for n, birthdays in enumerate([[(11, 2), (5, 5)], [(6, 6)], [(10, 30), (11, 5), (11, 1)]], start=1):
+            db.add(User(id=n, username=f"user{n}", email=f"user{n}@mail.com", password="x"))
+            for month, day in birthdays:
+                db.add(Contact(firstname="Jane", lastname=f"Dou{month}-{day}", email="jd@mail.com", phone="1",
+                               birthday=datetime(1990, month, day), user_id=n))
+        db.commit()
+        db.close()
+
+
+    def digests(self):
+        db = self.SessionLocal()
+        entries = db.query(EmailOutbox).filter(EmailOutbox.kind == repository_outbox.BIRTHDAY_DIGEST)\
+            .order_by(EmailOutbox.id).all()
+        db.close()
+        return entries
+
+
+    def test_one_digest_per_user(self):
+        queued = run(self.today, 7, self.checkpoint, session_factory=self.SessionLocal, batch_users=1)
+        self.assertEqual(queued, 2)
+        digests = self.digests()
+        self.assertEqual([entry.recipient for entry in digests], ["user1@mail.com", "user3@mail.com"])
+        self.assertEqual([c["days"] for c in digests[1].payload["contacts"]], [0, 2, 6])
+        self.assertEqual(read_checkpoint(self.checkpoint, self.today), 3)
+
+
+    def test_restarts_from_checkpoint(self):
+        self.checkpoint.write_text('{"date": "2023-10-30", "last_user_id": 1}')
+        self.assertEqual(run(self.today, 7, self.checkpoint, session_factory=self.SessionLocal), 1)
+        self.assertEqual([entry.recipient for entry in self.digests()], ["user3@mail.com"])
+
+
+    def test_checkpoint_of_other_day_is_ignored(self):
+        self.checkpoint.write_text('{"date": "2023-10-29", "last_user_id": 3}')
+        self.assertEqual(run(self.today, 7, self.checkpoint, session_factory=self.SessionLocal), 2)
+
+
+    def test_reads_and_writes_over_one_connection(self):
+        checked_out = [0, 0]
+
+        def checkout(*args):
+            checked_out[0] += 1
+            checked_out[1] = max(checked_out)
+
+        def checkin(*args):
+            checked_out[0] -= 1
+
+        event.listen(self.engine.pool, "checkout", checkout)
+        event.listen(self.engine.pool, "checkin", checkin)
+        queued = run(self.today, 7, self.checkpoint, session_factory=self.SessionLocal, batch_users=2)
+        self.assertEqual(queued, 2)
+        self.assertEqual(checked_out, [0, 1])
+        self.assertEqual(read_checkpoint(self.checkpoint, self.today), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+    def test_reads_contacts_from_shards(self):
+        urls = [f"sqlite:///{self.folder.name}/shard{n}.db" for n in range(2)]
+        shard_map = ShardMap(urls, self.SessionLocal, engine_factory=create_engine)
+        for engine in shard_map.engines:
+            self.addCleanup(engine.dispose)
+        shard_map.create_all()
+        with self.SessionLocal() as db, shard_map.factories[jump_hash(3, 2)]() as shard:
+            copy_user(db, shard, 3)
+            db.execute(delete(Contact).where(Contact.user_id == 3))
+            db.commit()
+        # user 1 has no placement yet and is read from the primary, not from a leftover copy
+        with self.SessionLocal() as db, shard_map.factories[0]() as shard:
+            copy_user(db, shard, 1)
+        queued = run(self.today, 7, self.checkpoint, session_factory=self.SessionLocal, shard_map=shard_map)
+        self.assertEqual(queued, 2)
+        digests = self.digests()
+        self.assertEqual([entry.recipient for entry in digests], ["user1@mail.com", "user3@mail.com"])
+        self.assertEqual([c["days"] for c in digests[0].payload["contacts"]], [3])
+        self.assertEqual([c["days"] for c in digests[1].payload["contacts"]], [0, 2, 6])
@@ -0,0 +1,135 @@
+import calendar
+import random
+import unittest
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, Contact, User
+from src.database.shards import ShardMap, jump_hash
+from src.services.birthdays import days_until_birthdays, to_datetime64, top_k_per_user, upcoming_birthdays
+
+
+def days_until_birthday(birthday: date, today: date) -> int:
+    # walks day by day, 29 February matches 28 February in common years
+    day = today
+    while True:
+        leap_day = birthday.month == 2 and birthday.day == 29 and day.month == 2 and day.day == 28 \
+            and not calendar.isleap(day.year)
+        if (day.month, day.day) == (birthday.month, birthday.day) or leap_day:
+            return (day - today).days
+        day += timedelta(days=1)
+
+
+class TestVectorizedBirthdays(unittest.TestCase):
+
+    def days(self, birthday: date, today: date) -> int:
+        return days_until_birthdays(to_datetime64([birthday]), today)[0]
+
+
+    def test_same_year_and_wrap(self):
+        today = date(2023, 12, 30)
+        self.assertEqual(self.days(date(1990, 12, 30), today), 0)
+        self.assertEqual(self.days(date(1990, 12, 31), today), 1)
+        self.assertEqual(self.days(date(1990, 1, 2), today), 3)
+        self.assertEqual(self.days(date(1990, 12, 29), today), 365)
+
+
+    def test_leap_day(self):
+        self.assertEqual(self.days(date(2000, 2, 29), date(2023, 2, 27)), 1)
+        self.assertEqual(self.days(date(2000, 2, 29), date(2024, 2, 27)), 2)
+
+
+    def test_matches_day_by_day_count(self):
+        rnd = random.Random(32)
+        birthdays = [date(1950, 1, 1) + timedelta(days=rnd.randrange(365 * 60)) for _ in range(2000)]
+        birthdays += [date(2000, 2, 29), date(1996, 2, 29), date(1990, 12, 31), date(1990, 1, 1)]
+        for today in (date(2023, 1, 1), date(2023, 2, 28), date(2024, 2, 28), date(2024, 3, 1), date(2023, 12, 31)):
+            with self.subTest(today=today):
+                expected = [days_until_birthday(birthday, today) for birthday in birthdays]
+                result = days_until_birthdays(to_datetime64(birthdays), today)
+                self.assertEqual(result.tolist(), expected)
+
+
+    def test_missing_birthdays(self):
+        result = days_until_birthdays(to_datetime64([None, date(1990, 5, 2)]), date(2023, 5, 1))
+        self.assertEqual(result.tolist(), [-1, 1])
+
+
+    def test_top_k_per_user(self):
+        user_ids = np.array([2, 1, 1, 1, 2, 3])
+        contact_ids = np.array([10, 11, 12, 13, 14, 15])
+        days = np.array([5, 9, 1, 4, 3, -1])
+        users, contacts, left = top_k_per_user(user_ids, contact_ids, days, k=2)
+        self.assertEqual(users.tolist(), [1, 1, 2, 2])
+        self.assertEqual(contacts.tolist(), [12, 13, 14, 10])
+        self.assertEqual(left.tolist(), [1, 4, 3, 5])
+        users, _, _ = top_k_per_user(user_ids, contact_ids, days, k=2, within=4)
+        self.assertEqual(users.tolist(), [1, 2])
+
+
+    def test_upcoming_birthdays_over_chunks(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        db.add_all([User(id=1, email="a@mail.com", password="x"), User(id=2, email="b@mail.com", password="x")])
+        for n, (user_id, month, day) in enumerate([(1, 5, 3), (2, 5, 2), (1, 5, 1), (1, 4, 1), (2, 6, 1), (1, 5, 2)]):
+            db.add(Contact(id=n + 1, firstname="J", lastname="D", user_id=user_id, birthday=datetime(1990, month, day)))
+        db.commit()
+        result = upcoming_birthdays(db, date(2023, 5, 1), k=2, chunk_size=2)
+        db.close()
+        self.assertEqual(result, {1: [(3, 0), (6, 1)], 2: [(2, 1), (5, 31)]})
+
+    def test_upcoming_birthdays_over_shards(self):
+        def memory_engine(url):
+            engine = create_engine(url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+            Base.metadata.create_all(bind=engine)
+            return engine
+
+        primary = memory_engine("sqlite://")
+        factory = sessionmaker(bind=primary)
+        shard_map = ShardMap(["sqlite://", "sqlite://"], factory, engine_factory=memory_engine)
+        with factory() as db:
+            db.add_all([User(id=n, email=f"user{n}@mail.com", password="x") for n in (1, 2)])
+            db.add(Contact(id=1, firstname="J", lastname="D", user_id=1, birthday=datetime(1990, 5, 3)))
+            db.commit()
+        with shard_map.factories[jump_hash(2, 2)]() as shard, shard_map.factories[1 - jump_hash(2, 2)]() as other:
+            shard.add(Contact(id=2, firstname="J", lastname="D", user_id=2, birthday=datetime(1990, 5, 2)))
+            # left behind by an unfinished move
+            other.add(Contact(id=3, firstname="J", lastname="D", user_id=2, birthday=datetime(1990, 5, 1)))
+            shard.commit()
+            other.commit()
+        with factory() as db:
+            result = upcoming_birthdays(db, date(2023, 5, 1), k=2, chunk_size=1, shard_map=shard_map)
+        self.assertEqual(result, {1: [(1, 2)], 2: [(2, 1)]})
+
+    def test_running_candidates_stay_within_k_per_user(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        db.add_all([User(id=n, email=f"user{n}@mail.com", password="x") for n in (1, 2, 3)])
+        rng = random.Random(1)
+        db.add_all([Contact(id=n + 1, firstname="J", lastname="D", user_id=n % 3 + 1,
+                            birthday=datetime(1990, rng.randint(1, 12), rng.randint(1, 28))) for n in range(60)])
+        db.commit()
+        sizes = []
+
+        def recording(user_ids, *args, **kwargs):
+            sizes.append(len(user_ids))
+            return top_k_per_user(user_ids, *args, **kwargs)
+
+        with patch("src.services.birthdays.top_k_per_user", side_effect=recording):
+            result = upcoming_birthdays(db, date(2023, 5, 1), k=2, chunk_size=4)
+        db.close()
+        # Merges see one chunk's top k plus running top k of 3 users, never the top k of every chunk
+        self.assertEqual(len(sizes), 30)
+        self.assertLessEqual(max(sizes), 4 + 2 * 3)
+        self.assertEqual({user_id: len(found) for user_id, found in result.items()}, {1: 2, 2: 2, 3: 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import asyncio
+import unittest
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, User
+from src.services.gravatar import GravatarResolver, TTLCache
+
+
+class TestGravatarResolver(unittest.IsolatedAsyncioTestCase):
+
+    @pytest.fixture(autouse=True)
+    def use_stub(self, gravatar_stub):
+        self.stub = gravatar_stub
+        self.stub.requests = 0
+        self.stub.fail = False
+
+    def make_resolver(self, **kwargs) -> GravatarResolver:
+        return GravatarResolver(self.stub.url, **kwargs)
+
+
+    async def test_resolve_caches_found_and_missing(self):
+        resolver = self.make_resolver()
+        await resolver.start()
+        self.addAsyncCleanup(resolver.stop)
+        url = await resolver.resolve(" DeadPool@Example.com")
+        self.assertTrue(url.startswith(self.stub.url))
+        self.assertIsNone(await resolver.resolve("nobody@example.com"))
+        self.assertEqual(await resolver.resolve("deadpool@example.com"), url)
+        self.assertIsNone(await resolver.resolve("nobody@example.com"))
+        self.assertEqual(self.stub.requests, 2)
+
+
+    async def test_errors_are_not_cached(self):
+        resolver = self.make_resolver()
+        self.stub.fail = True
+        self.assertIsNone(await resolver.resolve("deadpool@example.com"))
+        self.stub.fail = False
+        self.assertIsNotNone(await resolver.resolve("deadpool@example.com"))
+        self.assertEqual(self.stub.requests, 2)
+
+
+    async def test_negative_entries_expire(self):
+        resolver = self.make_resolver(negative_ttl=0)
+        await resolver.resolve("nobody@example.com")
+        await resolver.resolve("nobody@example.com")
+        self.assertEqual(self.stub.requests, 2)
+
+
+    async def test_concurrency_is_bounded(self):
+        resolver = self.make_resolver(concurrency=3)
+        await resolver.start()
+        self.addAsyncCleanup(resolver.stop)
+        self.stub.delay = 0.05
+        self.addCleanup(setattr, self.stub, "delay", 0)
+        self.stub.peak = 0
+        await asyncio.gather(*(resolver.resolve(f"user{n}@example.com") for n in range(12)))
+        self.assertEqual(self.stub.requests, 12)
+        self.assertEqual(self.stub.peak, 3)
+
+
+    async def test_update_user_avatar_keeps_uploaded_avatar(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        factory = sessionmaker(bind=engine)
+        db = factory()
+        db.add_all([User(id=1, email="deadpool@example.com", password="x"),
+                    User(id=2, email="deadpool@example.com ", password="x", avatar="uploaded")])
+        db.commit()
+        resolver = GravatarResolver(self.stub.url, session_factory=factory)
+        url = await resolver.update_user_avatar(1, "deadpool@example.com")
+        await resolver.update_user_avatar(2, "deadpool@example.com ")
+        db.expire_all()
+        self.assertEqual(db.get(User, 1).avatar, url)
+        self.assertEqual(db.get(User, 2).avatar, "uploaded")
+        db.close()
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(maxsize=2)
+        cache.set("a", "1", 60)
+        cache.set("b", None, 60)
+        self.assertEqual(cache.get("a"), (True, "1"))
+        cache.set("c", "3", 60)
+        self.assertEqual(cache.get("b"), (False, None))
+        self.assertEqual(cache.get("a"), (True, "1"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import socket
+import unittest
+from email.message import EmailMessage
+
+from aiosmtpd.controller import Controller
+
+from src.services.mail_dispatcher import MailDispatcher
+
+
+class RecordingHandler:
+
+    def __init__(self, reject=None, refuse=()):
+        self.messages = []
+        self.sessions = set()
+        self.reject = list(reject or [])
+        self.refuse = set(refuse)
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.refuse:
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.reject:
+            return self.reject.pop(0)
+        self.sessions.add(id(session))
+        self.messages.append(envelope)
+        return "250 Message accepted for delivery"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_message(n: int) -> EmailMessage:
+    message = EmailMessage()
+    message["Subject"] = f"Message {n}"
+    message["From"] = "noreply@example.com"
+    message["To"] = f"user{n}@example.com"
+    message.set_content("<p>Hello</p>", subtype="html")
+    return message
+
+
+class TestMailDispatcher(unittest.IsolatedAsyncioTestCase):
+
+    def start_server(self, handler: RecordingHandler, pool_size: int = 2) -> MailDispatcher:
+        controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+        controller.start()
+        self.addCleanup(controller.stop)
+        return MailDispatcher(hostname=controller.hostname, port=controller.port, use_tls=False,
+                              pool_size=pool_size, batch_size=5, max_retries=2, backoff=0.01)
+
+
+    async def test_reuses_pooled_connections(self):
+        handler = RecordingHandler()
+        dispatcher = self.start_server(handler)
+        for n in range(20):
+            await dispatcher.submit(make_message(n))
+        await dispatcher.stop()
+        self.assertEqual(len(handler.messages), 20)
+        self.assertEqual(dispatcher.metrics.sent, 20)
+        self.assertLessEqual(dispatcher.metrics.connections, 2)
+        self.assertLessEqual(len(handler.sessions), 2)
+        self.assertGreater(dispatcher.metrics.as_dict()["latency_avg"], 0)
+
+
+    async def test_retries_transient_errors(self):
+        handler = RecordingHandler(reject=["451 Try again later"])
+        dispatcher = self.start_server(handler)
+        await dispatcher.submit(make_message(1))
+        await dispatcher.stop()
+        self.assertEqual(len(handler.messages), 1)
+        self.assertEqual(dispatcher.metrics.retries, 1)
+        self.assertEqual(dispatcher.metrics.failed, 0)
+
+
+    async def test_counts_permanent_failures(self):
+        handler = RecordingHandler(reject=["550 Mailbox unavailable"])
+        dispatcher = self.start_server(handler)
+        rejected = await dispatcher.submit(make_message(1))
+        delivered = await dispatcher.submit(make_message(2))
+        await dispatcher.stop()
+        self.assertIn("Mailbox unavailable", await rejected)
+        self.assertIsNone(await delivered)
+        self.assertEqual(len(handler.messages), 1)
+        self.assertEqual(dispatcher.metrics.failed, 1)
+        self.assertEqual(dispatcher.metrics.sent, 1)
+        self.assertEqual(dispatcher.metrics.retries, 0)
+
+
+    async def test_keeps_connection_after_refused_recipient(self):
+        handler = RecordingHandler(reject=["552 Message too big"], refuse={"user1@example.com"})
+        dispatcher = self.start_server(handler, pool_size=1)
+        refused = await dispatcher.submit(make_message(1))
+        rejected = await dispatcher.submit(make_message(2))
+        delivered = await dispatcher.submit(make_message(3))
+        await dispatcher.stop()
+        self.assertIn("No such user", await refused)
+        self.assertIn("Message too big", await rejected)
+        self.assertIsNone(await delivered)
+        self.assertEqual(dispatcher.metrics.failed, 2)
+        self.assertEqual(dispatcher.metrics.retries, 0)
+        self.assertEqual(dispatcher.metrics.connections, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.services.mail_templates import TemplateRegistry, template_registry
+
+
+class TestTemplateRegistry(unittest.TestCase):
+
+    def test_renders_html_and_text(self):
+        rendered = template_registry.render("email_template", {"host": "http://localhost/", "username": "<jane>",
+                                                               "token": "abc"})
+        self.assertIn("http://localhost/api/auth/confirmed_email/abc", rendered.html)
+        self.assertIn("&lt;jane&gt;", rendered.html)
+        self.assertIn("http://localhost/api/auth/confirmed_email/abc", rendered.text)
+        self.assertIn("Hi <jane>,", rendered.text)
+
+
+    def test_load_compiles_once(self):
+        registry = TemplateRegistry(Path(template_registry.folder))
+        self.assertGreaterEqual(registry.load(), 2)
+        template = registry.env.get_template("email_template.html")
+        self.assertIs(registry.env.get_template("email_template.html"), template)
+
+
+    def test_text_is_optional_and_reload(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = Path(folder) / "note.html"
+            path.write_text("<p>{{ n }}</p>")
+            registry = TemplateRegistry(Path(folder), auto_reload=True)
+            rendered = registry.render("note", {"n": 1})
+            self.assertEqual(rendered.html, "<p>1</p>")
+            self.assertIsNone(rendered.text)
+            path.write_text("<b>{{ n }}</b>")
+            mtime = path.stat().st_mtime + 10
+            os.utime(path, (mtime, mtime))
+            self.assertEqual(registry.render("note", {"n": 2}).html, "<b>2</b>")
+
+
+if __name__ == '__main__':
+    unittest.main()
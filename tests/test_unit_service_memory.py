@@ -0,0 +1,44 @@
+import unittest
+
+from fastapi import HTTPException
+
+from src.database.models import Contact
+from src.schemas import UserModel
+from src.services.memory import MemoryTracker, live_objects
+
+
+class TestMemoryTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.tracker = MemoryTracker()
+
+    def tearDown(self):
+        self.tracker.stop()
+
+    def test_diff_shows_allocation_site(self):
+        self.tracker.start()
+        kept = [bytearray(1000) for _ in range(200)]
+        sites = self.tracker.diff(limit=5)
+        self.assertIn(__file__, sites[0]["site"])
+        self.assertGreaterEqual(sites[0]["size_diff"], 200_000)
+        self.assertGreaterEqual(sites[0]["count_diff"], 200)
+        self.assertIn(__file__, self.tracker.top(limit=5)[0]["site"])
+        self.tracker.reset_baseline()
+        self.assertLess(abs(self.tracker.diff(limit=1)[0]["size_diff"]), 100_000)
+        del kept
+
+    def test_snapshots_need_tracing(self):
+        self.assertFalse(self.tracker.status()["tracing"])
+        with self.assertRaises(HTTPException) as err:
+            self.tracker.top()
+        self.assertEqual(err.exception.status_code, 409)
+
+    def test_live_objects(self):
+        contacts = [Contact(firstname="Ann", lastname="Lee") for _ in range(3)]
+        model = UserModel(username="username", email="user@mail.com", password="12345678")
+        buffer = [b"x" * 100_000]
+        objects = live_objects()
+        self.assertGreaterEqual(objects["orm"]["Contact"], 3)
+        self.assertGreaterEqual(objects["pydantic"]["UserModel"], 1)
+        self.assertGreaterEqual(objects["buffers"]["size"], 100_000)
+        del contacts, model, buffer
@@ -0,0 +1,43 @@
+import unittest
+
+from fakeredis import FakeRedis, aioredis
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+
+from src.services.metrics import instrument_engine, instrument_redis
+
+
+def sample(name: str, labels: dict) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestInstrumentation(unittest.IsolatedAsyncioTestCase):
+
+    def test_engine_queries_are_timed(self):
+        engine = create_engine("sqlite://")
+        instrument_engine(engine, "test")
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+            with self.assertRaises(Exception):
+                conn.execute(text("SELECT * FROM missing"))
+            self.assertEqual(conn.info["query_started"], [])
+        self.assertEqual(sample("db_query_duration_seconds_count", {"database": "test", "statement": "SELECT"}), 2)
+        engine.dispose()
+
+    def test_sync_redis_commands_are_timed(self):
+        client = instrument_redis(FakeRedis(), "test-sync")
+        instrument_redis(client, "test-sync")
+        client.set("key", "value")
+        client.get("key")
+        self.assertEqual(sample("redis_command_duration_seconds_count", {"client": "test-sync", "command": "GET"}), 1)
+
+    async def test_async_redis_commands_and_scripts_are_timed(self):
+        client = instrument_redis(aioredis.FakeRedis(), "test-async")
+        script = client.register_script("return redis.call('INCR', KEYS[1])")
+        self.assertEqual(await script(keys=["counter"]), 1)
+        await client.get("counter")
+        self.assertEqual(sample("redis_command_duration_seconds_count", {"client": "test-async", "command": "GET"}), 1)
+        self.assertGreaterEqual(
+            sample("redis_command_duration_seconds_count", {"client": "test-async", "command": "EVALSHA"}), 1)
+        await client.close()
@@ -0,0 +1,136 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, EmailOutbox
+from src.repository import outbox as repository_outbox
+from src.services.outbox_worker import OutboxWorker
+
+
+def fake_send_email(error=None):
+    async def send_email(email, username, host):
+        delivered = asyncio.get_running_loop().create_future()
+        delivered.set_result(error)
+        return delivered
+    return send_email
+
+
+class TestOutboxWorker(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        self.worker = OutboxWorker(session_factory=self.SessionLocal, batch_size=10, concurrency=2,
+                                   max_attempts=2, visibility_timeout=60, backoff=30, poll_interval=0.01)
+
+
+    async def enqueue(self, kind=repository_outbox.CONFIRM_EMAIL):
+        db = self.SessionLocal()
+        entry = await repository_outbox.enqueue_email(kind, "jd@mail.com",
+                                                      {"email": "jd@mail.com", "username": "jane", "host": "h/"}, db)
+        entry_id = entry.id
+        db.close()
+        return entry_id
+
+
+    def get(self, entry_id) -> EmailOutbox:
+        db = self.SessionLocal()
+        entry = db.get(EmailOutbox, entry_id)
+        db.close()
+        return entry
+
+
+    async def test_marks_delivered_entries_sent(self):
+        entry_id = await self.enqueue()
+        with patch("src.services.outbox_worker.send_email", fake_send_email()):
+            processed = await self.worker.run_once()
+        self.assertEqual(processed, 1)
+        entry = self.get(entry_id)
+        self.assertEqual(entry.status, repository_outbox.SENT)
+        self.assertEqual(entry.attempts, 1)
+
+
+    async def test_retries_with_backoff_then_dead_letters(self):
+        entry_id = await self.enqueue()
+        with patch("src.services.outbox_worker.send_email", fake_send_email("451 Try again")):
+            await self.worker.run_once()
+            entry = self.get(entry_id)
+            self.assertEqual(entry.status, repository_outbox.PENDING)
+            self.assertGreater(entry.available_at, datetime.utcnow())
+            self.assertEqual(await self.worker.run_once(), 0)
+
+            db = self.SessionLocal()
+            db.get(EmailOutbox, entry_id).available_at = datetime.utcnow()
+            db.commit()
+            db.close()
+            await self.worker.run_once()
+        entry = self.get(entry_id)
+        self.assertEqual(entry.status, repository_outbox.DEAD)
+        self.assertEqual(entry.last_error, "451 Try again")
+
+
+    async def test_unknown_kind_is_not_sent(self):
+        entry_id = await self.enqueue(kind="unknown")
+        await self.worker.run_once()
+        entry = self.get(entry_id)
+        self.assertEqual(entry.status, repository_outbox.PENDING)
+        self.assertIn("Unknown email kind", entry.last_error)
+
+
+    async def test_claimed_entries_are_hidden(self):
+        await self.enqueue()
+        db = self.SessionLocal()
+        claimed = await repository_outbox.claim_batch(db, 10, 60)
+        again = await repository_outbox.claim_batch(db, 10, 60)
+        db.close()
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(again, [])
+
+
+    async def test_purges_old_sent_entries(self):
+        old_sent, new_sent, old_dead, pending = [await self.enqueue() for _ in range(4)]
+        with patch("src.services.outbox_worker.send_email", fake_send_email()):
+            await self.worker.run_once()
+        db = self.SessionLocal()
+        week_ago = datetime.utcnow() - timedelta(days=8)
+        db.get(EmailOutbox, old_sent).available_at = week_ago
+        db.get(EmailOutbox, old_dead).status = repository_outbox.DEAD
+        db.get(EmailOutbox, old_dead).available_at = week_ago
+        db.get(EmailOutbox, pending).status = repository_outbox.PENDING
+        db.get(EmailOutbox, pending).available_at = week_ago
+        db.commit()
+        db.close()
+        worker = OutboxWorker(session_factory=self.SessionLocal, retention_days=7, poll_interval=0.01)
+        with patch("src.services.outbox_worker.send_email", fake_send_email("451 Try again")):
+            task = asyncio.create_task(worker.run())
+            await asyncio.sleep(0.05)
+            worker.stop()
+            await task
+        self.assertIsNone(self.get(old_sent))
+        self.assertEqual(self.get(new_sent).status, repository_outbox.SENT)
+        self.assertEqual(self.get(old_dead).status, repository_outbox.DEAD)
+        self.assertEqual(self.get(pending).status, repository_outbox.PENDING)
+
+
+    async def test_purge_deletes_in_batches(self):
+        entry_ids = [await self.enqueue() for _ in range(5)]
+        db = self.SessionLocal()
+        for entry_id in entry_ids:
+            entry = db.get(EmailOutbox, entry_id)
+            entry.status = repository_outbox.SENT
+            entry.available_at = datetime.utcnow() - timedelta(days=30)
+        db.commit()
+        deleted = await repository_outbox.purge_sent(db, 7, batch_size=2)
+        db.close()
+        self.assertEqual(deleted, 5)
+        self.assertTrue(all(self.get(entry_id) is None for entry_id in entry_ids))
+
+
+if __name__ == '__main__':
+    unittest.main()
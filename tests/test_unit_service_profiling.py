@@ -0,0 +1,56 @@
+import asyncio
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.conf.config import settings
+from src.database.auth import auth_service
+from src.services.profiling import ProfilerMiddleware
+
+
+def busy_handler_for_profile():
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        pass
+
+
+@pytest.fixture
+def profiled(tmp_path):
+    app = FastAPI()
+
+    @app.get("/slow")
+    async def slow():
+        busy_handler_for_profile()
+        return {"ok": True}
+
+    app.add_middleware(ProfilerMiddleware, directory=str(tmp_path))
+    with patch.object(settings, "admin_emails", ["admin@example.com"]):
+        yield TestClient(app), tmp_path
+
+
+def bearer(email: str) -> str:
+    return "Bearer " + asyncio.run(auth_service.create_access_token(data={"sub": email}))
+
+
+def test_admin_request_is_profiled(profiled):
+    client, folder = profiled
+    response = client.get("/slow", headers={"X-Profile": "1", "Authorization": bearer("admin@example.com")})
+    assert response.status_code == 200, response.text
+    profile = json.loads((folder / response.headers["X-Profile-Id"]).read_text())
+    assert "speedscope" in profile["$schema"]
+    assert "busy_handler_for_profile" in {frame["name"] for frame in profile["shared"]["frames"]}
+
+
+def test_other_requests_are_not_profiled(profiled):
+    client, folder = profiled
+    for headers in [{}, {"X-Profile": "1"}, {"X-Profile": "1", "Authorization": bearer("user@example.com")},
+                    {"X-Profile": "1", "Authorization": "Bearer broken"}]:
+        response = client.get("/slow", headers=headers)
+        assert response.status_code == 200, response.text
+        assert "X-Profile-Id" not in response.headers
+    assert list(folder.iterdir()) == []
+
@@ -0,0 +1,61 @@
+import unittest
+from unittest.mock import patch
+
+from fakeredis import aioredis
+from fastapi import HTTPException, Response
+
+from src.conf.config import settings
+from src.database.models import User
+from src.services.rate_limit import UserRateLimiter
+
+
+class TestUserRateLimiter(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.redis = aioredis.FakeRedis()
+        await UserRateLimiter.init(self.redis)
+        self.user = User(id=1, plan='free')
+
+
+    async def asyncTearDown(self):
+        await self.redis.close()
+
+
+    async def test_sets_headers(self):
+        limiter = UserRateLimiter("contacts:test", times=3, seconds=60)
+        response = Response()
+        await limiter(response=response, current_user=self.user)
+        self.assertEqual(response.headers["RateLimit-Limit"], "3")
+        self.assertEqual(response.headers["RateLimit-Remaining"], "2")
+        self.assertEqual(response.headers["RateLimit-Reset"], "60")
+
+
+    async def test_blocks_after_limit(self):
+        limiter = UserRateLimiter("contacts:test", times=3, seconds=60)
+        for _ in range(3):
+            await limiter(response=Response(), current_user=self.user)
+        with self.assertRaises(HTTPException) as ctx:
+            await limiter(response=Response(), current_user=self.user)
+        self.assertEqual(ctx.exception.status_code, 429)
+        self.assertEqual(ctx.exception.headers["RateLimit-Remaining"], "0")
+        self.assertIn("Retry-After", ctx.exception.headers)
+
+
+    async def test_keyed_by_user(self):
+        limiter = UserRateLimiter("contacts:test", times=1, seconds=60)
+        await limiter(response=Response(), current_user=self.user)
+        await limiter(response=Response(), current_user=User(id=2, plan='free'))
+        with self.assertRaises(HTTPException):
+            await limiter(response=Response(), current_user=self.user)
+
+
+    async def test_route_and_plan_limits(self):
+        limiter = UserRateLimiter("contacts:test", times=3, seconds=60)
+        with patch.object(settings, "rate_limit_routes", {"contacts:test": 4}), \
+                patch.object(settings, "rate_limit_plans", {"free": 1.0, "pro": 2.5}):
+            self.assertEqual(limiter.limit_for(self.user), 4)
+            self.assertEqual(limiter.limit_for(User(id=2, plan='pro')), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import asyncio
+import math
+import random
+import unittest
+from unittest.mock import patch
+
+from fakeredis import aioredis
+
+from src.services.token_bucket import LeasedTokenBucket
+
+
+class TestLeasedTokenBucket(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.redis = aioredis.FakeRedis()
+
+
+    async def asyncTearDown(self):
+        await self.redis.close()
+
+
+    async def run_workers(self, workers: int, fraction: float, limit: int, requests: int):
+        buckets = [LeasedTokenBucket(self.redis, lease_fraction=fraction) for _ in range(workers)]
+        rnd = random.Random(workers)
+        picks = [rnd.choice(buckets) for _ in range(requests)]
+        with patch("src.services.token_bucket.time.time", return_value=6000.0):
+            results = await asyncio.gather(*(bucket.acquire("contacts:list:1", limit, 60) for bucket in picks))
+        granted = sum(1 for allowed, _, _ in results if allowed)
+        return granted, sum(bucket.redis_calls for bucket in buckets)
+
+
+    async def test_no_overshoot_with_n_workers(self):
+        limit = 100
+        for workers in (1, 4, 16):
+            for fraction in (0.01, 0.1, 0.5):
+                with self.subTest(workers=workers, fraction=fraction):
+                    await self.redis.flushall()
+                    granted, redis_calls = await self.run_workers(workers, fraction, limit, requests=limit * 3)
+                    overshoot = granted - limit
+                    self.assertLessEqual(overshoot, 0)
+                    lease = max(1, int(limit * fraction))
+                    self.assertLessEqual(limit - granted, workers * (lease - 1))
+
+
+    async def test_bigger_lease_means_fewer_redis_calls(self):
+        _, small = await self.run_workers(4, 0.01, 100, requests=100)
+        await self.redis.flushall()
+        _, big = await self.run_workers(4, 0.2, 100, requests=100)
+        self.assertLess(big, small)
+        self.assertLessEqual(big, 100 // 20 + 4)
+
+
+    async def test_denied_locally_after_budget_spent(self):
+        bucket = LeasedTokenBucket(self.redis, lease_fraction=0.5)
+        with patch("src.services.token_bucket.time.time", return_value=6000.0):
+            for _ in range(4):
+                allowed, _, _ = await bucket.acquire("contacts:list:1", 4, 60)
+                self.assertTrue(allowed)
+            calls = bucket.redis_calls
+            allowed, remaining, reset = await bucket.acquire("contacts:list:1", 4, 60)
+        self.assertFalse(allowed)
+        self.assertEqual(remaining, 0)
+        self.assertEqual(reset, 61)
+        self.assertEqual(bucket.redis_calls, calls)
+
+
+    async def test_budget_frees_when_lease_leaves_window(self):
+        bucket = LeasedTokenBucket(self.redis, lease_fraction=1.0, lease_seconds=1.0)
+        with patch("src.services.token_bucket.time.time", return_value=6000.0):
+            await bucket.acquire("contacts:list:1", 1, 60)
+        for now in (6059.0, 6060.5):
+            with patch("src.services.token_bucket.time.time", return_value=now):
+                allowed, _, reset = await bucket.acquire("contacts:list:1", 1, 60)
+            self.assertFalse(allowed)
+            self.assertEqual(reset, math.ceil(6061.0 - now))
+        with patch("src.services.token_bucket.time.time", return_value=6061.0):
+            allowed, _, _ = await bucket.acquire("contacts:list:1", 1, 60)
+        self.assertTrue(allowed)
+
+
+    async def test_no_overshoot_across_window_boundaries(self):
+        limit = 100
+        buckets = [LeasedTokenBucket(self.redis, lease_fraction=0.1, lease_seconds=1.0) for _ in range(4)]
+        rnd = random.Random(4)
+        # bursts just before and just after a fixed window boundary, then steady traffic over later windows
+        times = [(6059.5, limit), (6060.5, limit)] + [(6061 + step * 0.5, 3) for step in range(360)]
+        granted = []
+        for now, requests in times:
+            with patch("src.services.token_bucket.time.time", return_value=now):
+                results = await asyncio.gather(*(rnd.choice(buckets).acquire("contacts:list:1", limit, 60)
+                                                 for _ in range(requests)))
+            granted.extend(now for allowed, _, _ in results if allowed)
+        burst = sum(1 for now in granted if now < 6061)
+        self.assertLessEqual(burst, limit)
+        self.assertGreaterEqual(burst, limit - 4 * (10 - 1))
+        self.assertTrue(any(6120 <= now < 6180 for now in granted))
+        self.assertTrue(any(now >= 6180 for now in granted))
+        for start in sorted(set(granted)):
+            self.assertLessEqual(sum(1 for now in granted if start <= now < start + 60), limit)
+
+
+if __name__ == '__main__':
+    unittest.main()
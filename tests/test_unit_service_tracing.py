@@ -0,0 +1,86 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from fakeredis import FakeRedis
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, User
+from src.repository import users as repository_users
+from src.services.tracing import OTLPJsonFileExporter, TracingMiddleware, trace_redis, tracing
+
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+
+class TestTracing(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        factory = sessionmaker(bind=engine)
+        with factory() as db:
+            db.add(User(id=1, email="user@mail.com", password="x"))
+            db.commit()
+        cache = trace_redis(FakeRedis(), "test")
+
+        app = FastAPI()
+        app.add_middleware(TracingMiddleware)
+
+        @app.get("/users/{email}")
+        async def read_user(email: str):
+            cache.get(f"user:{email}")
+            with factory() as db:
+                user = await repository_users.get_user_by_email(email, db)
+            return {"id": user.id}
+
+        self.client = TestClient(app)
+        self.exporter = InMemorySpanExporter()
+
+    def tearDown(self):
+        tracing.shutdown()
+
+    def spans(self) -> dict:
+        return {span.name: span for span in self.exporter.get_finished_spans()}
+
+    def test_spans_of_request(self):
+        tracing.configure(self.exporter, sample_rate=1.0, processor=SimpleSpanProcessor)
+        headers = {"traceparent": f"00-{TRACE_ID}-00f067aa0ba902b7-01"}
+        self.assertEqual(self.client.get("/users/user@mail.com", headers=headers).json(), {"id": 1})
+        spans = self.spans()
+        server = spans["GET /users/{email}"]
+        self.assertEqual(format(server.context.trace_id, "032x"), TRACE_ID)
+        self.assertEqual(server.parent.span_id, 0x00f067aa0ba902b7)
+        self.assertEqual(server.attributes["http.status_code"], 200)
+        for name in ["src.repository.users.get_user_by_email", "redis GET"]:
+            self.assertEqual(spans[name].parent.span_id, server.context.span_id)
+
+    def test_sampling(self):
+        tracing.configure(self.exporter, sample_rate=0.0, processor=SimpleSpanProcessor)
+        self.client.get("/users/user@mail.com")
+        self.assertEqual(self.spans(), {})
+        self.client.get("/users/user@mail.com", headers={"traceparent": f"00-{TRACE_ID}-00f067aa0ba902b7-01"})
+        self.assertEqual(len(self.spans()), 3)
+
+    def test_file_exporter_writes_otlp_json(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = Path(folder) / "traces.jsonl"
+            tracing.configure(OTLPJsonFileExporter(str(path)), sample_rate=1.0, processor=SimpleSpanProcessor)
+            self.client.get("/users/user@mail.com", headers={"traceparent": f"00-{TRACE_ID}-00f067aa0ba902b7-01"})
+            lines = [json.loads(line) for line in path.read_text().splitlines()]
+        spans = {span["name"]: span for line in lines for scope in line["resourceSpans"][0]["scopeSpans"]
+                 for span in scope["spans"]}
+        self.assertEqual(set(spans), {"GET /users/{email}", "src.repository.users.get_user_by_email", "redis GET"})
+        server = spans["GET /users/{email}"]
+        self.assertEqual(server["traceId"], format(int(TRACE_ID, 16), "032x"))
+        self.assertEqual(server["parentSpanId"], "00f067aa0ba902b7")
+        self.assertEqual(server["kind"], 2)
+        self.assertRegex(server["spanId"], "^[0-9a-f]{16}$")
+        self.assertEqual(spans["redis GET"]["parentSpanId"], server["spanId"])